@@ -0,0 +1,39 @@
+"""
+Compares the computation graph of build_data_cube_inpts, one DerivativePipeline map, against the
+previous chain of nine .map() calls. Requires an authenticated Earth Engine session, nothing is 
+computed on the server.
+
+python benchmarks/bench_datacube_graph.py
+"""
+import ee
+
+from cnwi import derivatives as d
+from cnwi import graph
+from cnwi.datacube import build_data_cube_inpts, prep_data_cube
+
+ARGS = "projects/fpca-336015/assets/NovaScotia/data_cube"
+
+
+def chained(col: ee.ImageCollection) -> ee.Image:
+    calculators = [
+        d.NDVI(), d.NDVI(nir='B8_1', red='B4_1'), d.NDVI(nir='B8_2', red='B4_2'),
+        d.SAVI(), d.SAVI(nir='B8_1', red='B4_1'), d.SAVI(nir='B8_2', red='B4_2'),
+        d.TasselCap(),
+        d.TasselCap(blue="B2_1", red='B4_1', green='B3_1', nir='B8_1', swir_1='B11_1', swir_2='B12_1'),
+        d.TasselCap(blue="B2_2", red='B4_2', green='B3_2', nir='B8_2', swir_1='B11_2', swir_2='B12_2'),
+    ]
+    for calculator in calculators:
+        col = col.map(calculator)
+    return col.mosaic()
+
+
+def main():
+    ee.Initialize()
+    col = prep_data_cube(ee.ImageCollection(ARGS))
+    for name, image in [('chained .map()', chained(col)), ('DerivativePipeline', build_data_cube_inpts(col))]:
+        print(name)
+        print(graph.profile(image).report())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Microbenchmark of the local raster calculator backends against a straightforward NumPy
+translation of each formula that allocates a temporary per operation / band
+
+python benchmarks/bench_derivatives.py
+"""
+import time
+
+import numpy as np
+
+from cnwi import derivatives as d
+
+SHAPE = (2048, 2048)
+BANDS = ['B2', 'B3', 'B4', 'B8', 'B11', 'B12']
+
+
+def naive_ndvi(bands):
+    nir, red = bands['B8'].astype(np.float32), bands['B4'].astype(np.float32)
+    den = nir + red
+    return np.where(den == 0, 0, (nir - red) / np.where(den == 0, 1, den))
+
+
+def naive_savi(bands):
+    return naive_ndvi(bands) * (1 + 0.5)
+
+
+def naive_tassel_cap(bands):
+    tc = d.TasselCap()
+    out = []
+    for row in d.TASSEL_CAP_COEFFICIENTS:
+        component = np.zeros(SHAPE, dtype=np.float32)
+        for coef, name in zip(row, tc.bands):
+            component = component + coef * bands[name].astype(np.float32)
+        out.append(component)
+    return out
+
+
+def naive_ratio(bands):
+    x, y = bands['B8'].astype(np.float32), bands['B4'].astype(np.float32)
+    return np.where(y == 0, 0, x / np.where(y == 0, 1, y))
+
+
+def timeit(func, *args, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(0)
+    bands = {name: rng.integers(1, 10_000, size=SHAPE).astype(np.uint16) for name in BANDS}
+    
+    cases = [
+        (d.NDVI(), naive_ndvi),
+        (d.SAVI(), naive_savi),
+        (d.TasselCap(), naive_tassel_cap),
+        (d.Ratio('B8', 'B4'), naive_ratio),
+    ]
+    for calculator, naive in cases:
+        fused = timeit(calculator.compute, bands)
+        reference = timeit(naive, bands)
+        print(f'{type(calculator).__name__:<10} naive={reference * 1e3:8.1f}ms '
+              f'fused={fused * 1e3:8.1f}ms speedup={reference / fused:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
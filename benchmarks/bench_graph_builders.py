@@ -0,0 +1,39 @@
+"""
+Prints the graph profile of the heaviest cnwi builders. Requires an authenticated Earth Engine 
+session, nothing is computed on the server.
+
+python benchmarks/bench_graph_builders.py
+"""
+import ee
+
+from cnwi import graph
+from cnwi import sfilters
+from cnwi.elev import build_elevation_inpts, NASA_DEM
+from cnwi.fourier import fourier
+
+AOI = ee.Geometry.Rectangle(-64.5, 44.5, -64.0, 45.0)
+
+
+def main():
+    ee.Initialize()
+    s2 = ee.ImageCollection("COPERNICUS/S2_SR").filterBounds(AOI).filterDate('2017', '2022')
+    dem = NASA_DEM().select('elevation')
+    builders = {
+        'fourier.fourier(modes=3, single_pass=False)': 
+            lambda: fourier(s2, modes=3, omega=1, single_pass=False),
+        'fourier.fourier(modes=3)': lambda: fourier(s2, modes=3, omega=1),
+        'sfilters.perona_malik(iterations=10)': lambda: sfilters.perona_malik()(dem),
+        'sfilters.PeronaMalik(iterations=10)': lambda: sfilters.PeronaMalik()(dem),
+        'sfilters.PeronaMalik(iterations=50)': lambda: sfilters.PeronaMalik(iterations=50)(dem),
+        'sfilters.PeronaMalik(iterations=50, server_side=True)': 
+            lambda: sfilters.PeronaMalik(iterations=50, server_side=True)(dem),
+        'elev.build_elevation_inpts': lambda: build_elevation_inpts(NASA_DEM(), AOI),
+    }
+    for name, builder in builders.items():
+        print(name)
+        print(graph.profile(builder()).report())
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""
+Compares the vectorized MOA engine against the pair by pair, band by band loop
+
+python benchmarks/bench_moa.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from cnwi.moa import moa_calc, _moa_calc_loop
+
+
+def make_samples(n_samples: int, n_classes: int, n_bands: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(n_samples, n_bands)) * rng.uniform(1, 100, n_bands)
+    df = pd.DataFrame(values, columns=[f'band_{i}' for i in range(n_bands)])
+    df['cDesc'] = rng.choice([f'class_{i}' for i in range(n_classes)], n_samples)
+    return df
+
+
+def timeit(func, *args, repeat: int = 3) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    for n_samples, n_classes, n_bands in [(5_000, 5, 20), (20_000, 20, 100), (100_000, 25, 120)]:
+        df = make_samples(n_samples, n_classes, n_bands)
+        loop = timeit(_moa_calc_loop, df, 'cDesc', repeat=1)
+        vectorized = timeit(moa_calc, df, 'cDesc')
+        print(f'samples={n_samples:>7} classes={n_classes:>3} bands={n_bands:>4} '
+              f'loop={loop:8.3f}s vectorized={vectorized:8.4f}s speedup={loop / vectorized:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
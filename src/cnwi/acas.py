@@ -1,8 +1,11 @@
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from typing import Dict, Any, List
 
 import ee
+import numpy as np
 import pandas as pd
 
 
@@ -19,10 +22,19 @@ def _generate_metrics(cfm, order, labels) -> List[ee.Feature]:
 
 
 def _get_labels(order, samples, class_prop, labels) -> ee.List:
-    """ extracts the values for the class property that represents the class string """
+    """ extracts the values for the class property that represents the class string, the class to 
+    label lookup is built with one grouped reduction over the samples """
+    groups = ee.List(samples.reduceColumns(
+        reducer=ee.Reducer.first().group(groupField=1, groupName=class_prop),
+        selectors=[labels, class_prop]
+    ).get('groups'))
+    keys = groups.map(lambda group: ee.Dictionary(group).get(class_prop))
+    values = groups.map(lambda group: ee.Dictionary(group).get('first'))
+
     def mapper(element):
-        filter = ee.Filter.eq(class_prop, element)
-        return samples.filter(filter).aggregate_array(labels).distinct()
+        # an empty slice for classes without samples, like filtering for them did
+        idx = keys.indexOf(element)
+        return ee.Algorithms.If(idx.gte(0), values.slice(idx, idx.add(1)), ee.List([]))
     return ee.List(order).map(mapper).flatten()
 
 
@@ -130,6 +142,82 @@ class Overall(pd.DataFrame):
         super().__init__(data=data, columns=columns)
 
 
+TABLE_NAMES = {'confusion': 'confusion_matrix', 'consumers': 'consumers', 'producers': 'producers',
+               'overall': 'overall'}
+
+
+class MetricsBundle:
+    def __init__(self, data: Dict[str, Any]) -> None:
+        """The metrics of an exported independent() assessment, parsed once.
+
+        Args:
+            data (Dict[str, Any]): the exported geojson, loaded
+        """
+        feats = _get_features(data)
+        self.labels: List[str] = feats.get('labels')
+        self.confusion = np.asarray(feats.get('confusion_matrix'))
+        self.consumers = np.asarray(feats.get('consumers'), dtype=np.float64)
+        self.producers = np.asarray(feats.get('producers'), dtype=np.float64)
+        self.overall = float(feats.get('overall'))
+
+    @classmethod
+    def from_file(cls, filename: str) -> 'MetricsBundle':
+        with open(filename) as f:
+            return cls(json.load(f))
+
+    def tables(self) -> Dict[str, pd.DataFrame]:
+        """ confusion, consumers, producers and overall tables, as written by metric_tables_to_csv """
+        return {
+            'confusion': pd.DataFrame(self.confusion, columns=self.labels, index=self.labels),
+            'consumers': pd.DataFrame([self.consumers], columns=self.labels, index=['consumers']),
+            'producers': pd.DataFrame([self.producers], columns=self.labels, index=['producers']),
+            'overall': pd.DataFrame([self.overall], columns=['Overall']),
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """ every table in one long table of table, row, column and value """
+        frames = []
+        for table, df in self.tables().items():
+            long = df.rename_axis(index='row', columns='column').stack().rename('value').reset_index()
+            long.insert(0, 'table', table)
+            frames.append(long)
+        frame = pd.concat(frames, ignore_index=True)
+        frame[['row', 'column']] = frame[['row', 'column']].astype(str)
+        frame['value'] = frame['value'].astype(np.float64)
+        return frame
+
+    def to_csv(self, outdir: str, names: Dict[str, str] = None) -> List[str]:
+        """ writes each table to its own csv, names maps a table to its filename """
+        names = {} if names is None else names
+        os.makedirs(outdir, exist_ok=True)
+        filenames = []
+        for table, df in self.tables().items():
+            filename = os.path.join(outdir, names.get(table) or f'{TABLE_NAMES[table]}.csv')
+            df.to_csv(filename)
+            filenames.append(filename)
+        return filenames
+
+    def to_parquet(self, filename: str) -> str:
+        self.to_frame().to_parquet(filename, index=False)
+        return filename
+
+    def to_hdf(self, filename: str) -> str:
+        """ one key per table, needs pytables """
+        with pd.HDFStore(filename, mode='w') as store:
+            for table, df in self.tables().items():
+                store.put(TABLE_NAMES[table], df)
+        return filename
+
+    def write(self, path: str) -> List[str]:
+        """ writes the tables to a .parquet or .h5 file, or as csvs to a directory """
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.parquet':
+            return [self.to_parquet(path)]
+        if ext in ('.h5', '.hdf5', '.hdf'):
+            return [self.to_hdf(path)]
+        return self.to_csv(path)
+
+
 def metric_tables_to_csv(infile: str, outdir: str, confusion_n: str = None, producers_n: str = None,
                         consumers_n: str = None, overall_n: str = None) -> None:
     """
@@ -137,21 +225,38 @@ def metric_tables_to_csv(infile: str, outdir: str, confusion_n: str = None, prod
     
     out dir represents where you would like to write metrics to
     """
-    
-    consumers_n = 'confusion_matrix.csv' if consumers_n is None else consumers_n
-    producers_n = 'confusion_matrix.csv' if producers_n is None else producers_n
-    overall_n = 'confusion_matrix.csv' if overall_n is None else overall_n
-    confusion_n = 'confusion_matrix.csv' if confusion_n is None else confusion_n
-    
-    
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
-    
-    with open(infile) as f:
-        data = json.load(f)
-    
-    ConfusionMatrix(data).to_csv(os.path.join(outdir, confusion_n))
-    Consumers(data).to_csv(os.path.join(outdir, consumers_n))
-    Producers(data).to_csv(os.path.join(outdir, producers_n))
-    Overall(data).to_csv(os.path.join(outdir, overall_n))
-    return None
\ No newline at end of file
+    names = {'confusion': confusion_n, 'producers': producers_n, 'consumers': consumers_n,
+             'overall': overall_n}
+    MetricsBundle.from_file(infile).to_csv(outdir, names)
+    return None
+
+
+def _export_metrics(outdir: str, fmt: str, infile: str) -> Dict[str, Any]:
+    bundle = MetricsBundle.from_file(infile)
+    name = os.path.splitext(os.path.basename(infile))[0]
+    path = os.path.join(outdir, name if fmt == 'csv' else f'{name}.{fmt}')
+    bundle.write(path)
+    return {'file': name, 'overall': bundle.overall, 'path': path}
+
+
+def metric_files_to_tables(infiles: List[str], outdir: str, fmt: str = 'csv',
+                           workers: int = None) -> pd.DataFrame:
+    """Writes the metric tables of many exported assessments, e.g. one per tile, across a
+    process pool.
+
+    Args:
+        infiles (List[str]): the exported geojsons
+        outdir (str): a directory of csvs, or a parquet / h5 file, is written per input
+        fmt (str, optional): 'csv', 'parquet' or 'h5'. Defaults to 'csv'.
+        workers (int, optional): processes, 1 runs in this process. Defaults to os.cpu_count().
+
+    Returns:
+        pd.DataFrame: file, overall accuracy and output path of every input
+    """
+    workers = os.cpu_count() if workers is None else workers
+    os.makedirs(outdir, exist_ok=True)
+    export = partial(_export_metrics, outdir, fmt)
+    if workers <= 1:
+        return pd.DataFrame([export(_) for _ in infiles])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return pd.DataFrame(list(pool.map(export, infiles, chunksize=8)))
@@ -0,0 +1,203 @@
+"""
+Local accuracy assessment of exported validation samples. The samples (classified on the server,
+e.g. validated = samples.classify(model) exported to Drive) are read chunk by chunk from CSV,
+GeoJSON or Parquet and folded into a confusion matrix with one np.bincount per chunk. Overall,
+producers' and consumers' accuracy, kappa and F1 are computed together from the matrix, and
+bootstrap confidence intervals resample the matrix for every replicate at once.
+
+Example
+-------
+```
+from cnwi.accuracy import AccuracyAssessment
+
+assessment = AccuracyAssessment.from_file('validated.csv', actual='value', label='class_name')
+assessment.confusion_matrix()
+assessment.metrics()
+assessment.bootstrap(n=1000)
+```
+"""
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+
+def confusion_matrix(actual: np.ndarray, predicted: np.ndarray, n: int) -> np.ndarray:
+    """ (n, n) counts of class codes 0 .. n - 1, rows are actual and columns predicted like
+    ee.FeatureCollection.errorMatrix """
+    actual = np.asarray(actual, dtype=np.int64)
+    predicted = np.asarray(predicted, dtype=np.int64)
+    return np.bincount(actual * n + predicted, minlength=n * n).reshape(n, n)
+
+
+def accuracy_metrics(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+    """Overall, producers', consumers' accuracy, kappa and F1 of a confusion matrix, or of a
+    stack of them (..., n, n). Classes without reference or mapped samples are NaN.
+
+    Args:
+        matrix (np.ndarray): counts, rows are actual and columns predicted
+
+    Returns:
+        Dict[str, np.ndarray]: overall and kappa (...), producers, consumers and f1 (..., n)
+    """
+    matrix = np.asarray(matrix, dtype=np.float64)
+    total = matrix.sum(axis=(-2, -1))
+    diagonal = np.diagonal(matrix, axis1=-2, axis2=-1)
+    actual = matrix.sum(axis=-1)
+    predicted = matrix.sum(axis=-2)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overall = diagonal.sum(axis=-1) / total
+        producers = diagonal / actual
+        consumers = diagonal / predicted
+        expected = (actual * predicted).sum(axis=-1) / (total * total)
+        kappa = (overall - expected) / (1 - expected)
+        f1 = 2 * producers * consumers / (producers + consumers)
+    return {'overall': overall, 'kappa': kappa, 'producers': producers, 'consumers': consumers,
+            'f1': f1}
+
+
+def _read_geojson(filename: str, columns: List[str], chunksize: int) -> Iterator[pd.DataFrame]:
+    # EE writes a single FeatureCollection document, GDAL streams its properties without the
+    # geometries
+    from pyogrio.raw import open_arrow
+    with open_arrow(filename, columns=columns, read_geometry=False, batch_size=chunksize,
+                    use_pyarrow=True) as (_, reader):
+        for batch in reader:
+            yield batch.to_pandas()
+
+
+def _read_parquet(filename: str, columns: List[str], chunksize: int) -> Iterator[pd.DataFrame]:
+    import pyarrow.parquet as pq
+    for batch in pq.ParquetFile(filename).iter_batches(batch_size=chunksize, columns=columns):
+        yield batch.to_pandas()
+
+
+def read_chunks(source: Union[str, Iterable[pd.DataFrame]], columns: List[str] = None,
+                chunksize: int = 100_000) -> Iterable[pd.DataFrame]:
+    """ sample tables of a CSV, GeoJSON or Parquet export, chunksize rows at a time """
+    if not isinstance(source, str):
+        return source
+    ext = os.path.splitext(source)[1].lower()
+    if ext in ('.geojson', '.json'):
+        return _read_geojson(source, columns, chunksize)
+    if ext in ('.parquet', '.pq'):
+        return _read_parquet(source, columns, chunksize)
+    return pd.read_csv(source, usecols=columns, chunksize=chunksize)
+
+
+class AccuracyAssessment:
+    def __init__(self, classes: List[Any] = None) -> None:
+        """Streaming confusion matrix of actual vs predicted class values.
+
+        Args:
+            classes (List[Any], optional): the class values, in matrix order. Defaults to the
+            sorted values seen in the samples.
+        """
+        self.classes: List[Any] = [] if classes is None else list(classes)
+        self.fixed = classes is not None
+        self.labels: Dict[Any, Any] = {}
+        self.matrix = np.zeros((len(self.classes),) * 2, dtype=np.int64)
+
+    def _codes(self, values: np.ndarray) -> np.ndarray:
+        if not self.fixed:
+            known = set(self.classes)
+            new = [_ for _ in pd.unique(values).tolist() if _ not in known]
+            if new:
+                self.classes.extend(new)
+                self.matrix = np.pad(self.matrix, (0, len(new)))
+        codes = pd.Index(self.classes).get_indexer(values)
+        if (codes < 0).any():
+            raise ValueError(f"Class values not in classes: {pd.unique(values[codes < 0]).tolist()}")
+        return codes
+
+    def update(self, actual: np.ndarray, predicted: np.ndarray, labels: np.ndarray = None) -> None:
+        """ adds a chunk of samples, labels optionally names the actual class values """
+        actual, predicted = np.asarray(actual), np.asarray(predicted)
+        codes = self._codes(np.concatenate([actual, predicted]))
+        self.matrix += confusion_matrix(codes[:len(actual)], codes[len(actual):], len(self.classes))
+        if labels is not None:
+            first = pd.DataFrame({'value': actual, 'label': labels}).drop_duplicates('value')
+            for value, label in zip(first['value'].tolist(), first['label'].tolist()):
+                self.labels.setdefault(value, label)
+
+    @classmethod
+    def from_file(cls, source: Union[str, Iterable[pd.DataFrame]], actual: str,
+                  predicted: str = 'classification', label: str = None, classes: List[Any] = None,
+                  chunksize: int = 100_000) -> 'AccuracyAssessment':
+        """Assessment of exported classified samples.
+
+        Args:
+            source (Union[str, Iterable[pd.DataFrame]]): CSV, GeoJSON or Parquet file, or an
+            iterator of sample DataFrames
+            actual (str): the reference class value column, e.g. value
+            predicted (str, optional): the classified column. Defaults to 'classification'.
+            label (str, optional): column naming the reference classes, e.g. class_name
+            classes (List[Any], optional): the class values, in matrix order
+            chunksize (int, optional): rows per chunk. Defaults to 100_000.
+        """
+        assessment = cls(classes)
+        columns = [actual, predicted] + ([] if label is None else [label])
+        for chunk in read_chunks(source, columns, chunksize):
+            assessment.update(chunk[actual].to_numpy(), chunk[predicted].to_numpy(),
+                              None if label is None else chunk[label].to_numpy())
+        return assessment
+
+    def _ordered(self) -> np.ndarray:
+        # matrix and names in sorted class order
+        if self.fixed:
+            return np.arange(len(self.classes))
+        return np.argsort(np.asarray(self.classes), kind='stable')
+
+    @property
+    def names(self) -> List[Any]:
+        return [self.labels.get(self.classes[_], self.classes[_]) for _ in self._ordered()]
+
+    def confusion_matrix(self) -> pd.DataFrame:
+        order = self._ordered()
+        return pd.DataFrame(self.matrix[np.ix_(order, order)], index=self.names, columns=self.names)
+
+    def metrics(self) -> Dict[str, Union[float, pd.Series]]:
+        """ overall accuracy and kappa, per class producers', consumers' accuracy and F1 """
+        order = self._ordered()
+        metrics = accuracy_metrics(self.matrix[np.ix_(order, order)])
+        return {k: float(v) if np.ndim(v) == 0 else pd.Series(v, index=self.names, name=k)
+                for k, v in metrics.items()}
+
+    def bootstrap(self, n: int = 1000, alpha: float = 0.05, seed: int = None) -> pd.DataFrame:
+        """Percentile bootstrap confidence intervals of every metric. Resampling the samples
+        with replacement is a multinomial draw over the confusion matrix cells, so all n
+        replicate matrices are drawn at once without the samples.
+
+        Args:
+            n (int, optional): number of resamples. Defaults to 1000.
+            alpha (float, optional): the intervals cover 1 - alpha. Defaults to 0.05.
+            seed (int, optional): random seed. Defaults to None.
+
+        Returns:
+            pd.DataFrame: metric, class (None for overall and kappa), estimate, lower and upper
+        """
+        order = self._ordered()
+        matrix = self.matrix[np.ix_(order, order)]
+        size = len(order)
+        total = matrix.sum()
+        if total == 0:
+            raise ValueError("No samples to bootstrap")
+
+        rng = np.random.default_rng(seed)
+        replicates = rng.multinomial(total, matrix.ravel() / total, size=n).reshape(n, size, size)
+        estimates = accuracy_metrics(matrix)
+        resampled = accuracy_metrics(replicates)
+
+        rows = []
+        for metric, values in resampled.items():
+            with np.errstate(invalid='ignore'):
+                lower, upper = np.nanpercentile(values, [100 * alpha / 2, 100 * (1 - alpha / 2)],
+                                                axis=0)
+            names = [None] if np.ndim(estimates[metric]) == 0 else self.names
+            for name, estimate, low, high in zip(names, np.atleast_1d(estimates[metric]),
+                                                 np.atleast_1d(lower), np.atleast_1d(upper)):
+                rows.append({'metric': metric, 'class': name, 'estimate': estimate,
+                             'lower': low, 'upper': high})
+        return pd.DataFrame(rows)
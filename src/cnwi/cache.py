@@ -0,0 +1,153 @@
+"""
+Persistent cache of getInfo / computeValue results. The key of a request is the hash of its
+serialized graph (cnwi.graph.serialize), so asking for the same bandNames(), errorMatrix
+accuracy or aggregate_array of an unchanged graph is answered from disk instead of the server.
+Entries are JSON files evicted least recently used first once the cache outgrows its size limit.
+
+Example
+-------
+```
+from cnwi.cache import GraphCache
+
+cache = GraphCache('.cnwi-cache')
+bands = cache.get(stack.bandNames())          # server round trip
+bands = cache.get(stack.bandNames())          # from disk
+print(cache.stats)
+```
+"""
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple, Union
+
+import ee
+
+from .graph import serialize
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'cnwi', 'graphs')
+
+
+def graph_key(obj: Union[ee.ComputedObject, Dict[str, Any], str], namespace: str = '') -> str:
+    """ sha256 of the canonical JSON of the serialized graph """
+    encoded = json.dumps(serialize(obj), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(f'{namespace}:{encoded}'.encode()).hexdigest()
+
+
+def get_info(obj: ee.ComputedObject) -> Any:
+    return obj.getInfo()
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+
+class GraphCache:
+    def __init__(self, directory: str = CACHE_DIR, max_bytes: int = 256 * 2 ** 20,
+                 compute: Callable[[ee.ComputedObject], Any] = get_info) -> None:
+        """On disk LRU cache of computed values keyed by graph hash.
+
+        Args:
+            directory (str, optional): where entries are stored, created if needed.
+            Defaults to ~/.cache/cnwi/graphs.
+            max_bytes (int, optional): size the entries are evicted down to. Defaults to 256 MiB.
+            compute (Callable[[ee.ComputedObject], Any], optional): computes a missing value,
+            the result must be JSON serializable. Defaults to getInfo.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compute = compute
+        self.stats = CacheStats()
+        os.makedirs(directory, exist_ok=True)
+        # key -> (size, last use), recency is the file's mtime so it survives across runs
+        self._index: Dict[str, Tuple[int, int]] = {}
+        for entry in os.scandir(directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                self._index[entry.name[:-5]] = (stat.st_size, stat.st_mtime_ns)
+        self._clock = max((used for _, used in self._index.values()), default=0)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    @property
+    def size(self) -> int:
+        return sum(size for size, _ in self._index.values())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, obj: Union[ee.ComputedObject, Dict[str, Any], str]) -> bool:
+        return graph_key(obj) in self._index
+
+    def _touch(self, key: str, size: int) -> None:
+        # strictly increasing, two uses within the clock's resolution keep their order
+        self._clock = max(self._clock + 1, time.time_ns())
+        os.utime(self._path(key), ns=(self._clock, self._clock))
+        self._index[key] = (size, self._clock)
+
+    def _read(self, key: str) -> Any:
+        with open(self._path(key)) as f:
+            return json.load(f)['value']
+
+    def _write(self, key: str, value: Any) -> None:
+        path = self._path(key)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'value': value}, f)
+        os.replace(tmp, path)
+        self._touch(key, os.stat(path).st_size)
+
+    def _evict(self) -> None:
+        size = self.size
+        for key, (entry_size, _) in sorted(self._index.items(), key=lambda _: _[1][1]):
+            if size <= self.max_bytes:
+                break
+            os.remove(self._path(key))
+            del self._index[key]
+            size -= entry_size
+            self.stats.evictions += 1
+
+    def get(self, obj: ee.ComputedObject, compute: Callable[[ee.ComputedObject], Any] = None,
+            namespace: str = '') -> Any:
+        """Returns the cached value of obj, computing and storing it on a miss.
+
+        Args:
+            obj (ee.ComputedObject): the request, e.g. image.bandNames()
+            compute (Callable[[ee.ComputedObject], Any], optional): overrides the cache's compute
+            function for this request.
+            namespace (str, optional): separates values computed differently from the same graph,
+            e.g. 'getInfo' and 'download'. Defaults to ''.
+        """
+        key = graph_key(obj, namespace)
+        if key in self._index:
+            try:
+                value = self._read(key)
+            except (OSError, ValueError):
+                # removed or truncated by another process, compute it again
+                del self._index[key]
+            else:
+                self.stats.hits += 1
+                self._touch(key, self._index[key][0])
+                return value
+
+        self.stats.misses += 1
+        compute = self.compute if compute is None else compute
+        value = compute(obj)
+        self._write(key, value)
+        self._evict()
+        return value
+
+    def clear(self) -> None:
+        for key in list(self._index):
+            os.remove(self._path(key))
+        self._index.clear()
@@ -144,5 +144,10 @@ def build_data_cube_inpts(col: ee.ImageCollection)-> ee.Image:
         swir_2='B12_2'
     )
     
-    return col.map(spring_NDVI).map(summer_NDVI).map(fall_NDVI).map(spring_SAVI).map(summer_SAVI).\
-        map(fall_SAVI).map(spring_tc).map(summer_tc).map(fall_tc).mosaic()
\ No newline at end of file
+    pipeline = d.DerivativePipeline([
+        spring_NDVI, summer_NDVI, fall_NDVI,
+        spring_SAVI, summer_SAVI, fall_SAVI,
+        spring_tc, summer_tc, fall_tc
+    ])
+    
+    return col.map(pipeline).mosaic()
@@ -1,34 +1,15 @@
 from dataclasses import dataclass, field
 from typing import List
 
+from cnwi.registry import asset_set
+
 
 @dataclass(frozen=True)
 class NovaScotia:
     data_cube: str = "projects/fpca-336015/assets/NovaScotia/data_cube"
     terrain_analysis: str = "projects/fpca-336015/assets/NovaScotia/terrain_analysis"
     fourier_transform: str = None
-    sentienl1: list = field(default_factory= lambda: [
-        'COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20190512T221810_20190512T221835_016217_01E855_91EE',
-        'COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20190909T221817_20190909T221842_017967_021D39_72CF',
-        'COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20190512T221835_20190512T221859_016217_01E855_62FF',
-        'COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20190909T221842_20190909T221906_017967_021D39_8937',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190503T215428_20190503T215453_027069_030CAD_64ED',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190912T215436_20190912T215501_028994_0349EE_8C0C',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190503T215453_20190503T215518_027069_030CAD_D2EF',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190912T215501_20190912T215526_028994_0349EE_F87C',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190501T221026_20190501T221051_027040_030B9D_6095',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190910T221033_20190910T221058_028965_0348EC_A97B',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190501T221051_20190501T221116_027040_030B9D_DE1C',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190910T221058_20190910T221123_028965_0348EC_534E',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190501T221116_20190501T221141_027040_030B9D_8B50',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190910T221123_20190910T221148_028965_0348EC_8FE6',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190508T220227_20190508T220252_027142_030F3E_4E2D',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190905T220234_20190905T220259_028892_034669_D59E',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190508T220252_20190508T220317_027142_030F3E_C017',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190905T220259_20190905T220324_028892_034669_C3D0',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190508T220317_20190508T220342_027142_030F3E_E8B0',
-        'COPERNICUS/S1_GRD/S1A_IW_GRDH_1SDV_20190905T220324_20190905T220349_028892_034669_2BD9',
-    ])
+    sentienl1: list = field(default_factory=lambda: asset_set('NovaScotia'))
 
 
 @dataclass(frozen=True)
@@ -36,14 +17,4 @@ class PeaceWilliston:
     datacube: str = "projects/fpca-336015/assets/williston-cba"
     terrain_analysis: str = None
     fourier_transform: str = None
-    sentienl1: list = field(default_factory= lambda: [
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180609T015452_20180609T015517_011290_014BA0_39FD",
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180609T015517_20180609T015542_011290_014BA0_2658",
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180609T015542_20180609T015616_011290_014BA0_EE30",
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180715T015454_20180715T015519_011815_015BE0_0362",
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180715T015519_20180715T015544_011815_015BE0_D8D7",
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180715T015544_20180715T015618_011815_015BE0_8287",
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180913T015503_20180913T015528_012690_0176B4_78B3",
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180913T015528_20180913T015553_012690_0176B4_0EB4",
-        "COPERNICUS/S1_GRD/S1B_IW_GRDH_1SDV_20180913T015553_20180913T015613_012690_0176B4_EB44",
-    ])
\ No newline at end of file
+    sentienl1: list = field(default_factory=lambda: asset_set('PeaceWilliston'))
\ No newline at end of file
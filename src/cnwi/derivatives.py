@@ -1,7 +1,8 @@
 from abc import ABC, abstractmethod
-from typing import Any, List
+from typing import Any, Dict, List, Union
 
 import ee
+import numpy as np
 
 
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -105,18 +106,70 @@ def ratio(image, numerator: str, denominator: str) -> ee.Image:
 def batch_create_ratio(images: List[ee.Image], numerator: str, denominator: str) -> List[ee.Image]:
     return [ratio(img, numerator, denominator) for img in images]
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
-class _RasterCalculator:
+TASSEL_CAP_COEFFICIENTS = [
+    [0.3037,   0.2793,  0.4743,  0.5585,  0.5082,  0.1863],
+    [-0.2848, -0.2435, -0.5436,  0.7243,  0.0840, -0.1800],
+    [0.1509,   0.1973,  0.3279,  0.3406, -0.7112, -0.4572]
+]
+
+
+def _band_getter(data: Union[Dict[str, np.ndarray], np.ndarray], band_names: List[str] = None):
+    """ returns a function that looks up a band by name in a band dict or a (bands, ...) array """
+    if isinstance(data, dict):
+        return data.__getitem__
+    if band_names is None:
+        raise ValueError("band_names are required when computing from an array")
+    lookup = {name: idx for idx, name in enumerate(band_names)}
+    return lambda name: data[lookup[name]]
+
+
+def _float_type(*arrays: np.ndarray) -> np.dtype:
+    return np.result_type(*[_.dtype for _ in arrays], np.float32)
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """ divides numerator by denominator in place, returning 0 for division by 0 like ee.Image.divide """
+    zero = denominator == 0
+    np.divide(numerator, denominator, out=numerator, where=~zero)
+    numerator[zero] = 0
+    return numerator
+
+
+class _RasterCalculator(ABC):
     NAME = None
     
     def __call__(self, image: ee.Image) -> Any:
         results = self._calculation(image)
         return image.addBands(results)
     
+    @property
+    def bands(self) -> List[str]:
+        """ the input bands the calculator reads """
+        return []
+    
     def _calculation(self, image: ee.Image):
         pass
     
+    @abstractmethod
+    def _local(self, band) -> Dict[str, np.ndarray]:
+        """ the calculation on NumPy arrays, band returns an input band by name """
+    
     def calculate(self, image: ee.Image):
         return image.addBands(self._calculation(image))
+    
+    def compute(self, data: Union[Dict[str, np.ndarray], np.ndarray], 
+                band_names: List[str] = None) -> Dict[str, np.ndarray]:
+        """Local backend, applies the same formula as the Earth Engine calculation to NumPy arrays.
+
+        Args:
+            data (Union[Dict[str, np.ndarray], np.ndarray]): a dict of band name to array or an 
+            array with bands on the first axis
+            band_names (List[str], optional): names of the bands in data, required for arrays.
+
+        Returns:
+            Dict[str, np.ndarray]: output band name to array
+        """
+        return self._local(_band_getter(data, band_names))
 
 
 class NDVI(_RasterCalculator):
@@ -128,8 +181,22 @@ class NDVI(_RasterCalculator):
         self.nir = 'B8' if nir is None else nir
         self.red = 'B4' if red is None else red
  
+    @property
+    def bands(self) -> List[str]:
+        return [self.nir, self.red]
+ 
     def _calculation(self, image) -> ee.Image:
         return image.normalizedDifference([self.nir, self.red]).rename(self.NAME)
+    
+    def _local(self, band) -> Dict[str, np.ndarray]:
+        nir, red = band(self.nir), band(self.red)
+        dtype = _float_type(nir, red)
+        
+        nd = np.subtract(nir, red, dtype=dtype)
+        _safe_divide(nd, np.add(nir, red, dtype=dtype))
+        # normalizedDifference masks pixels where either input is negative
+        nd[(nir < 0) | (red < 0)] = np.nan
+        return {self.NAME: nd}
 
 
 class SAVI(_RasterCalculator):
@@ -157,6 +224,19 @@ class SAVI(_RasterCalculator):
         )
 
         return savi.rename(self.NAME)
+    
+    @property
+    def bands(self) -> List[str]:
+        return [self.nir, self.red]
+    
+    def _local(self, band) -> Dict[str, np.ndarray]:
+        nir, red = band(self.nir), band(self.red)
+        dtype = _float_type(nir, red)
+        
+        savi = np.subtract(nir, red, dtype=dtype)
+        _safe_divide(savi, np.add(nir, red, dtype=dtype))
+        savi *= (1 + self.coef)
+        return {self.NAME: savi}
 
 
 class TasselCap(_RasterCalculator):
@@ -183,13 +263,7 @@ class TasselCap(_RasterCalculator):
             self.swir_2
         ])
 
-        co_array = [
-            [0.3037,   0.2793,  0.4743,  0.5585,  0.5082,  0.1863],
-            [-0.2848, -0.2435, -0.5436,  0.7243,  0.0840, -0.1800],
-            [0.1509,   0.1973,  0.3279,  0.3406, -0.7112, -0.4572]
-        ]
-
-        co = ee.Array(co_array)
+        co = ee.Array(TASSEL_CAP_COEFFICIENTS)
 
         arrayImage1D = image.toArray()
         arrayImage2D = arrayImage1D.toArray(1)
@@ -200,6 +274,19 @@ class TasselCap(_RasterCalculator):
             arrayFlatten([self.NAME])
 
         return components_image        
+    
+    @property
+    def bands(self) -> List[str]:
+        return [self.blue, self.red, self.green, self.nir, self.swir_1, self.swir_2]
+    
+    def _local(self, band) -> Dict[str, np.ndarray]:
+        inputs = [band(_) for _ in self.bands]
+        dtype = _float_type(*inputs)
+        co = np.asarray(TASSEL_CAP_COEFFICIENTS, dtype=dtype)
+        
+        # one matrix multiply over the band axis, same band order as the Earth Engine array image
+        components = np.einsum('ij,j...->i...', co, np.stack(inputs).astype(dtype, copy=False))
+        return dict(zip(self.NAME, components))
 
 
 class Ratio(_RasterCalculator):
@@ -219,4 +306,58 @@ class Ratio(_RasterCalculator):
             expression=exp,
             opt_map=opt_map
         )   
-        return derv.rename(f'Ratio_{self.numer}_{self.denom}')
+        return derv.rename(self.NAME)
+    
+    @property
+    def NAME(self) -> str:
+        return f'Ratio_{self.numer}_{self.denom}'
+    
+    @property
+    def bands(self) -> List[str]:
+        return [self.numer, self.denom]
+    
+    def _local(self, band) -> Dict[str, np.ndarray]:
+        x, y = band(self.numer), band(self.denom)
+        ratio = np.array(x, dtype=_float_type(x, y))
+        _safe_divide(ratio, y)
+        return {self.NAME: ratio}
+
+
+def _unique_names(names: List[str]) -> List[str]:
+    """ renames duplicate band names with a numerical suffix the way ee.Image.cat does """
+    seen, unique = set(), []
+    for name in names:
+        new_name, suffix = name, 1
+        while new_name in seen:
+            new_name, suffix = f'{name}_{suffix}', suffix + 1
+        seen.add(new_name)
+        unique.append(new_name)
+    return unique
+
+
+class DerivativePipeline(_RasterCalculator):
+    def __init__(self, calculators: List[_RasterCalculator]) -> None:
+        """Composes raster calculators into a single mappable function. The input bands of every 
+        calculator are selected once, all derivatives are computed from that shared selection and 
+        added to the image with a single addBands, instead of one .map() per calculator.
+
+        Args:
+            calculators (List[_RasterCalculator]): calculators to apply, output bands are added 
+            in this order
+        """
+        super().__init__()
+        self.calculators = calculators
+    
+    @property
+    def bands(self) -> List[str]:
+        return list(dict.fromkeys(band for calc in self.calculators for band in calc.bands))
+    
+    def _calculation(self, image: ee.Image) -> ee.Image:
+        inputs = image.select(self.bands)
+        return ee.Image.cat(*[calc._calculation(inputs) for calc in self.calculators])
+    
+    def _local(self, band) -> Dict[str, np.ndarray]:
+        outputs = [(name, array) for calc in self.calculators 
+                   for name, array in calc._local(band).items()]
+        names = _unique_names([name for name, _ in outputs])
+        return dict(zip(names, [array for _, array in outputs]))
@@ -46,7 +46,7 @@ def build_elevation_inpts(dem: ee.Image, aoi: ee.Geometry, ta: bool = True):
         warnings.warn("Terrain Analysis as been Set to True... Please Note this is very memroy intenseve")
         # do terrain analysis raise warning to the end user
         gaus_filt = s.gaussian_filter(3)
-        pm = s.perona_malik()
+        pm = s.PeronaMalik()
         
         rectnalge = build_rectangle(aoi)
 
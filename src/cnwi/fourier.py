@@ -1,6 +1,8 @@
 import math
-from typing import List, Callable, Tuple
+from dataclasses import dataclass
+from typing import Dict, List, Callable, Sequence, Tuple
 import ee
+import numpy as np
 
 from . import derivatives as d
 from .opt import Sentinel2SR
@@ -51,9 +53,24 @@ class Amplitude(ee.Image):
 
 class FourierImage(ee.Image):
     
-    def __init__(self, model: model, ee_image_collection: ee.ImageCollection):
+    def __init__(self, model: model, ee_image_collection: ee.ImageCollection, single_pass: bool = False):
+        """Coefficient, amplitude and phase bands of a fitted harmonic model, unit scaled from 
+        (-1, 1) to (0, 1).
+
+        Args:
+            model (model): the fitted model
+            ee_image_collection (ee.ImageCollection): the time series the model was fitted to
+            single_pass (bool, optional): compute amplitude and phase once from the coefficients 
+            instead of adding them to every image of the collection and taking the median of the
+            (constant) values. Same bands, a fraction of the graph. Defaults to False.
+        """
         self.input_collection = ee_image_collection
         self.model = model
+        self.band_names = fourier_band_names(len(model.modes))
+
+        if single_pass:
+            super().__init__(self._single_pass(model), None)
+            return
         
         ##
         # Construction start here
@@ -72,6 +89,12 @@ class FourierImage(ee.Image):
         phase_bands = stack.select('phase.*')
 
         super().__init__(ee.Image.cat(coeff_bands, amp_bands, phase_bands), None)
+
+    def _single_pass(self, model: model) -> ee.Image:
+        coeff = model.coefficients.select([f'{_}_coeff' for _ in model.independent])
+        amps = [Amplitude(model.coefficients, mode) for mode in model.modes]
+        phases = [Phase(model.coefficients, mode) for mode in model.modes]
+        return ee.Image.cat(coeff, *amps, *phases).unitScale(-1, 1)
     
     def _add_phase(self, coeff, mode) -> Callable:
         def wrapper(image) -> Phase:
@@ -130,10 +153,19 @@ def fit(model: model) -> ee.ImageCollection:
             .reduce('sum').rename('fitted'))
     return model.harmonics.map(fit_wrapper)
 
+def build_time_series(ee_object: ee.ImageCollection, omega: float = 1.5, nir: str = None, 
+                      red: str = None) -> ee.ImageCollection:
+    """ adds the NDVI, constant and t bands the harmonic model is fitted to """
+    nir = "B8" if nir is None else nir
+    red = "B4" if red is None else red
+    return ee_object.map(add_ndvi(nir=nir, red=red))\
+        .map(add_constant)\
+        .map(add_time(omega=omega))
+
 #~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 # TODO update function def to use raster calc object, 
 def fourier(ee_object: ee.ImageCollection, modes: int = 5, omega: float = 1.5, nir: str = None, 
-            red: str = None) -> FourierImage:
+            red: str = None, single_pass: bool = True) -> FourierImage:
     """Applys fourier transform to defined image collection. Image Collection needs to be filtered 
     by start and end date, as well have a cloud mask applied. It also needs to have NDVI band in the 
     stack
@@ -142,20 +174,298 @@ def fourier(ee_object: ee.ImageCollection, modes: int = 5, omega: float = 1.5, n
         ee_object (ee.ImageCollection): Optical Image Collection to have fourier transform fitted to
         modes (int, optional): number of modes to include. Defaults to 5.
         omega (float, optional): _description_. Defaults to 1.5.
+        single_pass (bool, optional): see FourierImage. Defaults to True.
     """
-    # construct the input collection
-    nir = "B8" if nir is None else nir
-    red = "B4" if red is None else red
-    
     # TODO add date minMax checker, if greater than 365 days use omega of 1
-    
-    time_series = ee_object.map(add_ndvi(nir=nir, red=red))\
-        .map(add_constant)\
-        .map(add_time(omega=omega))\
+    time_series = build_time_series(ee_object, omega=omega, nir=nir, red=red)
 
     fourier_model = model(
         ee_object=time_series,
         modes=modes,
         dependent_var="NDVI"
     )
-    return FourierImage(model=fourier_model, ee_image_collection=time_series)
\ No newline at end of file
+    return FourierImage(model=fourier_model, ee_image_collection=time_series, single_pass=single_pass)
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+# Local NumPy counterpart of model / FourierImage for time series cubes downloaded from Earth
+# Engine (time x rows x cols NDVI, NaN where the pixel is masked). Every pixel is fitted at once:
+# pixels observed on every date share one pseudo-inverse of the design matrix, pixels with cloud
+# gaps are solved from their own masked normal equations.
+EPOCH = np.datetime64('1970-01-01', 'ms')
+DAYS_PER_YEAR = 365.25
+
+
+def harmonic_names(modes: int) -> List[str]:
+    """ the independent variables of model, in the order of its coefficients """
+    modes = range(1, modes + 1)
+    return ['constant', 't', *[f'sin_{_}' for _ in modes], *[f'cos_{_}' for _ in modes]]
+
+
+def fourier_band_names(modes: int) -> List[str]:
+    """ the bands of FourierImage, in order """
+    return [*[f'{_}_coeff' for _ in harmonic_names(modes)], 
+            *[f'amp_{_}' for _ in range(1, modes + 1)], *[f'phase_{_}' for _ in range(1, modes + 1)]]
+
+
+def harmonic_design(dates: Sequence, modes: int = 5, omega: float = 1.5) -> np.ndarray:
+    """Design matrix of the harmonic regression, the columns of harmonic_names.
+
+    Args:
+        dates (Sequence): acquisition dates, anything np.datetime64 accepts
+        modes (int, optional): number of modes. Defaults to 5.
+        omega (float, optional): Defaults to 1.5.
+
+    Returns:
+        np.ndarray: (time, 2 + 2 * modes) design matrix
+    """
+    dates = np.asarray(dates, dtype='datetime64[ms]')
+    years = (dates - EPOCH) / np.timedelta64(1, 'D') / DAYS_PER_YEAR
+    t = years * 2 * omega * math.pi
+    angles = np.outer(t, np.arange(1, modes + 1))
+    return np.column_stack([np.ones_like(t), t, np.sin(angles), np.cos(angles)])
+
+
+def _solve_normal(XtX: np.ndarray, Xty: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """ solves the (n, P, P) normal equations, (P, n) coefficients """
+    coeff = np.einsum('npq,nq->pn', np.linalg.pinv(XtX), Xty)
+    # fewer observations than unknowns, linearRegression has no solution either
+    coeff[:, counts < XtX.shape[-1]] = np.nan
+    return coeff
+
+
+def _solve_masked(X: np.ndarray, Y: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """ least squares for each column of Y using only its valid rows, (P, n) coefficients """
+    W = valid.astype(np.float64)
+    Yw = np.where(valid, Y, 0.0)
+    XtX = np.einsum('tp,tq,tn->npq', X, X, W)
+    Xty = np.einsum('tp,tn->np', X, Yw)
+    return _solve_normal(XtX, Xty, valid.sum(axis=0))
+
+
+def harmonic_regression(cube: np.ndarray, dates: Sequence, modes: int = 5, omega: float = 1.5,
+                        chunk_size: int = 16384) -> np.ndarray:
+    """Fits the harmonic model of model to every pixel of a time series cube.
+
+    Args:
+        cube (np.ndarray): (time, rows, cols) dependent variable, NaN where masked
+        dates (Sequence): acquisition date of each time step
+        modes (int, optional): number of modes. Defaults to 5.
+        omega (float, optional): Defaults to 1.5.
+        chunk_size (int, optional): pixels solved at a time, bounds the memory of the masked
+        normal equations. Defaults to 16384.
+
+    Returns:
+        np.ndarray: (2 + 2 * modes, rows, cols) coefficients in harmonic_names order
+    """
+    X = harmonic_design(dates, modes=modes, omega=omega)
+    T, rows, cols = cube.shape
+    Y = np.asarray(cube, dtype=np.float64).reshape(T, rows * cols)
+    X_pinv = np.linalg.pinv(X)
+    coeff = np.empty((X.shape[1], rows * cols))
+
+    for start in range(0, rows * cols, chunk_size):
+        chunk = slice(start, start + chunk_size)
+        Yc = Y[:, chunk]
+        valid = ~np.isnan(Yc)
+        complete = valid.all(axis=0)
+        out = coeff[:, chunk]
+        # like _solve_normal, fewer observations than coefficients has no solution
+        out[:, complete] = X_pinv @ Yc[:, complete] if T >= X.shape[1] else np.nan
+        gaps = ~complete
+        if gaps.any():
+            out[:, gaps] = _solve_masked(X, Yc[:, gaps], valid[:, gaps])
+    return coeff.reshape(-1, rows, cols)
+
+
+def fourier_bands(coefficients: np.ndarray, modes: int) -> Dict[str, np.ndarray]:
+    """The bands of FourierImage from harmonic_regression coefficients: {name}_coeff, amp_k and
+    phase_k, unit scaled from (-1, 1) to (0, 1).
+
+    Args:
+        coefficients (np.ndarray): (2 + 2 * modes, rows, cols) coefficients
+        modes (int): number of modes
+
+    Returns:
+        Dict[str, np.ndarray]: band name to (rows, cols) array
+    """
+    names = harmonic_names(modes)
+    coeff = dict(zip(names, coefficients))
+    bands = {f'{name}_coeff': coeff[name] for name in names}
+    for mode in range(1, modes + 1):
+        # Amplitude uses atan2 like Phase, kept so the bands match FourierImage
+        bands[f'amp_{mode}'] = np.arctan2(coeff[f'sin_{mode}'], coeff[f'cos_{mode}'])
+    for mode in range(1, modes + 1):
+        bands[f'phase_{mode}'] = np.arctan2(coeff[f'sin_{mode}'], coeff[f'cos_{mode}'])
+    # unitScale(-1, 1)
+    return {name: (band + 1) / 2 for name, band in bands.items()}
+
+
+def fourier_array(cube: np.ndarray, dates: Sequence, modes: int = 5, omega: float = 1.5,
+                  chunk_size: int = 16384) -> Dict[str, np.ndarray]:
+    """ local counterpart of fourier for an NDVI cube, returns the bands of FourierImage """
+    coefficients = harmonic_regression(cube, dates, modes=modes, omega=omega, chunk_size=chunk_size)
+    return fourier_bands(coefficients, modes)
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+# Incremental harmonic model. The per pixel normal equations X'X (upper triangle) and X'y are
+# sums over the images, so they can be persisted and updated with new images only; refreshing
+# the model costs the new images plus one solve, not a refit of the whole archive.
+def _upper_pairs(names: List[str]) -> List[Tuple[str, str]]:
+    return [(a, b) for idx, a in enumerate(names) for b in names[idx:]]
+
+
+class HarmonicAccumulator:
+    def __init__(self, modes: int = 5, dependent: str = 'NDVI') -> None:
+        """Builds, updates and solves the normal equations of model as an image with the bands
+        xtx_{a}_{b} (upper triangle of X'X), xty_{a} and n, the number of observations.
+
+        Args:
+            modes (int, optional): number of modes. Defaults to 5.
+            dependent (str, optional): the dependent variable. Defaults to 'NDVI'.
+        """
+        self.modes = list(range(1, modes + 1))
+        self.independent = harmonic_names(modes)
+        self.dependent = dependent
+        self.pairs = _upper_pairs(self.independent)
+        self.xtx_names = [f'xtx_{a}_{b}' for a, b in self.pairs]
+        self.xty_names = [f'xty_{a}' for a in self.independent]
+
+    def _normals(self, image: ee.Image) -> ee.Image:
+        # t is float32 and t^2 is summed over the whole archive, the stored sums need float64
+        x = image.select(self.independent).double()
+        y = image.select(self.dependent).double()
+        outer = x.toArray().toArray(1)
+        outer = outer.matrixMultiply(outer.arrayTranspose()).arrayFlatten([self.independent, self.independent])
+        xtx = outer.select([f'{a}_{b}' for a, b in self.pairs], self.xtx_names)
+        xty = x.multiply(y).rename(self.xty_names)
+        n = y.multiply(0).add(1).rename('n')
+        return ee.Image.cat(xtx, xty, n).updateMask(y.mask())
+
+    def accumulate(self, time_series: ee.ImageCollection) -> ee.Image:
+        """ sums the normal equations of a time series built with build_time_series """
+        harmonics = time_series.map(add_harmonics(
+            freq=self.modes,
+            cos_names=[f'cos_{_}' for _ in self.modes],
+            sin_names=[f'sin_{_}' for _ in self.modes]
+        ))
+        return harmonics.map(self._normals).sum().set({
+            'system:time_end': time_series.aggregate_max('system:time_start'),
+            'modes': len(self.modes)
+        })
+
+    def update(self, accumulators: ee.Image, time_series: ee.ImageCollection) -> ee.Image:
+        """ adds the images of time_series acquired after the accumulators were last updated """
+        accumulators = ee.Image(accumulators)
+        last = accumulators.get('system:time_end')
+        images = time_series.filter(ee.Filter.gt('system:time_start', last))
+        new = self.accumulate(images)
+        total = accumulators.unmask(0).add(new.unmask(0))
+        updated = total.updateMask(total.select('n').gt(0))\
+            .set({'system:time_end': ee.Algorithms.If(new.get('system:time_end'), 
+                                                      new.get('system:time_end'), last),
+                  'modes': len(self.modes)})
+        # the sums of an empty collection have no bands, nothing new leaves the accumulators as is
+        return ee.Image(ee.Algorithms.If(images.size().gt(0), updated, accumulators))
+
+    def solve(self, accumulators: ee.Image) -> ee.Image:
+        """ the coefficients of model, bands {name}_coeff """
+        accumulators = ee.Image(accumulators)
+        size = len(self.independent)
+        full = [f'xtx_{a}_{b}' if (a, b) in self.pairs else f'xtx_{b}_{a}'
+                for a in self.independent for b in self.independent]
+        xtx = accumulators.select(full).toArray().arrayReshape(ee.Image([size, size]).toArray(), 2)
+        xty = accumulators.select(self.xty_names).toArray().toArray(1)
+        return xtx.matrixSolve(xty).arrayFlatten([self.independent, ['coeff']])\
+            .updateMask(accumulators.select('n').gte(size))
+
+
+class IncrementalModel:
+    """
+    A model solved from persisted accumulators, pass it to FourierImage with single_pass=True.
+
+    Example
+    -------
+    ```
+    acc = HarmonicAccumulator(modes=3)
+    time_series = build_time_series(s2_sr, omega=1)
+    # first run, export the accumulators to an asset
+    accumulators = acc.accumulate(time_series)
+    # every new season, only the new images are added
+    accumulators = acc.update(ee.Image(asset_id), time_series)
+    ft = FourierImage(IncrementalModel(acc, accumulators), None, single_pass=True)
+    ```
+    """
+
+    def __init__(self, accumulator: HarmonicAccumulator, accumulators: ee.Image) -> None:
+        self.modes = accumulator.modes
+        self.independent = accumulator.independent
+        self.dependent = accumulator.dependent
+        self.accumulators = ee.Image(accumulators)
+        self.coefficients: ee.Image = accumulator.solve(self.accumulators)
+
+
+@dataclass
+class HarmonicAccumulatorArray:
+    """
+    Local counterpart of HarmonicAccumulator. xtx holds the upper triangle of X'X in the order of
+    HarmonicAccumulator.pairs, arrays are (values, rows, cols).
+    """
+    modes: int
+    omega: float
+    xtx: np.ndarray
+    xty: np.ndarray
+    n: np.ndarray
+    last_date: np.datetime64 = None
+
+    @classmethod
+    def empty(cls, shape: Tuple[int, int], modes: int = 5, omega: float = 1.5) -> 'HarmonicAccumulatorArray':
+        size = 2 + 2 * modes
+        return cls(modes=modes, omega=omega, xtx=np.zeros((size * (size + 1) // 2, *shape)),
+                   xty=np.zeros((size, *shape)), n=np.zeros(shape))
+
+    def update(self, cube: np.ndarray, dates: Sequence) -> 'HarmonicAccumulatorArray':
+        """ adds a (time, rows, cols) cube of new observations, NaN where masked, in place """
+        dates = np.asarray(dates, dtype='datetime64[ms]')
+        if self.last_date is not None:
+            new = dates > self.last_date
+            cube, dates = cube[new], dates[new]
+        if dates.size == 0:
+            return self
+        X = harmonic_design(dates, modes=self.modes, omega=self.omega)
+        rows, cols = np.triu_indices(X.shape[1])
+        Y = np.asarray(cube, dtype=np.float64).reshape(len(dates), -1)
+        W = ~np.isnan(Y)
+        Yw = np.where(W, Y, 0.0)
+        self.xtx += ((X[:, rows] * X[:, cols]).T @ W).reshape(self.xtx.shape)
+        self.xty += (X.T @ Yw).reshape(self.xty.shape)
+        self.n += W.sum(axis=0).reshape(self.n.shape)
+        self.last_date = dates.max() if self.last_date is None else max(self.last_date, dates.max())
+        return self
+
+    def solve(self, chunk_size: int = 16384) -> np.ndarray:
+        """ (2 + 2 * modes, rows, cols) coefficients in harmonic_names order """
+        size = self.xty.shape[0]
+        shape = self.n.shape
+        rows, cols = np.triu_indices(size)
+        xtx, xty, n = self.xtx.reshape(len(rows), -1), self.xty.reshape(size, -1), self.n.ravel()
+        coeff = np.empty((size, n.size))
+        for start in range(0, n.size, chunk_size):
+            chunk = slice(start, start + chunk_size)
+            XtX = np.empty((xtx[:, chunk].shape[1], size, size))
+            XtX[:, rows, cols] = xtx[:, chunk].T
+            XtX[:, cols, rows] = xtx[:, chunk].T
+            coeff[:, chunk] = _solve_normal(XtX, xty[:, chunk].T, n[chunk])
+        return coeff.reshape(size, *shape)
+
+    def save(self, filename: str) -> str:
+        np.savez(filename, modes=self.modes, omega=self.omega, xtx=self.xtx, xty=self.xty, n=self.n,
+                 last_date=np.datetime64('NaT') if self.last_date is None else self.last_date)
+        return filename
+
+    @classmethod
+    def load(cls, filename: str) -> 'HarmonicAccumulatorArray':
+        with np.load(filename) as f:
+            last_date = f['last_date'][()]
+            return cls(modes=int(f['modes']), omega=float(f['omega']), xtx=f['xtx'], xty=f['xty'],
+                       n=f['n'], last_date=None if np.isnat(last_date) else last_date)
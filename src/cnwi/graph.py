@@ -0,0 +1,153 @@
+"""
+Offline profiling of Earth Engine computation graphs. Everything is derived from the serialized
+(cloud api) form of an object, so no requests are sent to the server.
+
+Example
+-------
+```
+from cnwi import graph
+from cnwi.elev import build_elevation_inpts, NASA_DEM
+
+ta = build_elevation_inpts(NASA_DEM(), aoi)
+print(graph.profile(ta).report())
+```
+"""
+import json
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Tuple, Union
+
+import ee
+
+NODE_TYPES = ['functionInvocationValue', 'functionDefinitionValue', 'constantValue', 'arrayValue',
+              'dictionaryValue', 'argumentReference', 'bytesValue', 'integerValue', 'nullValue']
+
+
+@dataclass(frozen=True)
+class GraphProfile:
+    """
+    node_count: nodes in the fully expanded expression tree, i.e. with every shared subgraph
+    counted each time it is used
+    unique_nodes: nodes in the serialized graph, shared subgraphs counted once
+    depth: longest path from the result to a leaf
+    repeated_subgraphs: subgraphs the serializer had to factor out because they are used more
+    than once
+    serialized_bytes: size of the serialized request
+    functions: count of each Earth Engine function in the serialized graph
+    """
+    node_count: int
+    unique_nodes: int
+    depth: int
+    repeated_subgraphs: int
+    serialized_bytes: int
+    functions: Dict[str, int] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    def report(self, top: int = 10) -> str:
+        lines = [
+            f'nodes (expanded): {self.node_count}',
+            f'nodes (unique): {self.unique_nodes}',
+            f'depth: {self.depth}',
+            f'repeated subgraphs: {self.repeated_subgraphs}',
+            f'serialized bytes: {self.serialized_bytes}',
+        ]
+        functions = sorted(self.functions.items(), key=lambda x: x[1], reverse=True)[:top]
+        lines.extend([f'  {name}: {count}' for name, count in functions])
+        return '\n'.join(lines)
+
+
+def serialize(obj: Union[ee.ComputedObject, Dict[str, Any], str]) -> Dict[str, Any]:
+    """ encodes an Earth Engine object to its compound cloud api form, dicts and json strings are
+    assumed to already be encoded """
+    if isinstance(obj, str):
+        return json.loads(obj)
+    if isinstance(obj, dict):
+        return obj
+    return ee.serializer.encode(obj, for_cloud_api=True)
+
+
+def _children(node: Dict[str, Any]) -> List[Any]:
+    """ the child nodes of a serialized node, references to shared values are returned as their
+    value name """
+    if 'functionInvocationValue' in node:
+        invocation = node['functionInvocationValue']
+        children = list(invocation.get('arguments', {}).values())
+        if 'functionReference' in invocation:
+            children.append(invocation['functionReference'])
+        return children
+    if 'functionDefinitionValue' in node:
+        return [node['functionDefinitionValue']['body']]
+    if 'arrayValue' in node:
+        return list(node['arrayValue']['values'])
+    if 'dictionaryValue' in node:
+        return list(node['dictionaryValue']['values'].values())
+    return []
+
+
+def _function_name(node: Dict[str, Any]) -> str:
+    invocation = node.get('functionInvocationValue')
+    if invocation is None:
+        return None
+    return invocation.get('functionName', 'functionReference')
+
+
+def profile(obj: Union[ee.ComputedObject, Dict[str, Any], str]) -> GraphProfile:
+    """Profiles the computation graph of an Earth Engine object without contacting the server.
+
+    Args:
+        obj (Union[ee.ComputedObject, Dict[str, Any], str]): object built by a cnwi builder, or its
+        already serialized form
+
+    Returns:
+        GraphProfile: size metrics of the graph
+    """
+    encoded = serialize(obj)
+    values = encoded.get('values', {})
+
+    def resolve(item) -> Tuple[Any, Dict[str, Any]]:
+        """ returns a hashable key and the node for a child """
+        if isinstance(item, str):
+            return ('ref', item), values[item]
+        if 'valueReference' in item:
+            return ('ref', item['valueReference']), values[item['valueReference']]
+        return ('node', id(item)), item
+
+    references = Counter()
+    functions = Counter()
+    metrics: Dict[Any, Tuple[int, int]] = {}  # key -> (expanded size, depth)
+
+    # iterative post order walk, graphs produced by iterative filters are deeper than the
+    # recursion limit
+    root = encoded['result'] if 'result' in encoded else encoded
+    stack = [(resolve(root), False)]
+    while stack:
+        (key, node), expanded = stack.pop()
+        if key in metrics:
+            continue
+        children = [resolve(_) for _ in _children(node)]
+        if not expanded:
+            stack.append(((key, node), True))
+            stack.extend((child, False) for child in children if child[0] not in metrics)
+            continue
+
+        for child_key, _ in children:
+            if child_key[0] == 'ref':
+                references[child_key[1]] += 1
+        name = _function_name(node)
+        if name is not None:
+            functions[name] += 1
+        size = 1 + sum(metrics[child_key][0] for child_key, _ in children)
+        depth = 1 + max([metrics[child_key][1] for child_key, _ in children], default=0)
+        metrics[key] = (size, depth)
+
+    root_size, root_depth = metrics[resolve(root)[0]]
+    return GraphProfile(
+        node_count=root_size,
+        unique_nodes=len(metrics),
+        depth=root_depth,
+        repeated_subgraphs=sum(1 for count in references.values() if count > 1),
+        serialized_bytes=len(json.dumps(encoded).encode()),
+        functions=dict(functions)
+    )
@@ -1,7 +1,9 @@
+from __future__ import annotations
+
 import os
 
 from itertools import combinations
-from typing import Dict, Any, Union, List
+from typing import Dict, Any, Iterable, Union, List, Tuple
 
 import pandas as pd
 import numpy as np
@@ -14,7 +16,177 @@ class MOATable(pd.DataFrame):
         super().__init__(table)
 
 
+EXCLUDE_COLUMNS = ['.geo', 'system:index', 'CID', 'land_value', 'id', 'geometry', 'POINT_X',
+                   'POINT_Y', 'isTraining', 'value', 'index']
+
+
+def _predictor_columns(dfin: pd.DataFrame, label: str) -> List[str]:
+    return [i for i in dfin.columns if i not in [*EXCLUDE_COLUMNS, label]]
+
+
+class ClassStatistics:
+    def __init__(self, labels: List[Any], bands: List[str], count: np.ndarray, mean: np.ndarray,
+                 m2: np.ndarray) -> None:
+        """Per class count, mean and sum of squared deviations (m2) for every band. Rows follow 
+        the order of labels, columns the order of bands.
+
+        Args:
+            labels (List[Any]): the land cover labels, in order of first appearance
+            bands (List[str]): the predictor columns
+            count (np.ndarray): number of samples per class, shape (classes,)
+            mean (np.ndarray): per class band means, shape (classes, bands)
+            m2 (np.ndarray): per class sum of squared deviations from the mean, shape (classes, bands)
+        """
+        self.labels = labels
+        self.bands = bands
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_frame(cls, dfin: pd.DataFrame, label: str, bands: List[str] = None) -> ClassStatistics:
+        """ groups the samples once and computes the statistics for all bands in a single pass """
+        bands = _predictor_columns(dfin, label) if bands is None else bands
+        codes, uniques = pd.factorize(dfin[label], sort=False)
+        values = dfin[bands].to_numpy(dtype=np.float64)[codes >= 0]
+        codes = codes[codes >= 0]
+
+        # sort the rows by class so each class is a contiguous block
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        values = values[order]
+        count = np.bincount(codes, minlength=len(uniques))
+        # classes without samples (e.g. unused categories) would be empty reduceat segments
+        present = count > 0
+        labels = [label for label, keep in zip(uniques.tolist(), present) if keep]
+        codes = (np.cumsum(present) - 1)[codes]
+        count = count[present]
+        if not len(count):
+            empty = np.empty((0, len(bands)))
+            return cls([], list(bands), count, empty, empty.copy())
+        starts = np.concatenate(([0], np.cumsum(count)[:-1]))
+
+        mean = np.add.reduceat(values, starts, axis=0) / count[:, None]
+        deviations = values - mean[codes]
+        m2 = np.add.reduceat(deviations * deviations, starts, axis=0)
+        return cls(labels, list(bands), count, mean, m2)
+
+    def merge(self, other: ClassStatistics) -> ClassStatistics:
+        """Merges the statistics of two sets of samples (Chan et al.), labels only present in 
+        other are appended in order of appearance.
+        """
+        if other.bands != self.bands:
+            raise ValueError("Can not merge statistics computed over different bands")
+        labels = self.labels + [_ for _ in other.labels if _ not in self.labels]
+        index = np.array([labels.index(_) for _ in other.labels], dtype=np.intp)
+
+        n_bands = len(self.bands)
+        count = np.zeros(len(labels), dtype=np.int64)
+        mean = np.zeros((len(labels), n_bands))
+        m2 = np.zeros((len(labels), n_bands))
+        count[:len(self.labels)] = self.count
+        mean[:len(self.labels)] = self.mean
+        m2[:len(self.labels)] = self.m2
+
+        n_a = count[index][:, None].astype(np.float64)
+        n_b = other.count[:, None].astype(np.float64)
+        total = n_a + n_b
+        delta = other.mean - mean[index]
+        mean[index] = mean[index] + delta * n_b / total
+        m2[index] = m2[index] + other.m2 + delta * delta * n_a * n_b / total
+        count[index] += other.count
+        return ClassStatistics(labels, self.bands, count, mean, m2)
+
+    def pairwise_scores(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Computes the separability score of every label pair for every band as one broadcast
+        operation. Pairs follow the order of itertools.combinations over the labels.
+
+        Returns:
+            Tuple[np.ndarray]: first label index, second label index, scores (pairs, bands)
+        """
+        ref, trg = np.triu_indices(len(self.labels), k=1)
+        n1 = self.count[ref][:, None]
+        n2 = self.count[trg][:, None]
+        total = n1 + n2
+
+        delta = self.mean[trg] - self.mean[ref]
+        # variance of the concatenated samples, merged from the two classes
+        total_var = (self.m2[ref] + self.m2[trg] + delta * delta * n1 * n2 / total) / total
+        with np.errstate(divide='ignore', invalid='ignore'):
+            scores = np.abs(delta / np.sqrt(total_var))
+        return ref, trg, scores
+
+
+def _moa_table(stats: ClassStatistics) -> MOATable:
+    ref, trg, scores = stats.pairwise_scores()
+    n_pairs, n_bands = scores.shape
+
+    # rank each pair's bands from most to least separable, NaN scores last
+    order = np.argsort(-scores, axis=1, kind='stable')
+    bands = np.asarray(stats.bands, dtype=object)
+    labels = [f'{stats.labels[i]}:{stats.labels[j]}' for i, j in zip(ref, trg)]
+
+    moa_table = pd.DataFrame(data={
+        'labels': np.repeat(labels, n_bands),
+        'rank': np.tile(np.arange(1, n_bands + 1), n_pairs),
+        'band': bands[order].ravel(),
+        'scores': np.take_along_axis(scores, order, axis=1).ravel()
+    })
+    return MOATable(moa_table)
+
+
 def moa_calc(dfin: pd.DataFrame, label: str) -> MOATable:
+    """Calculates the separability score of every band for every pair of labels. The samples
+    are grouped once and every pairwise score is derived from the per class statistics.
+
+    Args:
+        dfin (pd.DataFrame): the sample table
+        label (str): the land cover label column
+
+    Returns:
+        MOATable: labels, rank, band and scores for each label pair
+    """
+    return _moa_table(ClassStatistics.from_frame(dfin, label))
+
+
+def moa_calc_stream(source: Union[str, os.PathLike, Iterable[pd.DataFrame]], label: str, 
+                    bands: List[str] = None, chunksize: int = 100_000) -> MOATable:
+    """Calculates the same table as moa_calc without holding the samples in memory. Samples are 
+    read chunk by chunk and folded into running per class statistics, so memory is bounded by 
+    classes x bands rather than the number of rows.
+
+    Args:
+        source (Union[str, os.PathLike, Iterable[pd.DataFrame]]): path to an exported sample csv or
+        an iterator of sample DataFrames, empty chunks are skipped
+        label (str): the land cover label column
+        bands (List[str], optional): predictor columns to score. Defaults to every column that is 
+        not a label, geometry or bookkeeping column.
+        chunksize (int, optional): rows per chunk when reading from a file. Defaults to 100_000.
+
+    Returns:
+        MOATable: labels, rank, band and scores for each label pair
+    """
+    if isinstance(source, (str, os.PathLike)):
+        chunks = pd.read_csv(source, chunksize=chunksize)
+    else:
+        chunks = source
+    
+    stats = None
+    for chunk in chunks:
+        if bands is None:
+            bands = _predictor_columns(chunk, label)
+        chunk_stats = ClassStatistics.from_frame(chunk, label, bands)
+        if not chunk_stats.labels:
+            continue
+        stats = chunk_stats if stats is None else stats.merge(chunk_stats)
+    
+    if stats is None:
+        raise ValueError("No samples to calculate MOA from")
+    return _moa_table(stats)
+
+
+def _moa_calc_loop(dfin: pd.DataFrame, label: str) -> MOATable:
+    """ pair by pair, band by band reference implementation of moa_calc """
     labels = dfin[label].unique().tolist()
     # set combinations
     label_combs = combinations(labels, 2)
@@ -22,9 +194,7 @@ def moa_calc(dfin: pd.DataFrame, label: str) -> MOATable:
     # group dataframe by land cover
     land_covers = {land_cover: dfin[(dfin[label] == land_cover)] for land_cover in labels}
     
-    column = [i for i in dfin.columns if i not in ['.geo', 'system:index', 'CID', label,
-                                                    'land_value', 'id', 'geometry', 'POINT_X',
-                                                    'POINT_Y', 'isTraining', 'value', 'index']]
+    column = _predictor_columns(dfin, label)
     
     dfs = []
     for comb in label_combs:
@@ -0,0 +1,161 @@
+"""
+Stratified, reproducible partitioning of samples into training / validation sets or k folds. Every
+sample gets a uniform value from a Lehmer (Park-Miller) hash of its integer id and the seed, and
+samples are ranked by it within their class. The hash only uses integer arithmetic below 2^53, so
+the server side mode (ee.FeatureCollection) and the local mode (NumPy, e.g. exported sample
+tables) assign every sample to the same split.
+
+The server side ranking holds the id and random value of every sample in memory at once (see
+stratify), expect the user memory limit past a few hundred thousand samples. Partition larger
+sets locally, e.g. the merged tables of tools.to_cloud.sampling with partition_frame.
+
+Example
+-------
+```
+from cnwi import partition
+
+training, validation = partition.partition_training(col, 0.7, 'value', seed=42, id='id')
+df_training, df_validation = partition.partition_frame(df, 0.7, 'value', seed=42, id='id')
+```
+"""
+from typing import Tuple
+
+import ee
+import numpy as np
+import pandas as pd
+
+MODULUS = 2 ** 31 - 1
+MULTIPLIER = 48271
+SEED_STRIDE = 1000003
+ROUNDS = 3
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Server side
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def ee_hash_random(id: ee.Number, seed: int = 0) -> ee.Number:
+    """ uniform value in (0, 1) of a non negative integer id, see hash_random """
+    state = ee.Number(id).add(seed * SEED_STRIDE).mod(MODULUS - 1).add(1)
+    for _ in range(ROUNDS):
+        state = state.multiply(MULTIPLIER).mod(MODULUS)
+    return state.divide(MODULUS)
+
+
+def stratify(col: ee.FeatureCollection, class_property: str, seed: int = 0,
+             id: str = 'id') -> ee.FeatureCollection:
+    """Adds random (the id hash), rank (position by random within the class, from 0) and
+    class_size to every feature. The ranks of all classes come from one grouped reduction.
+
+    Every id is collected into the grouped lists and into two dictionaries keyed by the formatted
+    id that each feature is looked up in, so memory grows with the whole collection, not with a
+    class or a tile. Large sets fail with the user memory limit, use stratified_rank on the
+    exported table instead.
+
+    Args:
+        col (ee.FeatureCollection): the samples
+        class_property (str): the class column
+        seed (int, optional): the partition seed. Defaults to 0.
+        id (str, optional): unique, non negative integer id column. Defaults to 'id'.
+
+    Returns:
+        ee.FeatureCollection: the samples with random, rank and class_size
+    """
+    col = col.map(lambda x: x.set('random', ee_hash_random(x.get(id), seed)))
+    groups = ee.List(col.reduceColumns(
+        reducer=ee.Reducer.toList().combine(ee.Reducer.toList(), 'random_').group(
+            groupField=2, groupName=class_property),
+        selectors=[id, 'random', class_property]
+    ).get('groups'))
+
+    def ranked(group):
+        group = ee.Dictionary(group)
+        ids = ee.List(group.get('list')).sort(ee.List(group.get('random_list')))
+        size = ids.size()
+        return ee.List([ids.map(lambda _: ee.Number(_).format()),
+                        ee.List.sequence(0, size.subtract(1)), ee.List.repeat(size, size)])
+
+    ranked = groups.map(ranked)
+    keys = ranked.map(lambda _: ee.List(_).get(0)).flatten()
+    rank = ee.Dictionary.fromLists(keys, ranked.map(lambda _: ee.List(_).get(1)).flatten())
+    size = ee.Dictionary.fromLists(keys, ranked.map(lambda _: ee.List(_).get(2)).flatten())
+
+    def lookup(element):
+        key = ee.Number(element.get(id)).format()
+        return element.set({'rank': rank.get(key), 'class_size': size.get(key)})
+    return col.map(lookup)
+
+
+def kfold(col: ee.FeatureCollection, k: int, class_property: str, seed: int = 0,
+          id: str = 'id') -> ee.FeatureCollection:
+    """ adds a stratified fold index (0 .. k - 1) to every feature, bound by the memory of
+    stratify, kfold_frame is the local mode for large sets """
+    col = stratify(col, class_property, seed, id)
+    return col.map(lambda x: x.set('fold', ee.Number(x.get('rank')).mod(k)))
+
+
+def partition_training(col: ee.FeatureCollection, partition: float, class_property: str,
+                       seed: int = 0, id: str = 'id') -> Tuple[ee.FeatureCollection, ee.FeatureCollection]:
+    """Stratified training / validation split, the first round(partition x class size) samples of
+    each class (by random) are training. Matches partition_frame, which also handles the sets too
+    large for the server side ranking of stratify.
+
+    Returns:
+        Tuple[ee.FeatureCollection, ee.FeatureCollection]: training, validation
+    """
+    col = stratify(col, class_property, seed, id)
+
+    def flag(element):
+        training = ee.Number(element.get('class_size')).multiply(partition).add(0.5).floor()
+        return element.set('isTraining', ee.Number(element.get('rank')).lt(training))
+    col = col.map(flag)
+    return col.filter(ee.Filter.eq('isTraining', 1)), col.filter(ee.Filter.eq('isTraining', 0))
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# Local
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+def hash_random(ids: np.ndarray, seed: int = 0) -> np.ndarray:
+    """Uniform values in (0, 1) of non negative integer ids: the id and seed select a state in
+    1 .. 2^31 - 2 that is advanced ROUNDS times by the Lehmer generator. Distinct ids below
+    2^31 - 2 get distinct values, so ranks have no ties.
+
+    Args:
+        ids (np.ndarray): non negative integer ids
+        seed (int, optional): the partition seed. Defaults to 0.
+
+    Returns:
+        np.ndarray: float64 values, equal to ee_hash_random
+    """
+    state = (np.asarray(ids, dtype=np.int64) + seed * SEED_STRIDE) % (MODULUS - 1) + 1
+    for _ in range(ROUNDS):
+        state = state * MULTIPLIER % MODULUS
+    return state / MODULUS
+
+
+def stratified_rank(classes: np.ndarray, ids: np.ndarray, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """ rank of every sample by hash_random within its class and the size of its class """
+    random = hash_random(ids, seed)
+    codes, _ = pd.factorize(np.asarray(classes))
+    order = np.lexsort((random, codes))
+    counts = np.bincount(codes)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    rank = np.empty(len(codes), dtype=np.int64)
+    rank[order] = np.arange(len(codes)) - np.repeat(starts, counts)
+    return rank, counts[codes]
+
+
+def kfold_frame(df: pd.DataFrame, k: int, class_property: str, seed: int = 0,
+                id: str = 'id') -> pd.DataFrame:
+    """ local kfold, adds random and fold columns """
+    rank, _ = stratified_rank(df[class_property].to_numpy(), df[id].to_numpy(), seed)
+    return df.assign(random=hash_random(df[id].to_numpy(), seed), fold=rank % k)
+
+
+def partition_frame(df: pd.DataFrame, partition: float, class_property: str, seed: int = 0,
+                    id: str = 'id') -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """ local partition_training, returns training, validation """
+    rank, class_size = stratified_rank(df[class_property].to_numpy(), df[id].to_numpy(), seed)
+    # round half up like the server side, np.round rounds half to even
+    training = rank < np.floor(class_size * partition + 0.5)
+    return df[training], df[~training]
@@ -0,0 +1,154 @@
+"""
+Local processing of exported GeoTIFF / COG tiles. Rasters are read and written block by block
+through windowed reads, so peak memory is bounded by block size x band count (times the number
+of blocks in flight) rather than by the size of the scene.
+
+Example
+-------
+```
+from cnwi import derivatives as d
+from cnwi import raster, sfilters
+
+# derivatives, band names are read from the band descriptions of the export
+raster.process_raster('fourier-1-0000000000-0000000000.tif', 'tc.tif',
+                      raster.for_calculator(d.TasselCap(), raster.band_names('s2.tif')))
+
+# filters need a halo of overlapping pixels around each block
+pm = sfilters.PeronaMalik()
+raster.process_raster('dem.tif', 'dem_pm.tif', pm.compute, halo=pm.halo, workers=8)
+```
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+
+import numpy as np
+import rasterio
+from rasterio.io import DatasetReader, DatasetWriter
+from rasterio.windows import Window as RioWindow
+
+from .derivatives import _RasterCalculator
+from .tiling import Window, iter_windows
+
+BlockResult = Union[np.ndarray, Dict[str, np.ndarray]]
+
+_dataset = None
+
+
+def band_names(filename: str) -> List[str]:
+    """ the band descriptions of a raster, Earth Engine exports store the band names there """
+    with rasterio.open(filename) as src:
+        return [desc if desc is not None else f'b{idx}' for idx, desc in enumerate(src.descriptions, 1)]
+
+
+def for_calculator(calculator: _RasterCalculator, names: List[str]) -> Callable[[np.ndarray], BlockResult]:
+    """ adapts a raster calculator (or DerivativePipeline) to a block function """
+    return partial(calculator.compute, band_names=names)
+
+
+def _lonlat(src: DatasetReader, window: Window) -> np.ndarray:
+    """ x and y of the pixel centres of the read window, like ee.Image.pixelLonLat """
+    rows = np.arange(window.read_row, window.read_row + window.read_height) + 0.5
+    cols = np.arange(window.read_col, window.read_col + window.read_width) + 0.5
+    cols, rows = np.meshgrid(cols, rows)
+    return np.stack(src.transform * (cols, rows))
+
+
+def _read(src: DatasetReader, window: Window, lonlat: bool = False) -> np.ndarray:
+    rio_window = RioWindow(window.read_col, window.read_row, window.read_width, window.read_height)
+    block = src.read(window=rio_window).astype(np.float64)
+    if src.nodata is not None:
+        block[block == src.nodata] = np.nan
+    if lonlat:
+        block = np.concatenate([block, _lonlat(src, window)])
+    return block
+
+
+def _open_worker(filename: str) -> None:
+    global _dataset
+    _dataset = rasterio.open(filename)
+
+
+def _process_window(func: Callable[[np.ndarray], BlockResult], lonlat: bool,
+                    window: Window) -> Tuple[Window, BlockResult]:
+    return window, func(_read(_dataset, window, lonlat))
+
+
+def _as_bands(result: BlockResult) -> Tuple[List[str], np.ndarray]:
+    if isinstance(result, dict):
+        return list(result), np.stack(list(result.values()))
+    result = np.asarray(result)
+    return None, result[np.newaxis] if result.ndim == 2 else result
+
+
+def process_raster(src_filename: str, dst_filename: str, func: Callable[[np.ndarray], BlockResult],
+                   halo: int = 0, block_size: int = 1024, workers: int = None,
+                   dtype: str = 'float32', lonlat: bool = False) -> str:
+    """Streams a raster through func block by block and writes the result block by block.
+
+    Args:
+        src_filename (str): multi band GeoTIFF / COG to read
+        dst_filename (str): GeoTIFF to write
+        func (Callable[[np.ndarray], BlockResult]): picklable function of a (bands, rows, cols)
+        block returning a (bands, rows, cols) array or a dict of band name to (rows, cols) array,
+        e.g. a calculator adapted with for_calculator or a filter's compute method
+        halo (int, optional): pixels of overlap func needs around each block. Defaults to 0.
+        block_size (int, optional): height and width of a block, a multiple of 16.
+        Defaults to 1024.
+        workers (int, optional): size of the process pool, 1 processes in this process.
+        Defaults to os.cpu_count().
+        dtype (str, optional): output data type. Defaults to 'float32'.
+        lonlat (bool, optional): append the x and y (longitude and latitude for geographic
+        rasters) of each pixel to the block as two more bands. Defaults to False.
+
+    Returns:
+        str: the output filename
+    """
+    workers = os.cpu_count() if workers is None else workers
+
+    with rasterio.open(src_filename) as src:
+        windows = iter_windows(src.height, src.width, tile_size=block_size, halo=halo)
+        profile = src.profile.copy()
+
+        # the first block decides the number and names of the output bands
+        first = next(windows)
+        names, data = _as_bands(func(_read(src, first, lonlat)))
+        nodata = np.nan if np.dtype(dtype).kind == 'f' else None
+        profile.update(driver='GTiff', count=data.shape[0], dtype=dtype, nodata=nodata,
+                       tiled=True, blockxsize=block_size, blockysize=block_size,
+                       compress='deflate', BIGTIFF='IF_SAFER')
+
+        with rasterio.open(dst_filename, 'w', **profile) as dst:
+            if names is not None:
+                for idx, name in enumerate(names, 1):
+                    dst.set_band_description(idx, name)
+            _write(dst, first, data)
+
+            if workers <= 1:
+                for window in windows:
+                    _write(dst, window, _as_bands(func(_read(src, window, lonlat)))[1])
+            else:
+                results = _imap_bounded(partial(_process_window, func, lonlat), src_filename, windows, workers)
+                for window, result in results:
+                    _write(dst, window, _as_bands(result)[1])
+    return dst_filename
+
+
+def _write(dst: DatasetWriter, window: Window, data: np.ndarray) -> None:
+    rio_window = RioWindow(window.col, window.row, window.width, window.height)
+    dst.write(data[(..., *window.crop)].astype(dst.dtypes[0]), window=rio_window)
+
+
+def _imap_bounded(process: Callable[[Window], Tuple[Window, BlockResult]], filename: str,
+                  windows: Iterator[Window], workers: int) -> Iterator[Tuple[Window, BlockResult]]:
+    """ runs process over the windows in a process pool, keeping at most 2 blocks per worker in flight """
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker,
+                             initargs=(filename,)) as pool:
+        pending = []
+        for window in windows:
+            pending.append(pool.submit(process, window))
+            if len(pending) >= 2 * workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
@@ -0,0 +1,159 @@
+"""
+Registry of the asset sets (S1 / S2 scenes) the pipelines are built from. Sets are loaded in bulk
+from a text file (data/assets.txt: a set name on its own line followed by one asset id per line)
+and the metadata of every asset (bands, footprint, dates) is fetched in one batched request and
+cached on disk, so later runs build collections and look up band names without round trips.
+
+Example
+-------
+```
+from cnwi.registry import AssetRegistry
+
+registry = AssetRegistry()
+registry.prefetch()                          # one request for every asset not cached yet
+registry.band_names('NovaScotia')            # served from the cache
+s1 = registry.collection('PeaceWilliston')
+```
+"""
+import json
+import os
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Union
+
+import ee
+
+ASSETS = os.path.join(os.path.dirname(__file__), 'data', 'assets.txt')
+CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'cnwi', 'assets.json')
+# archived scenes do not change, the TTL only guards against re-processed collections
+TTL = 30 * 24 * 60 * 60
+
+
+def load_asset_sets(filename: str = None) -> Dict[str, List[str]]:
+    """ parses an assets file, lines without a '/' start a new set """
+    filename = ASSETS if filename is None else filename
+    sets: Dict[str, List[str]] = {}
+    name = None
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if '/' not in line:
+                name = line
+                sets.setdefault(name, [])
+            elif name is None:
+                raise ValueError(f"{filename}: asset {line} is not in a set")
+            else:
+                sets[name].append(line)
+    return sets
+
+
+def _metadata(image: ee.Image) -> ee.Dictionary:
+    return ee.Dictionary({
+        'id': image.get('system:id'),
+        'bands': image.bandNames(),
+        'geometry': image.geometry(),
+        'start': image.get('system:time_start'),
+        'end': image.get('system:time_end'),
+    })
+
+
+def fetch_metadata(asset_ids: List[str]) -> List[Dict[str, Any]]:
+    """ metadata of every asset in one getInfo """
+    return ee.List([_metadata(ee.Image(id)) for id in asset_ids]).getInfo()
+
+
+class AssetRegistry:
+    def __init__(self, sets: Dict[str, List[str]] = None, cache: str = CACHE, ttl: float = TTL,
+                 fetch: Callable[[List[str]], List[Dict[str, Any]]] = fetch_metadata,
+                 batch_size: int = 500) -> None:
+        """Asset sets with cached metadata.
+
+        Args:
+            sets (Dict[str, List[str]], optional): set name to asset ids. Defaults to the sets of
+            data/assets.txt.
+            cache (str, optional): JSON file the metadata is cached in, None to keep it in memory.
+            Defaults to ~/.cache/cnwi/assets.json.
+            ttl (float, optional): seconds a cached entry stays valid. Defaults to 30 days.
+            fetch (Callable, optional): returns the metadata of a list of asset ids. Defaults to
+            fetch_metadata, one getInfo per batch.
+            batch_size (int, optional): assets fetched per request. Defaults to 500.
+        """
+        self.sets = load_asset_sets() if sets is None else sets
+        self.cache = cache
+        self.ttl = ttl
+        self.fetch = fetch
+        self.batch_size = batch_size
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if cache is not None and os.path.exists(cache):
+            with open(cache) as f:
+                self.entries = json.load(f)
+
+    def register(self, name: str, asset_ids: List[str]) -> None:
+        """ adds a set, e.g. scenes picked for a new study area """
+        self.sets[name] = list(asset_ids)
+
+    def asset_ids(self, name: Union[str, List[str]]) -> List[str]:
+        return self.sets[name] if isinstance(name, str) else list(name)
+
+    def _fresh(self, asset_id: str, now: float) -> bool:
+        entry = self.entries.get(asset_id)
+        return entry is not None and now - entry['fetched'] < self.ttl
+
+    def _save(self) -> None:
+        if self.cache is None:
+            return
+        os.makedirs(os.path.dirname(self.cache) or '.', exist_ok=True)
+        tmp = f'{self.cache}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        # a run killed while writing leaves the previous cache intact
+        os.replace(tmp, self.cache)
+
+    def prefetch(self, names: List[Union[str, List[str]]] = None) -> int:
+        """ fetches the metadata of every asset of the sets that is not cached or has expired,
+        returns the number of assets fetched """
+        names = list(self.sets) if names is None else names
+        now = time.time()
+        missing = list(dict.fromkeys(id for name in names for id in self.asset_ids(name)
+                                     if not self._fresh(id, now)))
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            for asset_id, metadata in zip(batch, self.fetch(batch)):
+                self.entries[asset_id] = {'fetched': now, 'metadata': metadata}
+        if missing:
+            self._save()
+        return len(missing)
+
+    def metadata(self, name: Union[str, List[str]]) -> List[Dict[str, Any]]:
+        """ metadata of the assets of a set (or list of ids), fetching what is not cached """
+        self.prefetch([name])
+        return [self.entries[id]['metadata'] for id in self.asset_ids(name)]
+
+    def band_names(self, name: Union[str, List[str]]) -> List[str]:
+        """ bands of the first asset, like collection.first().bandNames() """
+        return self.metadata(name)[0]['bands']
+
+    def date_range(self, name: Union[str, List[str]]) -> List[int]:
+        """ first and last system:time_start of the set, in ms """
+        starts = [_['start'] for _ in self.metadata(name)]
+        return [min(starts), max(starts)]
+
+    def footprints(self, name: Union[str, List[str]]) -> List[Dict[str, Any]]:
+        """ GeoJSON footprint of each asset """
+        return [_['geometry'] for _ in self.metadata(name)]
+
+    def collection(self, name: Union[str, List[str]]) -> ee.ImageCollection:
+        return ee.ImageCollection(self.asset_ids(name))
+
+
+@lru_cache(maxsize=None)
+def default_registry() -> AssetRegistry:
+    """ registry of data/assets.txt shared by datasets and prebuilt """
+    return AssetRegistry()
+
+
+def asset_set(name: str) -> List[str]:
+    """ copy of the asset ids of a set of the default registry """
+    return list(default_registry().asset_ids(name))
@@ -1,6 +1,7 @@
 from typing import Callable
 
 import ee
+import numpy as np
 
 
 def boxcar(radius: float, units: str = None, normalize: bool = True, magnitude: float = 1.0) -> Callable:
@@ -92,4 +93,186 @@ class BoxCar:
     
     def __call__(self, image: ee.Image) -> ee.Image:
         filter = ee.Kernel.square(**self.__dict__)
-        return image.convolve(filter)
\ No newline at end of file
+        return image.convolve(filter)
+    
+    @property
+    def halo(self) -> int:
+        return _pixel_radius(self.radius, self.units)
+    
+    def compute(self, array: np.ndarray) -> np.ndarray:
+        return boxcar_array(array, self.radius, self.units, self.normalize, self.magnitude)
+
+
+class PeronaMalik:
+    # the four direct neighbours of a pixel, centre excluded
+    NEIGHBOURS = [[0, 1, 0],
+                  [1, 0, 1],
+                  [0, 1, 0]]
+    LAMBDA = 0.2
+
+    def __init__(self, K: float = 3.5, iterations: int = 10, method: int = 2, 
+                 server_side: bool = False) -> None:
+        """Perona-Malik anisotropic diffusion, same numerics as perona_malik but with a graph that 
+        grows slowly with the number of iterations. The kernel and constant images are built once
+        and shared by every iteration, and the four directional derivatives come from a single 
+        neighborhoodToBands call instead of four convolutions. Expects a single band image.
+
+        Args:
+            K (float, optional): conductance parameter. Defaults to 3.5.
+            iterations (int, optional): number of diffusion steps. Defaults to 10.
+            method (int, optional): 1 for exponential conductance, 2 for the quadratic one. 
+            Defaults to 2.
+            server_side (bool, optional): loop with ee.List.iterate so the graph contains the 
+            iteration body once, regardless of the number of iterations. Defaults to False.
+        """
+        self.K = K
+        self.iterations = iterations
+        self.method = method
+        self.server_side = server_side
+
+    def __call__(self, image: ee.Image) -> ee.Image:
+        kernel = ee.Kernel.fixed(3, 3, self.NEIGHBOURS)
+        one = ee.Image(1.0)
+        k1 = ee.Image(-1.0 / self.K)
+        k2 = ee.Image(self.K * self.K)
+        lamb = ee.Image(self.LAMBDA)
+
+        def step(img: ee.Image) -> ee.Image:
+            # neighbour - centre for N, W, E, S as one four band image
+            delta = img.neighborhoodToBands(kernel).subtract(img)
+            if self.method == 1:
+                coef = delta.multiply(delta).multiply(k1).exp()
+            else:
+                coef = one.divide(one.add(delta.multiply(delta).divide(k2)))
+            flux = coef.multiply(delta).reduce(ee.Reducer.sum())
+            return img.add(lamb.multiply(flux))
+
+        if self.server_side:
+            iterate = lambda _, previous: step(ee.Image(previous))
+            return ee.Image(ee.List.sequence(1, self.iterations).iterate(iterate, image))
+
+        for _ in range(self.iterations):
+            image = step(image)
+        return image
+
+    @property
+    def halo(self) -> int:
+        """ each iteration reads the direct neighbours, so information travels one pixel per step """
+        return self.iterations
+
+    def compute(self, array: np.ndarray) -> np.ndarray:
+        return perona_malik_array(array, K=self.K, iterations=self.iterations, method=self.method)
+
+
+def perona_malik_array(array: np.ndarray, K: float = 3.5, iterations: int = 10, 
+                       method: int = 2) -> np.ndarray:
+    """Local NumPy reference of the Perona-Malik filter. Operates on the last two axes, edge 
+    pixels are replicated past the array border. The derivative and conductance buffers are 
+    allocated once and reused by every iteration.
+
+    Args:
+        array (np.ndarray): (..., rows, cols) array to filter
+        K (float, optional): conductance parameter. Defaults to 3.5.
+        iterations (int, optional): number of diffusion steps. Defaults to 10.
+        method (int, optional): 1 for exponential conductance, 2 for the quadratic one. 
+        Defaults to 2.
+
+    Returns:
+        np.ndarray: the filtered array, as float64
+    """
+    img = np.array(array, dtype=np.float64)
+    *lead, rows, cols = img.shape
+    padded = np.empty((*lead, rows + 2, cols + 2))
+    delta = np.empty((4, *img.shape))
+    coef = np.empty_like(delta)
+    flux = np.empty_like(img)
+
+    for _ in range(iterations):
+        padded[..., 1:-1, 1:-1] = img
+        padded[..., 0, 1:-1] = img[..., 0, :]
+        padded[..., -1, 1:-1] = img[..., -1, :]
+        padded[..., :, 0] = padded[..., :, 1]
+        padded[..., :, -1] = padded[..., :, -2]
+
+        np.subtract(padded[..., :-2, 1:-1], img, out=delta[0])
+        np.subtract(padded[..., 1:-1, :-2], img, out=delta[1])
+        np.subtract(padded[..., 1:-1, 2:], img, out=delta[2])
+        np.subtract(padded[..., 2:, 1:-1], img, out=delta[3])
+
+        np.multiply(delta, delta, out=coef)
+        if method == 1:
+            coef *= -1.0 / K
+            np.exp(coef, out=coef)
+        else:
+            coef /= K * K
+            coef += 1.0
+            np.reciprocal(coef, out=coef)
+        coef *= delta
+        np.add.reduce(coef, axis=0, out=flux)
+        flux *= PeronaMalik.LAMBDA
+        img += flux
+    return img
+
+
+#~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+# Local NumPy counterparts of the Earth Engine kernels. Kernels are built the same way as
+# ee.Kernel.square / ee.Kernel.gaussian and applied as two 1D passes, edge pixels are replicated 
+# past the array border. Use cnwi.tiling.apply_tiled with the filter radius as halo for rasters 
+# larger than memory.
+def _pixel_radius(radius: float, units: str = None) -> int:
+    units = 'pixels' if units is None else units
+    if units != 'pixels':
+        raise ValueError("Local filters only support kernels with units in pixels")
+    return int(radius)
+
+
+def _pad_axis(array: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    pad = [(0, 0)] * array.ndim
+    pad[axis] = (radius, radius)
+    return np.pad(array, pad, mode='edge')
+
+
+def _correlate_axis(array: np.ndarray, weights: np.ndarray, axis: int) -> np.ndarray:
+    """ applies a 1D kernel along axis by accumulating shifted views of the padded array """
+    radius = len(weights) // 2
+    padded = np.moveaxis(_pad_axis(array, radius, axis), axis, -1)
+    size = array.shape[axis]
+    out = np.zeros(padded.shape[:-1] + (size,))
+    for offset, weight in enumerate(weights):
+        out += weight * padded[..., offset:offset + size]
+    return np.moveaxis(out, -1, axis)
+
+
+def _moving_sum_axis(array: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """ sum over a window of 2 * radius + 1 along axis from a cumulative sum, O(1) per pixel """
+    padded = np.moveaxis(_pad_axis(array, radius, axis), axis, -1)
+    cumsum = np.zeros(padded.shape[:-1] + (padded.shape[-1] + 1,))
+    np.cumsum(padded, axis=-1, out=cumsum[..., 1:])
+    width = 2 * radius + 1
+    return np.moveaxis(cumsum[..., width:] - cumsum[..., :-width], -1, axis)
+
+
+def boxcar_array(array: np.ndarray, radius: float, units: str = None, normalize: bool = True, 
+                 magnitude: float = 1.0) -> np.ndarray:
+    """ local counterpart of boxcar, filters the last two axes of array """
+    radius = _pixel_radius(radius, units)
+    out = _moving_sum_axis(np.asarray(array, dtype=np.float64), radius, -1)
+    out = _moving_sum_axis(out, radius, -2)
+    scale = magnitude / (2 * radius + 1) ** 2 if normalize else magnitude
+    out *= scale
+    return out
+
+
+def gaussian_filter_array(array: np.ndarray, radius: float, sigma: int = 1, units: str = None, 
+                          normalize: bool = True, magnitude: float = 1.0) -> np.ndarray:
+    """ local counterpart of gaussian_filter, filters the last two axes of array """
+    radius = _pixel_radius(radius, units)
+    offsets = np.arange(-radius, radius + 1)
+    # exp(-(x^2 + y^2) / 2 sigma^2) is the outer product of the 1D weights
+    weights = np.exp(-offsets ** 2 / (2.0 * sigma ** 2))
+    if normalize:
+        weights /= weights.sum()
+    out = _correlate_axis(np.asarray(array, dtype=np.float64), weights, -1)
+    out = _correlate_axis(out, weights, -2)
+    out *= magnitude
+    return out
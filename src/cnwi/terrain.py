@@ -0,0 +1,198 @@
+"""
+Local NumPy terrain analysis, the counterpart of tagee.terrainAnalysis for DEM tiles downloaded
+from Earth Engine (e.g. NASADEM). Derivatives come from the same 3 x 3 finite difference stencil
+as TAGEE (Florinsky 2009, irregular spacing a..e), vectorized over shifted views of the tile, so
+the bands match what build_elevation_inpts produces on the server without using any EE quota.
+
+Example
+-------
+```
+from cnwi import raster, terrain
+
+# geographic DEM, neighbour spacing is computed from the pixel coordinates like TAGEE does
+ta = terrain.ElevationInputs()
+raster.process_raster('nasadem.tif', 'terrain.tif', ta.compute, halo=ta.halo, lonlat=True)
+
+# projected DEM with 30 m pixels
+raster.process_raster('dem_utm.tif', 'terrain.tif', terrain.ElevationInputs(res=30).compute,
+                      halo=ta.halo)
+```
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from .derivatives import _safe_divide
+from .sfilters import PeronaMalik, gaussian_filter_array
+
+EARTH_RADIUS = 6371000
+TERRAIN_BANDS = ['Elevation', 'Slope', 'HorizontalCurvature', 'VerticalCurvature', 'MeanCurvature',
+                 'GaussianCurvature']
+
+
+def _neighbours(array: np.ndarray) -> List[np.ndarray]:
+    """ Z1 .. Z9 of every pixel, row by row from the top left, NaN past the array border """
+    rows, cols = array.shape
+    padded = np.pad(np.asarray(array, dtype=np.float64), 1, constant_values=np.nan)
+    return [padded[row:row + rows, col:col + cols] for row in range(3) for col in range(3)]
+
+
+def _haversine(lon1: np.ndarray, lat1: np.ndarray, lon2: np.ndarray, lat2: np.ndarray) -> np.ndarray:
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi, dlambda = phi2 - phi1, np.radians(lon2 - lon1)
+    j = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return EARTH_RADIUS * 2 * np.arctan2(np.sqrt(j), np.sqrt(1 - j))
+
+
+def _spacing(lon: np.ndarray, lat: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """ distances a .. e between the stencil's neighbours, in metres """
+    lons, lats = _neighbours(lon), _neighbours(lat)
+
+    def distance(n1: int, n2: int) -> np.ndarray:
+        return _haversine(lons[n1 - 1], lats[n1 - 1], lons[n2 - 1], lats[n2 - 1])
+
+    return distance(7, 8), distance(4, 5), distance(1, 2), distance(4, 7), distance(1, 4)
+
+
+def partial_derivatives(dem: np.ndarray, a, b, c, d, e, tagee: bool = True) -> Tuple[np.ndarray, ...]:
+    """First and second partial derivatives p, q, r, s, t of the elevation, Florinsky's
+    formulas for a 3 x 3 window with irregular spacing, as implemented by TAGEE.
+
+    Args:
+        dem (np.ndarray): (rows, cols) elevation
+        a, b, c (float or np.ndarray): horizontal spacing of the bottom, middle and top row
+        d, e (float or np.ndarray): vertical spacing of the lower and upper row pairs
+        tagee (bool, optional): TAGEE divides q by 2de(d + e)(a^4 + b^4 + c^4) where Florinsky
+        has 3de(d + e)(a^4 + b^4 + c^4), which makes q 1.5 times too steep. Keep True to match
+        the server side products. Defaults to True.
+
+    Returns:
+        Tuple[np.ndarray, ...]: p, q, r, s, t
+    """
+    Z1, Z2, Z3, Z4, Z5, Z6, Z7, Z8, Z9 = _neighbours(dem)
+    a2, b2, c2, d2, e2 = a ** 2, b ** 2, c ** 2, d ** 2, e ** 2
+    a4, b4, c4 = a2 ** 2, b2 ** 2, c2 ** 2
+    abc4 = a4 + b4 + c4
+    de = d + e
+    pq_denominator = 2 * (a2 * c2 * de ** 2 + b2 * (a2 * d2 + c2 * e2))
+
+    p = (a2 * c * d * de * (Z3 - Z1) + b * (a2 * d2 + c2 * e2) * (Z6 - Z4)
+         + a * c2 * e * de * (Z9 - Z7))
+    p = _safe_divide(p, pq_denominator)
+
+    q = ((d2 * (a4 + b4 + b2 * c2) + c2 * e2 * (a2 - b2)) * (Z1 + Z3)
+         - (d2 * (a4 + c4 + b2 * c2) - e2 * (a4 + c4 + a2 * b2)) * (Z4 + Z6)
+         - (e2 * (b4 + c4 + a2 * b2) - a2 * d2 * (b2 - c2)) * (Z7 + Z9)
+         + d2 * (b4 * (Z2 - 3 * Z5) + c4 * (3 * Z2 - Z5) + (a4 - 2 * b2 * c2) * (Z2 - Z5))
+         + e2 * (a4 * (Z5 - 3 * Z8) + b4 * (3 * Z5 - Z8) + (c4 - 2 * a2 * b2) * (Z5 - Z8))
+         - 2 * (a2 * d2 * (b2 - c2) * Z8 + c2 * e2 * (a2 - b2) * Z2))
+    q = _safe_divide(q, (2 if tagee else 3) * d * e * de * abc4)
+
+    r = c2 * (Z1 + Z3 - 2 * Z2) + b2 * (Z4 + Z6 - 2 * Z5) + a2 * (Z7 + Z9 - 2 * Z8)
+    r = _safe_divide(r, abc4 + np.zeros_like(r))
+
+    s = (c * (a2 * de + b2 * e) * (Z3 - Z1) - b * (a2 * d - c2 * e) * (Z4 - Z6)
+         + a * (c2 * de + b2 * d) * (Z7 - Z9))
+    s = _safe_divide(s, pq_denominator)
+
+    t = ((d * (a4 + b4 + b2 * c2) - c2 * e * (a2 - b2)) * (Z1 + Z3)
+         - (d * (a4 + c4 + b2 * c2) + e * (a4 + c4 + a2 * b2)) * (Z4 + Z6)
+         + (e * (b4 + c4 + a2 * b2) + a2 * d * (b2 - c2)) * (Z7 + Z9)
+         + d * (b4 * (Z2 - 3 * Z5) + c4 * (3 * Z2 - Z5) + (a4 - 2 * b2 * c2) * (Z2 - Z5))
+         + e * (a4 * (3 * Z8 - Z5) + b4 * (Z8 - 3 * Z5) + (c4 - 2 * a2 * b2) * (Z8 - Z5))
+         - 2 * (a2 * d * (b2 - c2) * Z8 - c2 * e * (a2 - b2) * Z2))
+    t = _safe_divide(2 * t, 3 * d * e * de * abc4)
+    return p, q, r, s, t
+
+
+def terrain_array(dem: np.ndarray, res: float = None, lon: np.ndarray = None,
+                  lat: np.ndarray = None, tagee: bool = True) -> Dict[str, np.ndarray]:
+    """Elevation, slope and curvatures of a DEM tile, the TAGEE bands build_elevation_inpts uses.
+    Pixels on the border of the tile have no neighbours and are NaN, process tiles with a halo of
+    1 pixel.
+
+    Args:
+        dem (np.ndarray): (rows, cols) elevation in metres
+        res (float, optional): pixel size in metres of a projected DEM
+        lon (np.ndarray, optional): (rows, cols) pixel longitudes of a geographic DEM
+        lat (np.ndarray, optional): (rows, cols) pixel latitudes of a geographic DEM
+        tagee (bool, optional): reproduce TAGEE's q and GaussianCurvature, False for Florinsky's
+        formulas. Defaults to True.
+
+    Returns:
+        Dict[str, np.ndarray]: TERRAIN_BANDS
+    """
+    if lon is not None and lat is not None:
+        spacing = _spacing(lon, lat)
+    elif res is not None:
+        spacing = (res,) * 5
+    else:
+        raise ValueError("terrain_array needs the pixel size (res) or the pixel coordinates (lon, lat)")
+
+    dem = np.asarray(dem, dtype=np.float64)
+    p, q, r, s, t = partial_derivatives(dem, *spacing, tagee=tagee)
+    p2, q2, pq = p * p, q * q, p * q
+    gradient = p2 + q2
+    one_plus = 1 + gradient
+
+    slope = np.degrees(np.arctan(np.sqrt(gradient)))
+    horizontal = _safe_divide(-(q2 * r - 2 * pq * s + p2 * t), gradient * np.sqrt(one_plus))
+    vertical = _safe_divide(-(p2 * r + 2 * pq * s + q2 * t), gradient * np.sqrt(one_plus ** 3))
+    mean = _safe_divide(-((1 + q2) * r - 2 * pq * s + (1 + p2) * t), 2 * np.sqrt(one_plus ** 3))
+    # TAGEE squares 1 + p^2 + p^2 instead of 1 + p^2 + q^2
+    gaussian = _safe_divide(r * t - s * s, (1 + 2 * p2 if tagee else one_plus) ** 2)
+
+    return dict(zip(TERRAIN_BANDS, [dem, slope, horizontal, vertical, mean, gaussian]))
+
+
+class TerrainAnalysis:
+    def __init__(self, res: float = None, tagee: bool = True) -> None:
+        """Block function computing TERRAIN_BANDS. Blocks are (1, rows, cols) elevation, or
+        (3, rows, cols) elevation, longitude, latitude for geographic DEMs (see
+        raster.process_raster lonlat).
+
+        Args:
+            res (float, optional): pixel size in metres of a projected DEM. Defaults to None.
+            tagee (bool, optional): match TAGEE instead of Florinsky, see terrain_array.
+            Defaults to True.
+        """
+        self.res = res
+        self.tagee = tagee
+
+    @property
+    def halo(self) -> int:
+        return 1
+
+    def _terrain(self, dem: np.ndarray, block: np.ndarray) -> Dict[str, np.ndarray]:
+        if block.shape[0] >= 3:
+            return terrain_array(dem, lon=block[1], lat=block[2], tagee=self.tagee)
+        return terrain_array(dem, res=self.res, tagee=self.tagee)
+
+    def compute(self, block: np.ndarray) -> Dict[str, np.ndarray]:
+        return self._terrain(block[0], block)
+
+
+class ElevationInputs(TerrainAnalysis):
+    """
+    Local counterpart of elev.build_elevation_inpts: Elevation, Slope and GaussianCurvature from
+    the Gaussian smoothed DEM, the other curvatures from the Perona-Malik smoothed DEM.
+    """
+    GUASSIAN_BANDS = ['Elevation', 'Slope', 'GaussianCurvature']
+    PERONA_MALIK_BANDS = ['HorizontalCurvature', 'VerticalCurvature', 'MeanCurvature']
+
+    def __init__(self, res: float = None, radius: int = 3, pm: PeronaMalik = None,
+                 tagee: bool = True) -> None:
+        super().__init__(res, tagee=tagee)
+        self.radius = radius
+        self.pm = PeronaMalik() if pm is None else pm
+
+    @property
+    def halo(self) -> int:
+        return max(self.radius, self.pm.halo) + 1
+
+    def compute(self, block: np.ndarray) -> Dict[str, np.ndarray]:
+        dem = block[0]
+        ta_gauss = self._terrain(gaussian_filter_array(dem, self.radius), block)
+        ta_pm = self._terrain(self.pm.compute(dem), block)
+        return {**{band: ta_gauss[band] for band in self.GUASSIAN_BANDS},
+                **{band: ta_pm[band] for band in self.PERONA_MALIK_BANDS}}
@@ -0,0 +1,87 @@
+"""
+Tile by tile processing of arrays that are larger than memory. Tiles are read with a halo of
+overlapping pixels so neighbourhood operations (filters, terrain derivatives) give the same
+result at tile borders as they would on the whole array.
+"""
+from dataclasses import dataclass
+from typing import Callable, Iterator, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Window:
+    """ a tile of the array; the core is written to the output, the read window adds the halo """
+    row: int
+    col: int
+    height: int
+    width: int
+    read_row: int
+    read_col: int
+    read_height: int
+    read_width: int
+
+    @property
+    def core(self) -> Tuple[slice, slice]:
+        return slice(self.row, self.row + self.height), slice(self.col, self.col + self.width)
+
+    @property
+    def read(self) -> Tuple[slice, slice]:
+        return (slice(self.read_row, self.read_row + self.read_height),
+                slice(self.read_col, self.read_col + self.read_width))
+
+    @property
+    def crop(self) -> Tuple[slice, slice]:
+        """ the core, relative to the read window """
+        row, col = self.row - self.read_row, self.col - self.read_col
+        return slice(row, row + self.height), slice(col, col + self.width)
+
+
+def iter_windows(rows: int, cols: int, tile_size: int = 1024, halo: int = 0) -> Iterator[Window]:
+    """yields the tiles covering a rows x cols raster, read windows are clipped to the raster
+
+    Args:
+        rows (int): raster height
+        cols (int): raster width
+        tile_size (int, optional): height and width of a tile core. Defaults to 1024.
+        halo (int, optional): pixels of overlap read around each tile. Defaults to 0.
+    """
+    for row in range(0, rows, tile_size):
+        for col in range(0, cols, tile_size):
+            height, width = min(tile_size, rows - row), min(tile_size, cols - col)
+            read_row, read_col = max(row - halo, 0), max(col - halo, 0)
+            yield Window(
+                row=row,
+                col=col,
+                height=height,
+                width=width,
+                read_row=read_row,
+                read_col=read_col,
+                read_height=min(row + height + halo, rows) - read_row,
+                read_width=min(col + width + halo, cols) - read_col
+            )
+
+
+def apply_tiled(func: Callable[[np.ndarray], np.ndarray], array: np.ndarray, halo: int = 0,
+                tile_size: int = 1024, out: np.ndarray = None) -> np.ndarray:
+    """Applies func to array tile by tile. Only one tile (plus halo) is held in memory at a time
+    when array and out are memory mapped, e.g. np.load(..., mmap_mode='r') and
+    np.lib.format.open_memmap(..., mode='w+').
+
+    Args:
+        func (Callable[[np.ndarray], np.ndarray]): function of a (..., rows, cols) array that
+        returns an array of the same shape
+        array (np.ndarray): (..., rows, cols) input
+        halo (int, optional): pixels of overlap func needs around a tile, e.g. the filter radius.
+        Defaults to 0.
+        tile_size (int, optional): height and width of a tile core. Defaults to 1024.
+        out (np.ndarray, optional): output array, float64 in memory when not given.
+
+    Returns:
+        np.ndarray: the output array
+    """
+    out = np.empty(array.shape, dtype=np.float64) if out is None else out
+    for window in iter_windows(*array.shape[-2:], tile_size=tile_size, halo=halo):
+        tile = func(np.asarray(array[(..., *window.read)]))
+        out[(..., *window.core)] = tile[(..., *window.crop)]
+    return out
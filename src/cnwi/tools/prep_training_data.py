@@ -1,77 +1,82 @@
 """
 Idea is to take in training and validation and add some things to it
-POINT_X: float
-POINT_Y: float
+POINT_X: float (longitude)
+POINT_Y: float (latitude)
 isTraining: int
 value: int
 
-write to tmp folder, zip all valid extensions up and move zip to root, remove tmp
-"""
+and write them as a zipped shapefile ready to upload as a table asset
 
+python -m cnwi.tools.prep_training_data training.shp validation.shp land_cover -o data.zip
+"""
+import argparse
 import os
-import shutil
-import sys
-import zipfile
-
 from typing import List
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+import shapely
+
+def prep_training_data(training: gpd.GeoDataFrame, validation: gpd.GeoDataFrame,
+                       label: str) -> gpd.GeoDataFrame:
+    """Local counterpart of trainingd.prep_training_data for point layers, every column is
+    computed on whole arrays.
+
+    Args:
+        training (gpd.GeoDataFrame): training points, isTraining defaults to 1
+        validation (gpd.GeoDataFrame): validation points, isTraining defaults to 0, reprojected
+        to the CRS of training
+        label (str): the land cover label column
+
+    Returns:
+        gpd.GeoDataFrame: label, value (1 .. n in alphabetical label order), isTraining, POINT_X,
+        POINT_Y (longitude and latitude) and geometry, sorted by label
+    """
+    if validation.crs != training.crs:
+        validation = validation.to_crs(training.crs)
+    is_training = [
+        df['isTraining'].to_numpy() if 'isTraining' in df.columns else np.full(len(df), flag)
+        for df, flag in ((training, 1), (validation, 0))
+    ]
+    gdf = pd.concat([training[[label, 'geometry']], validation[[label, 'geometry']]],
+                    ignore_index=True)
+    codes, _ = pd.factorize(gdf[label], sort=True)
+    geometry = gpd.GeoSeries(gdf.geometry.to_numpy(), crs=training.crs)
+    lonlat = geometry.to_crs(4326).to_numpy()
 
-FILE_EXTENSIONS = ["shp", "dbf", "prj", "shx", "cpg", "fix", "qix", "sbn", "shp.xml"]
+    prepped = gpd.GeoDataFrame({
+        label: gdf[label].to_numpy(),
+        'value': codes + 1,
+        'isTraining': np.concatenate(is_training).astype(np.int64),
+        'POINT_X': shapely.get_x(lonlat),
+        'POINT_Y': shapely.get_y(lonlat),
+    }, geometry=geometry.to_numpy(), crs=training.crs)
+    order = np.argsort(codes, kind='stable')
+    return prepped.take(order).reset_index(drop=True)
 
 
-def get_files(dir) -> List[str]:
-    filenames = []
-    for file in os.listdir(dir):
-        _, ext = os.path.splitext(file)
-        if ext in FILE_EXTENSIONS:
-            filenames.append(os.path.join(dir, file))
-    return filenames
+def write_upload(gdf: gpd.GeoDataFrame, filename: str = "./data.zip") -> str:
+    """ writes the zipped shapefile in one pass, GDAL zips a .shp.zip while writing it """
+    stem = os.path.splitext(filename)[0]
+    tmp = f'{stem}.shp.zip'
+    gdf.to_file(tmp, driver='ESRI Shapefile')
+    if tmp != filename:
+        os.replace(tmp, filename)
+    return filename
 
 
-def main(training, validation, label):
-    args = sys.argv
-    
-    training_filename = args[1]
-    validation_filename =args[2]
-    label_column_name = args[3]
-    
-    gdf_t = gpd.read_file(training_filename)
-    gdf_v = gpd.read_file(validation_filename)
-    
-    if 'isTraining' not in gdf_t.columns:
-        gdf_t['isTraining'] = 1
+def main(args: List[str] = None) -> str:
+    parser = argparse.ArgumentParser(description="Prep training and validation points for upload")
+    parser.add_argument('training')
+    parser.add_argument('validation')
+    parser.add_argument('label', help="the land cover label column")
+    parser.add_argument('-o', '--output', default="./data.zip")
+    args = parser.parse_args(args)
 
-    if 'isTraining' not in gdf_v.columns:
-        gdf_v['isTraining'] = 0
-    
-    gdf = pd.concat([gdf_t, gdf_v])
-    
-    gdf['values'] = gdf[label_column_name]
-    land_covers = gdf[land_covers].unique().tolist()
-    values = list(range(1, len(land_covers) + 1))
-    lookup = dict(zip(land_covers, values))
+    gdf = prep_training_data(gpd.read_file(args.training), gpd.read_file(args.validation), args.label)
+    return write_upload(gdf, args.output)
 
-    gdf.replace({'values': lookup}, inplace=True)
-    
-    gdf.sort_values(by=[label_column_name], inplace=True)
-    gdf.reset_index(inplace=True)
-    gdf2 = gdf[[label_column_name, 'value', 'isTraining', 'geometry']]
-    gdf = None
-    
-    if not os.path.exists("./tmp"):
-        os.makedirs("./tmp")
-    
-    gdf2.to_file("./tmp/training_data.shp")
-    
-    valid_files = get_files("./tmp")
-    
-    with zipfile.ZipFile("./data.zip", mode='w') as archive:
-        for filename in valid_files:
-            archive.write(filename)
-    
-    return None
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,59 @@
+"""
+Persistent record of an export run. Every state change of a job is appended to a JSON lines file
+as it happens, so a run that dies part way can be resumed: completed cells are skipped and cells
+with a task in flight are polled again instead of being exported a second time.
+"""
+import json
+import os
+import time
+from typing import Any, Dict, Hashable, Tuple
+
+
+class RunLedger:
+    def __init__(self, filename: str) -> None:
+        """Append only JSON lines ledger, the last record of a key is its current state.
+
+        Args:
+            filename (str): path of the ledger, created if it does not exist
+        """
+        self.filename = filename
+        self.records: Dict[Hashable, Dict[str, Any]] = {}
+        # the last record of each key, output prefix and fingerprint, runs sharing the file keep
+        # their own state
+        self.runs: Dict[Tuple[Hashable, str, str], Dict[str, Any]] = {}
+        if os.path.exists(filename):
+            self._load()
+        elif os.path.dirname(filename):
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+    def _load(self) -> None:
+        with open(self.filename) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # partial line from a process that died while writing
+                    continue
+                self._add(record)
+
+    def _add(self, record: Dict[str, Any]) -> None:
+        self.records[record['key']] = record
+        self.runs[(record['key'], record.get('prefix'), record.get('fingerprint'))] = record
+
+    def get(self, key: Hashable) -> Dict[str, Any]:
+        return self.records.get(key)
+
+    def find(self, key: Hashable, prefix: str = None, fingerprint: str = None) -> Dict[str, Any]:
+        """ the last record of key written for the same output prefix and fingerprint """
+        return self.runs.get((key, prefix, fingerprint))
+
+    def record(self, key: Hashable, state: str, task_id: str = None, attempts: int = 0,
+               prefix: str = None, **kwargs) -> Dict[str, Any]:
+        record = {'key': key, 'state': state, 'task_id': task_id, 'attempts': attempts,
+                  'prefix': prefix, 'time': time.time(), **kwargs}
+        with open(self.filename, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._add(record)
+        return record
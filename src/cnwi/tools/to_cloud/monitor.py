@@ -0,0 +1,151 @@
+"""
+Asyncio monitor for export tasks. One driver process can supervise many export batches (fourier,
+terrain, classification, ...) at once: every watched task is polled in a single backend call per
+cycle, state changes are delivered to callbacks and as an async stream of events, and the polling
+interval backs off while nothing changes.
+
+Example
+-------
+```
+import asyncio
+
+from cnwi.tools.to_cloud.monitor import TaskMonitor
+from cnwi.tools.to_cloud.variables import build_fourier_exports, build_terrain_exports
+
+monitor = TaskMonitor()
+monitor.attach('fourier', build_fourier_exports(grid, bucket, 'ns'))
+monitor.attach('terrain', build_terrain_exports(grid, bucket, 'ns'))
+monitor.add_callback(print)
+asyncio.run(monitor.run())
+```
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List
+
+from cnwi.tools.to_cloud.scheduler import (ACTIVE_STATES, Backoff, EarthEngineBackend,
+                                           ExportScheduler, TaskBackend)
+
+
+@dataclass(frozen=True)
+class TaskEvent:
+    batch: str
+    task_id: str
+    key: Hashable
+    previous: str
+    state: str
+    status: Dict[str, Any] = field(default_factory=dict, compare=False)
+
+
+@dataclass
+class WatchedTask:
+    batch: str
+    key: Hashable
+    state: str
+
+
+class TaskMonitor:
+    def __init__(self, backend: TaskBackend = None, poll_interval: float = 10,
+                 max_poll_interval: float = 300, backoff: float = 2.0) -> None:
+        """Watches export tasks until they finish.
+
+        Args:
+            backend (TaskBackend, optional): Defaults to EarthEngineBackend.
+            poll_interval (float, optional): seconds between polls while tasks change state.
+            Defaults to 10.
+            max_poll_interval (float, optional): upper bound of the backoff. Defaults to 300.
+            backoff (float, optional): factor the interval grows by after a poll without
+            changes. Defaults to 2.0.
+        """
+        self.backend = EarthEngineBackend() if backend is None else backend
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.tasks: Dict[str, WatchedTask] = {}
+        self.schedulers: Dict[str, ExportScheduler] = {}
+        self.callbacks: List[Callable[[TaskEvent], Any]] = []
+        self._queues: List[asyncio.Queue] = []
+
+    def watch(self, batch: str, task_id: str, key: Hashable = None, state: str = 'READY') -> None:
+        self.tasks[task_id] = WatchedTask(batch=batch, key=key, state=state)
+
+    def attach(self, batch: str, scheduler: ExportScheduler) -> None:
+        """ drives an export scheduler: its jobs are started, watched and retried by the monitor """
+        self.schedulers[batch] = scheduler
+
+    def add_callback(self, callback: Callable[[TaskEvent], Any]) -> None:
+        """ called with every TaskEvent, coroutine functions are awaited """
+        self.callbacks.append(callback)
+
+    @property
+    def active(self) -> List[str]:
+        return [id for id, task in self.tasks.items() if task.state in ACTIVE_STATES]
+
+    @property
+    def done(self) -> bool:
+        return not self.active and not any(_.pending for _ in self.schedulers.values())
+
+    async def _fill(self) -> None:
+        """ lets the attached schedulers start jobs up to their caps and watches the new tasks """
+        for batch, scheduler in self.schedulers.items():
+            if scheduler.pending:
+                await asyncio.to_thread(scheduler.fill)
+            for job in scheduler.jobs.values():
+                if job.active and job.task_id not in self.tasks:
+                    self.watch(batch, job.task_id, key=job.key, state=job.state)
+
+    async def _dispatch(self, event: TaskEvent) -> None:
+        scheduler = self.schedulers.get(event.batch)
+        if scheduler is not None:
+            scheduler.handle(event.task_id, event.status)
+        for callback in self.callbacks:
+            result = callback(event)
+            if asyncio.iscoroutine(result):
+                await result
+        for queue in self._queues:
+            queue.put_nowait(event)
+
+    async def poll(self) -> List[TaskEvent]:
+        """ polls every active task in one backend call, returns the state changes """
+        active = self.active
+        if not active:
+            return []
+        statuses = await asyncio.to_thread(self.backend.status, active)
+        events = []
+        for task_id, status in statuses.items():
+            task = self.tasks[task_id]
+            if status['state'] == task.state:
+                continue
+            events.append(TaskEvent(batch=task.batch, task_id=task_id, key=task.key,
+                                    previous=task.state, state=status['state'], status=status))
+            task.state = status['state']
+        for event in events:
+            await self._dispatch(event)
+        return events
+
+    async def run(self) -> Dict[str, WatchedTask]:
+        """ polls until every watched task and attached scheduler is finished """
+        backoff = Backoff(self.poll_interval, self.max_poll_interval, self.backoff)
+        await self._fill()
+        while not self.done:
+            await asyncio.sleep(backoff.interval)
+            backoff.update(bool(await self.poll()))
+            await self._fill()
+        return self.tasks
+
+    async def events(self) -> AsyncIterator[TaskEvent]:
+        """ runs the monitor and yields each state change as it is observed """
+        queue = asyncio.Queue()
+        self._queues.append(queue)
+        runner = asyncio.create_task(self.run())
+        # wakes the consumer when the monitor finishes, or fails
+        runner.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            await runner
+        finally:
+            self._queues.remove(queue)
@@ -0,0 +1,181 @@
+"""
+Chunked sampleRegions for training sets too large for one request. The points are partitioned
+spatially (regular grid cells, or the cells of a grid such as S2 / UTM tiles) into chunks of at
+most max_points, each chunk is sampled by its own export through an ExportScheduler (bounded
+concurrency, ledger, retries) and the exported tables are merged. A failed chunk is retried with
+a doubled tileScale, up to 16. The tileScale is kept in the ledger, so a resumed run carries on
+from the escalated scale.
+"""
+import glob
+import hashlib
+import os
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, List, Union
+
+import ee
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from cnwi.tools.to_cloud.ledger import RunLedger
+from cnwi.tools.to_cloud.scheduler import ExportJob, ExportScheduler, TaskBackend
+
+MAX_TILE_SCALE = 16
+
+
+def chunk_points(points: gpd.GeoDataFrame, cell_size: float = 0.5, grid: gpd.GeoDataFrame = None,
+                 max_points: int = 5000) -> Dict[str, gpd.GeoDataFrame]:
+    """Partitions points spatially, cells holding more than max_points are cut into consecutive
+    chunks. Chunk keys are the cell key and the chunk number, e.g. 3_0.
+
+    Args:
+        points (gpd.GeoDataFrame): the training points
+        cell_size (float, optional): side of the regular grid cells, in units of the points' CRS.
+        Defaults to 0.5.
+        grid (gpd.GeoDataFrame, optional): cells with an id column to partition by instead, points
+        outside every cell are dropped. Defaults to None.
+        max_points (int, optional): points per chunk. Defaults to 5000.
+
+    Returns:
+        Dict[str, gpd.GeoDataFrame]: the points of each chunk
+    """
+    if grid is None:
+        col = np.floor(points.geometry.x.to_numpy() / cell_size).astype(np.int64)
+        row = np.floor(points.geometry.y.to_numpy() / cell_size).astype(np.int64)
+        cells = pd.Series([f'{c}_{r}' for c, r in zip(col, row)], index=points.index)
+    else:
+        joined = gpd.sjoin(points, grid[['id', 'geometry']].to_crs(points.crs), predicate='intersects')
+        cells = joined.loc[~joined.index.duplicated(), 'id'].astype(str)
+        points = points.loc[cells.index]
+
+    chunks = {}
+    for cell, group in points.groupby(cells, sort=True):
+        for idx, start in enumerate(range(0, len(group), max_points)):
+            chunks[f'{cell}_{idx}'] = group.iloc[start:start + max_points]
+    return chunks
+
+
+def _sample_task(stack: ee.Image, points: gpd.GeoDataFrame, bucket: str, prefix: str, scale: int,
+                 tile_scale: int, properties: List[str] = None) -> ee.batch.Task:
+    samples = stack.sampleRegions(**{
+        'collection': ee.FeatureCollection(points.to_crs(4326).__geo_interface__),
+        'scale': scale,
+        'tileScale': tile_scale,
+        'properties': properties,
+    })
+    return ee.batch.Export.table.toCloudStorage(
+        collection=samples,
+        description=os.path.basename(prefix),
+        bucket=bucket,
+        fileNamePrefix=prefix,
+        fileFormat='CSV'
+    )
+
+
+class ChunkedSampler:
+    def __init__(self, build: Callable[[Hashable, gpd.GeoDataFrame, str, int], Any],
+                 prefix: Callable[[Hashable], str], tile_scale: int = 2,
+                 max_tile_scale: int = MAX_TILE_SCALE, run: Any = None) -> None:
+        """Submits one sampling job per chunk, every retry of a chunk is built with twice the
+        tileScale of its previous attempt. The tileScale is stored in the job params, so a chunk
+        restored from the ledger resumes from its last scale.
+
+        Args:
+            build (Callable[[Hashable, gpd.GeoDataFrame, str, int], Any]): returns an unstarted
+            task for a chunk key, its points, its output prefix and a tileScale
+            prefix (Callable[[Hashable], str]): output prefix of a chunk key
+            tile_scale (int, optional): tileScale of the first attempt. Defaults to 2.
+            max_tile_scale (int, optional): Defaults to 16, the Earth Engine maximum.
+            run (Any, optional): what else identifies the sampling, e.g. the scale and
+            properties, part of every chunk's fingerprint. Defaults to None.
+        """
+        self.build = build
+        self.prefix = prefix
+        self.tile_scale = tile_scale
+        self.max_tile_scale = max_tile_scale
+        self.run = run
+        self.tile_scales: Dict[Hashable, int] = {}
+
+    def fingerprint(self, points: gpd.GeoDataFrame) -> str:
+        """ hash of the chunk's points and attributes, the initial tileScale and the run, a chunk
+        key holds other points once the point set or max_points change """
+        digest = hashlib.sha1(b''.join(shapely.to_wkb(points.geometry.to_numpy())))
+        attributes = points.drop(columns=points.geometry.name)
+        digest.update(pd.util.hash_pandas_object(attributes, index=True).to_numpy().tobytes())
+        digest.update(str((list(attributes.columns), self.tile_scale, self.run)).encode())
+        return digest.hexdigest()
+
+    def _build(self, job: ExportJob, points: gpd.GeoDataFrame) -> Any:
+        params = job.params or {}
+        previous = params.get('tile_scale')
+        tile_scale = self.tile_scale if previous is None else min(2 * previous, self.max_tile_scale)
+        # recorded with the start of the attempt
+        job.params = {**params, 'tile_scale': tile_scale}
+        self.tile_scales[job.key] = tile_scale
+        return self.build(job.key, points, job.prefix, tile_scale)
+
+    def submit(self, scheduler: ExportScheduler,
+               chunks: Dict[Hashable, gpd.GeoDataFrame]) -> ExportScheduler:
+        for key, points in chunks.items():
+            job = scheduler.submit(key, None, prefix=self.prefix(key),
+                                   fingerprint=self.fingerprint(points))
+            job.build = partial(self._build, job, points)
+        return scheduler
+
+
+def build_sample_exports(points: gpd.GeoDataFrame, stack: ee.Image, bucket: str, file_prefix: str,
+                         cell_size: float = 0.5, grid: gpd.GeoDataFrame = None,
+                         max_points: int = 5000, scale: int = 10, tile_scale: int = 2,
+                         properties: List[str] = None, max_concurrent: int = 10,
+                         max_retries: int = 3, backend: TaskBackend = None,
+                         ledger: str = None) -> ExportScheduler:
+    """Builds, without starting it, a scheduler sampling the stack at the points chunk by chunk.
+
+    Args:
+        points (gpd.GeoDataFrame): the training points
+        stack (ee.Image): the image to sample
+        bucket (str): cloud storage bucket of the sample tables
+        file_prefix (str): the table of chunk 3_0 is written to {file_prefix}_3_0.csv
+        cell_size (float, optional): regular grid cell size, see chunk_points. Defaults to 0.5.
+        grid (gpd.GeoDataFrame, optional): cells to partition by instead. Defaults to None.
+        max_points (int, optional): points per chunk. Defaults to 5000.
+        scale (int, optional): sampling scale. Defaults to 10.
+        tile_scale (int, optional): tileScale of the first attempt, doubled on every retry.
+        Defaults to 2.
+        properties (List[str], optional): point properties copied to the samples. Defaults to all.
+        max_concurrent (int, optional): exports running at the same time. Defaults to 10.
+        max_retries (int, optional): times a failed chunk is exported again. Defaults to 3.
+        backend (TaskBackend, optional): starts and polls the tasks. Defaults to Earth Engine.
+        ledger (str, optional): run ledger, a rerun skips the completed chunks. Defaults to None.
+    """
+    def build(key, chunk, prefix, tile_scale):
+        return _sample_task(stack, chunk, bucket, prefix, scale, tile_scale, properties)
+
+    sampler = ChunkedSampler(build, lambda key: f'{file_prefix}_{key}', tile_scale=tile_scale,
+                             run=(scale, properties))
+    scheduler = ExportScheduler(backend=backend, max_concurrent=max_concurrent,
+                                max_retries=max_retries,
+                                ledger=None if ledger is None else RunLedger(ledger))
+    return sampler.submit(scheduler, chunk_points(points, cell_size, grid, max_points))
+
+
+def sample_regions_2_cloud(points: gpd.GeoDataFrame, stack: ee.Image, bucket: str, file_prefix: str,
+                           **kwargs) -> Dict[Any, ExportJob]:
+    """ runs build_sample_exports, merge the downloaded tables with merge_samples """
+    scheduler = build_sample_exports(points, stack, bucket, file_prefix, **kwargs)
+    print("Sampling: Running on Cloud")
+    jobs = scheduler.run()
+    print("Sampling: Complete")
+    return jobs
+
+
+def merge_samples(sources: Union[str, List[str]]) -> pd.DataFrame:
+    """ concatenates the sample tables of the chunks, a glob pattern or a list of csvs """
+    filenames = sorted(glob.glob(sources)) if isinstance(sources, str) else sources
+    frames = [pd.read_csv(filename) for filename in filenames]
+    if not frames:
+        raise ValueError("No sample tables to merge")
+    samples = pd.concat(frames, ignore_index=True)
+    # system:index is only unique within a chunk
+    return samples.drop(columns=['system:index'], errors='ignore')
@@ -0,0 +1,262 @@
+"""
+Bounded parallelism for Earth Engine export tasks. Jobs are started up to a concurrency cap, the
+ID returned by each start is recorded against its job, status is polled for all running tasks in
+one batch with exponential backoff, and failed jobs are rebuilt and retried.
+
+The task backend is pluggable so the scheduler can be driven by a local fake in tests. With a
+RunLedger every state change is persisted, so a rerun skips completed jobs and resumes in flight
+ones.
+
+A failure hook can replace a failed job with smaller ones, see cnwi.tools.to_cloud.tiler.
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import ee
+
+from cnwi.tools.to_cloud.ledger import RunLedger
+
+ACTIVE_STATES = ['UNSUBMITTED', 'READY', 'RUNNING', 'CANCEL_REQUESTED']
+FAILED_STATES = ['FAILED', 'CANCELLED', 'UNKNOWN']
+COMPLETED = 'COMPLETED'
+PENDING = 'PENDING'
+SPLIT = 'SPLIT'
+
+
+@dataclass
+class Backoff:
+    """
+    Polling interval shared by ExportScheduler.run and TaskMonitor.run: back to poll_interval
+    after a poll that saw changes, otherwise grown by factor up to max_poll_interval.
+    """
+    poll_interval: float = 10
+    max_poll_interval: float = 300
+    factor: float = 2.0
+
+    def __post_init__(self) -> None:
+        self.interval = self.poll_interval
+
+    def update(self, changed: bool) -> float:
+        """ the interval until the next poll """
+        if changed:
+            self.interval = self.poll_interval
+        else:
+            self.interval = min(self.interval * self.factor, self.max_poll_interval)
+        return self.interval
+
+
+class TaskBackend:
+    """ starts tasks and reports their status """
+
+    def start(self, task: Any) -> str:
+        """ starts the task and returns its ID """
+        raise NotImplementedError
+
+    def status(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """ returns a status dict with at least a 'state' key for each task ID, IDs without a
+        status yet may be left out and are treated as unchanged """
+        raise NotImplementedError
+
+
+class EarthEngineBackend(TaskBackend):
+    def __init__(self, max_missing: int = 5) -> None:
+        """Earth Engine tasks.
+
+        Args:
+            max_missing (int, optional): polls a task may be missing from both the task list and
+            a direct lookup before it is reported UNKNOWN, i.e. failed. Defaults to 5.
+        """
+        self.max_missing = max_missing
+        self._missing: Dict[str, int] = {}
+
+    def start(self, task: ee.batch.Task) -> str:
+        task.start()
+        return task.id
+
+    def status(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        # one request for the whole task list instead of one per task
+        wanted = set(task_ids)
+        statuses = {_['id']: _ for _ in ee.data.getTaskList() if _['id'] in wanted}
+        # just started tasks or ones that fell off the list page are looked up directly
+        missing = [id for id in task_ids if id not in statuses]
+        if missing:
+            statuses.update({_['id']: _ for _ in ee.data.getTaskStatus(missing)
+                             if _.get('state', 'UNKNOWN') != 'UNKNOWN'})
+
+        result = {}
+        for id in task_ids:
+            if id in statuses:
+                self._missing.pop(id, None)
+                result[id] = statuses[id]
+                continue
+            self._missing[id] = self._missing.get(id, 0) + 1
+            if self._missing[id] >= self.max_missing:
+                result[id] = {'id': id, 'state': 'UNKNOWN'}
+        return result
+
+
+@dataclass
+class ExportJob:
+    """
+    key: identifies the job, e.g. the grid cell id
+    build: returns a new, unstarted task, called again for every retry
+    state: PENDING until started, then the last state reported by the backend
+    prefix: where the export writes its output
+    children: keys of the jobs that replaced this one when it was split
+    fingerprint: identifies what the job exports beyond its key and prefix, e.g. the cell geometry
+    params: set by build, kept in the ledger and restored on resume, e.g. the last tileScale
+    """
+    key: Hashable
+    build: Callable[[], Any]
+    state: str = PENDING
+    task_id: str = None
+    attempts: int = 0
+    error: str = None
+    prefix: str = None
+    children: List[Hashable] = None
+    fingerprint: str = None
+    params: Dict[str, Any] = None
+
+    @property
+    def active(self) -> bool:
+        return self.state in ACTIVE_STATES
+
+
+class ExportScheduler:
+    def __init__(self, backend: TaskBackend = None, max_concurrent: int = 10, max_retries: int = 2,
+                 poll_interval: float = 10, max_poll_interval: float = 300, backoff: float = 2.0,
+                 sleep: Callable[[float], None] = time.sleep, ledger: RunLedger = None,
+                 on_failure: Callable[[ExportJob], List[Tuple]] = None) -> None:
+        """Runs export jobs with at most max_concurrent tasks in flight.
+
+        Args:
+            backend (TaskBackend, optional): Defaults to EarthEngineBackend.
+            max_concurrent (int, optional): tasks started but not finished. Defaults to 10.
+            max_retries (int, optional): times a failed job is rebuilt and restarted. Defaults to 2.
+            poll_interval (float, optional): seconds between polls while tasks change state.
+            Defaults to 10.
+            max_poll_interval (float, optional): upper bound of the backoff. Defaults to 300.
+            backoff (float, optional): factor the interval grows by after a poll without
+            changes. Defaults to 2.0.
+            sleep (Callable[[float], None], optional): Defaults to time.sleep.
+            ledger (RunLedger, optional): persists job states and resumes a previous run.
+            Defaults to None.
+            on_failure (Callable, optional): called with a failed job, returns (key, build, prefix)
+            or (key, build, prefix, fingerprint) of jobs replacing it, or an empty list to retry it
+            as is. Defaults to None.
+        """
+        self.backend = EarthEngineBackend() if backend is None else backend
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.backoff = backoff
+        self.sleep = sleep
+        self.ledger = ledger
+        self.on_failure = on_failure
+        self.jobs: Dict[Hashable, ExportJob] = {}
+        self._by_task: Dict[str, ExportJob] = {}
+        # attempts a job may reach in this run, retries are counted per run
+        self._max_attempts: Dict[Hashable, int] = {}
+
+    def restorable(self, key: Hashable, prefix: str = None, fingerprint: str = None) -> Dict[str, Any]:
+        """ the ledger record of a key, None unless it was written for the same output prefix and
+        fingerprint, so another grid or prefix sharing the ledger does not skip cells """
+        return None if self.ledger is None else self.ledger.find(key, prefix, fingerprint)
+
+    def submit(self, key: Hashable, build: Callable[[], Any], prefix: str = None,
+               fingerprint: str = None) -> ExportJob:
+        job = ExportJob(key=key, build=build, prefix=prefix, fingerprint=fingerprint)
+        record = self.restorable(key, prefix, fingerprint)
+        if record is not None:
+            job.attempts = record['attempts']
+            job.task_id = record['task_id']
+            job.error = record.get('error')
+            job.children = record.get('children')
+            job.params = record.get('params')
+            # completed and split jobs are skipped and in flight ones polled, anything else starts again
+            if record['state'] in [COMPLETED, SPLIT] or record['state'] in ACTIVE_STATES:
+                job.state = record['state']
+                self._by_task[job.task_id] = job
+        self.jobs[key] = job
+        self._max_attempts[key] = job.attempts + self.max_retries + 1
+        return job
+
+    def _record(self, job: ExportJob) -> None:
+        if self.ledger is not None:
+            self.ledger.record(job.key, job.state, task_id=job.task_id, attempts=job.attempts,
+                               prefix=job.prefix, error=job.error, children=job.children,
+                               fingerprint=job.fingerprint, params=job.params)
+
+    def _start(self, job: ExportJob) -> None:
+        job.attempts += 1
+        job.task_id = self.backend.start(job.build())
+        job.state = 'READY'
+        job.error = None
+        self._by_task[job.task_id] = job
+        self._record(job)
+
+    @property
+    def pending(self) -> bool:
+        """ True while any job is waiting to be started or restarted """
+        return any(job.state == PENDING for job in self.jobs.values())
+
+    def fill(self) -> None:
+        """ starts pending jobs until the concurrency cap is reached """
+        running = sum(1 for job in self.jobs.values() if job.active)
+        for job in self.jobs.values():
+            if running >= self.max_concurrent:
+                break
+            if job.state == PENDING:
+                self._start(job)
+                running += 1
+
+    def _update(self, job: ExportJob, status: Dict[str, Any]) -> bool:
+        """ applies a status to a job, returns True if the job changed state """
+        state = status['state']
+        if state == job.state:
+            return False
+        job.state = state
+        if state in FAILED_STATES:
+            job.error = status.get('error_message')
+        self._record(job)
+        if state not in FAILED_STATES:
+            return True
+        children = [] if self.on_failure is None else self.on_failure(job)
+        if children:
+            job.state = SPLIT
+            job.children = [child[0] for child in children]
+            self._record(job)
+            for child in children:
+                self.submit(*child)
+        elif job.attempts < self._max_attempts[job.key]:
+            # back to the queue, rebuilt and started when there is room
+            job.state = PENDING
+        return True
+
+    def handle(self, task_id: str, status: Dict[str, Any]) -> bool:
+        """ applies a status observed elsewhere, e.g. by a TaskMonitor, to the job of a task """
+        job = self._by_task.get(task_id)
+        if job is None or job.task_id != task_id:
+            return False
+        return self._update(job, status)
+
+    def poll(self) -> bool:
+        """ refreshes the state of every active job in one batch, returns True if any changed """
+        active = {job.task_id: job for job in self.jobs.values() if job.active}
+        if not active:
+            return False
+        statuses = self.backend.status(list(active))
+        changed = [self._update(active[id], status) for id, status in statuses.items()]
+        return any(changed)
+
+    def run(self) -> Dict[Hashable, ExportJob]:
+        """ blocks until every job is completed or out of retries """
+        backoff = Backoff(self.poll_interval, self.max_poll_interval, self.backoff)
+        self.fill()
+        while self.pending or any(job.active for job in self.jobs.values()):
+            self.sleep(backoff.interval)
+            backoff.update(self.poll())
+            self.fill()
+        return self.jobs
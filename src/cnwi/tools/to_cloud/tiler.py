@@ -0,0 +1,170 @@
+"""
+Adaptive tiling of export grids. A grid cell whose export fails with a memory or time limit is
+split into four quadrants (quadtree) and the children are exported in its place. An optional cost
+model pre-splits cells that are likely to fail before anything is submitted. Every split is
+recorded, so the exported tiles of a cell can be found and mosaicked consistently.
+"""
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import geopandas as gpd
+from shapely.geometry import MultiPolygon, Polygon, box
+from shapely.geometry.base import BaseGeometry
+from shapely.ops import unary_union
+
+from cnwi.tools.to_cloud.scheduler import SPLIT, ExportJob, ExportScheduler
+
+RESOURCE_ERRORS = re.compile(
+    r'memory limit|out of memory|computation timed out|timed out|too many pixels|'
+    r'too many concurrent aggregations|capacity', re.IGNORECASE
+)
+
+
+def is_resource_error(message: str) -> bool:
+    """ True for errors that a smaller region is likely to avoid """
+    return message is not None and RESOURCE_ERRORS.search(message) is not None
+
+
+def _polygonal(geometry: BaseGeometry) -> BaseGeometry:
+    """ the polygons of a geometry, intersections along an edge or corner add lines and points """
+    if isinstance(geometry, (Polygon, MultiPolygon)):
+        return geometry
+    return unary_union([part for part in getattr(geometry, 'geoms', [])
+                        if isinstance(part, (Polygon, MultiPolygon))])
+
+
+def quadtree_split(geometry: BaseGeometry) -> List[BaseGeometry]:
+    """ splits a geometry into its polygonal parts in the four quadrants of its bounds, quadrants
+    the geometry only touches are dropped """
+    xmin, ymin, xmax, ymax = geometry.bounds
+    xmid, ymid = (xmin + xmax) / 2, (ymin + ymax) / 2
+    quadrants = [box(xmin, ymid, xmid, ymax), box(xmid, ymid, xmax, ymax),
+                 box(xmin, ymin, xmid, ymid), box(xmid, ymin, xmax, ymid)]
+    parts = [_polygonal(geometry.intersection(quadrant)) for quadrant in quadrants]
+    return [part for part in parts if part.area > 0]
+
+
+@dataclass(frozen=True)
+class CostModel:
+    """
+    Rough cost of exporting a cell: pixels x bands x filter iterations. Areas are computed in the
+    cell's UTM zone, geometries are expected in EPSG:4326.
+    """
+    scale: float
+    bands: int = 1
+    iterations: int = 1
+
+    def pixels(self, geometry: BaseGeometry) -> float:
+        series = gpd.GeoSeries([geometry], crs=4326)
+        return float(series.to_crs(series.estimate_utm_crs()).area.iloc[0]) / self.scale ** 2
+
+    def __call__(self, geometry: BaseGeometry) -> float:
+        return self.pixels(geometry) * self.bands * self.iterations
+
+
+# fourier exports: 10 m Sentinel 2, constant, time and a cos / sin pair for each of 3 modes
+FOURIER_COST = CostModel(scale=10, bands=8)
+# terrain exports: 30 m NASADEM, six TAGEE bands, ten Perona-Malik iterations
+TERRAIN_COST = CostModel(scale=30, bands=6, iterations=10)
+
+
+class AdaptiveTiler:
+    def __init__(self, build: Callable[[Hashable, BaseGeometry, str], Any],
+                 prefix: Callable[[Hashable], str], max_depth: int = 3,
+                 cost: Callable[[BaseGeometry], float] = None, max_cost: float = None,
+                 run: str = None) -> None:
+        """Submits grid cells to an ExportScheduler and splits cells that fail with resource
+        errors. Children of cell 3 are 3_0 .. 3_3 (NW, NE, SW, SE), their children 3_0_0 and so on.
+
+        Args:
+            build (Callable[[Hashable, BaseGeometry, str], Any]): returns an unstarted task for a
+            cell id, its geometry and its output prefix
+            prefix (Callable[[Hashable], str]): output prefix of a cell id
+            max_depth (int, optional): maximum number of times a cell is split. Defaults to 3.
+            cost (Callable[[BaseGeometry], float], optional): cost model of a cell, e.g. a CostModel.
+            max_cost (float, optional): cells costing more are split before submission.
+            run (str, optional): what else identifies the exports, e.g. the bucket. Ledger records
+            are only restored for cells with the same geometry and run.
+        """
+        self.build = build
+        self.prefix = prefix
+        self.max_depth = max_depth
+        self.cost = cost
+        self.max_cost = max_cost
+        self.run = run
+        self.scheduler: ExportScheduler = None
+        self.geometries: Dict[Hashable, BaseGeometry] = {}
+        self.parents: Dict[Hashable, Hashable] = {}
+        self.depths: Dict[Hashable, int] = {}
+        self.splits: Dict[Hashable, List[Hashable]] = {}
+
+    def _children(self, key: Hashable) -> List[Tuple[Hashable, BaseGeometry]]:
+        children = [(f'{key}_{idx}', part)
+                    for idx, part in enumerate(quadtree_split(self.geometries[key]))]
+        self.splits[key] = [child for child, _ in children]
+        for child, part in children:
+            self.geometries[child] = part
+            self.parents[child] = key
+            self.depths[child] = self.depths[key] + 1
+        return children
+
+    def _too_expensive(self, key: Hashable) -> bool:
+        if self.cost is None or self.max_cost is None or self.depths[key] >= self.max_depth:
+            return False
+        return self.cost(self.geometries[key]) > self.max_cost
+
+    def fingerprint(self, key: Hashable) -> str:
+        """ hash of the cell's geometry and the run """
+        digest = hashlib.sha1(self.geometries[key].wkb)
+        digest.update(str(self.run).encode())
+        return digest.hexdigest()
+
+    def _submit(self, key: Hashable) -> None:
+        prefix = self.prefix(key)
+        fingerprint = self.fingerprint(key)
+        record = self.scheduler.restorable(key, prefix, fingerprint)
+        already_split = record is not None and record['state'] == SPLIT
+        if already_split or self._too_expensive(key):
+            for child, _ in self._children(key):
+                self._submit(child)
+            if not already_split and self.scheduler.ledger is not None:
+                self.scheduler.ledger.record(key, SPLIT, prefix=prefix, children=self.splits[key],
+                                             fingerprint=fingerprint)
+            return
+        self.scheduler.submit(key, lambda: self.build(key, self.geometries[key], prefix), prefix=prefix,
+                              fingerprint=fingerprint)
+
+    def submit(self, scheduler: ExportScheduler, grid: gpd.GeoDataFrame) -> ExportScheduler:
+        """ submits every cell of the grid (id and geometry columns) and makes the scheduler split
+        cells that fail with a resource error """
+        self.scheduler = scheduler
+        scheduler.on_failure = self.split
+        for key, geometry in zip(grid['id'].tolist(), grid.geometry):
+            self.geometries[key] = geometry
+            self.depths[key] = 0
+            self._submit(key)
+        return scheduler
+
+    def split(self, job: ExportJob) -> List[Tuple[Hashable, Callable[[], Any], str, str]]:
+        """ children of a failed job, empty when the failure is not resource related or the cell
+        is at max depth """
+        if not is_resource_error(job.error) or self.depths[job.key] >= self.max_depth:
+            return []
+        children = []
+        for child, geometry in self._children(job.key):
+            prefix = self.prefix(child)
+            children.append((child, lambda child=child, geometry=geometry, prefix=prefix:
+                             self.build(child, geometry, prefix), prefix, self.fingerprint(child)))
+        return children
+
+    def to_geodataframe(self) -> gpd.GeoDataFrame:
+        """ every cell with its parent, depth and whether it was split, for mosaicking """
+        keys = list(self.geometries)
+        return gpd.GeoDataFrame(data={
+            'id': [str(_) for _ in keys],
+            'parent': [None if self.parents.get(_) is None else str(self.parents[_]) for _ in keys],
+            'depth': [self.depths[_] for _ in keys],
+            'split': [_ in self.splits for _ in keys],
+        }, geometry=[self.geometries[_] for _ in keys], crs=4326)
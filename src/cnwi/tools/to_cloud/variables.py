@@ -1,11 +1,17 @@
 import os
-import time
+import re
+from functools import partial
+from typing import Any, Dict, Tuple
 
 import ee
 import geopandas as gpd
+from shapely.geometry import mapping
 
 from cnwi.fourier import fourier
 from cnwi.elev import build_elevation_inpts, NASA_DEM
+from cnwi.tools.to_cloud.ledger import RunLedger
+from cnwi.tools.to_cloud.scheduler import SPLIT, ExportJob, ExportScheduler, TaskBackend
+from cnwi.tools.to_cloud.tiler import FOURIER_COST, TERRAIN_COST, AdaptiveTiler
 
 
 def load_grid(filename: str) -> gpd.GeoDataFrame:
@@ -28,7 +34,99 @@ def cloud_mask(image: ee.Image):
     return image.updateMask(mask)
 
 
-def fourier_transform_2_cloud(grid: gpd.GeoDataFrame, bucket: str, file_prefix: str, filename: str = None) -> None:
+def _log_jobs(tiler: AdaptiveTiler, jobs: Dict[Any, ExportJob], column: str, filename: str) -> None:
+    """ writes every cell, split ones and their children included, with the task id and final
+    state of its export """
+    if not os.path.exists("../logging"):
+        os.makedirs("../logging")
+    gdf = tiler.to_geodataframe()
+    gdf[column] = [jobs[key].task_id if key in jobs else None for key in tiler.geometries]
+    gdf['STATE'] = [jobs[key].state if key in jobs else SPLIT for key in tiler.geometries]
+    gdf.to_file(os.path.join('../logging', filename), driver='GeoJSON')
+
+
+def ledger_path(kind: str, bucket: str, file_prefix: str, filename: str = None) -> str:
+    """ default ledger of an export run, one per destination so runs do not share records """
+    name = '-'.join([kind, bucket, file_prefix, filename if filename is not None else f'{kind}-export'])
+    return os.path.join('../logging', re.sub(r'[^\w.-]+', '_', name) + '-ledger.jsonl')
+
+
+def _fourier_prefix(file_prefix: str, id: int, filename: str = None) -> str:
+    return file_prefix + f'/{filename if filename is not None else "fourier-export"}/{id}/{filename}-{id}-'
+
+
+def _terrain_prefix(file_prefix: str, grid_id: int, filename: str = None) -> str:
+    return file_prefix + f'/{filename if filename is not None else "terrain-export"}/{grid_id}/{filename}-{grid_id}-'
+
+
+def _fourier_task(s2_SR: ee.ImageCollection, region: ee.Geometry, bucket: str, prefix: str, 
+                  modes: int = 3) -> ee.batch.Task:
+    ft = fourier(
+        ee_object=s2_SR.filterBounds(region),
+        modes=modes,
+        omega=1
+    ).clip(region)
+
+    return ee.batch.Export.image.toCloudStorage(
+        image=ft,
+        description="",
+        bucket=bucket,
+        fileNamePrefix=prefix,
+        scale=10,
+        crs='EPSG:4326',
+        region=region,
+        maxPixels=1e13,
+        shardSize=256,
+        fileDimensions=[4096, 4096],
+        skipEmptyTiles=True,
+        formatOptions={
+            'cloudOptimized': True
+        }
+    )
+
+
+def _build_fourier_exports(grid: gpd.GeoDataFrame, bucket: str, file_prefix: str, filename: str = None,
+                           max_concurrent: int = 10, max_retries: int = 2, 
+                           backend: TaskBackend = None, 
+                           ledger: str = None, max_split_depth: int = 2,
+                           max_cost: float = None) -> Tuple[ExportScheduler, AdaptiveTiler]:
+    MODES = 3
+    DATES = ('2017', '2022')
+
+    s2_SR = ee.ImageCollection("COPERNICUS/S2_SR")\
+        .filterBounds(ee.FeatureCollection(grid.__geo_interface__))\
+        .filterDate(*DATES).filter('CLOUDY_PIXEL_PERCENTAGE < 20').map(cloud_mask)
+
+    def build(id, geometry, prefix):
+        return _fourier_task(s2_SR, ee.Geometry(mapping(geometry)), bucket, prefix, MODES)
+
+    tiler = AdaptiveTiler(build, partial(_fourier_prefix, file_prefix, filename=filename), 
+                          max_depth=max_split_depth, cost=FOURIER_COST, max_cost=max_cost, run=bucket)
+    ledger = ledger_path('fourier', bucket, file_prefix, filename) if ledger is None else ledger
+    scheduler = ExportScheduler(backend=backend, max_concurrent=max_concurrent, 
+                                max_retries=max_retries, ledger=RunLedger(ledger))
+    tiler.submit(scheduler, grid.drop_duplicates('id'))
+    return scheduler, tiler
+
+
+def build_fourier_exports(grid: gpd.GeoDataFrame, bucket: str, file_prefix: str, filename: str = None,
+                          max_concurrent: int = 10, max_retries: int = 2, 
+                          backend: TaskBackend = None, 
+                          ledger: str = None, max_split_depth: int = 2,
+                          max_cost: float = None) -> ExportScheduler:
+    """ builds the export scheduler of fourier_transform_2_cloud without starting it, e.g. to 
+    attach it to a TaskMonitor together with other batches """
+    return _build_fourier_exports(grid, bucket, file_prefix, filename=filename, 
+                                  max_concurrent=max_concurrent, max_retries=max_retries, 
+                                  backend=backend, ledger=ledger, max_split_depth=max_split_depth, 
+                                  max_cost=max_cost)[0]
+
+
+def fourier_transform_2_cloud(grid: gpd.GeoDataFrame, bucket: str, file_prefix: str, filename: str = None,
+                              max_concurrent: int = 10, max_retries: int = 2, 
+                              backend: TaskBackend = None, 
+                              ledger: str = None, 
+                              max_split_depth: int = 2, max_cost: float = None) -> Dict[Any, ExportJob]:
     """Does a Fourier Transform on a Sentinel 2 SR Image Collection from 2017 - 2022. The collection 
     has been filtered by cloud pixel percentage (20). It filters the Image Collection by the total
     extent of the defined grid in. It then uses the grid cells to do fine grained filtering on the
@@ -43,109 +141,99 @@ def fourier_transform_2_cloud(grid: gpd.GeoDataFrame, bucket: str, file_prefix:
         grid (gpd.GeoDataFrame): _description_
         bucket (str): _description_
         file_prefix (str): _description_
+        max_concurrent (int, optional): exports running at the same time. Defaults to 10.
+        max_retries (int, optional): times a failed cell is exported again. Defaults to 2.
+        backend (TaskBackend, optional): starts and polls the tasks. Defaults to Earth Engine.
+        ledger (str, optional): run ledger, a rerun with the same ledger skips completed cells
+        and resumes running ones. Defaults to a ledger in ../logging named after the bucket,
+        file_prefix and filename, see ledger_path.
+        max_split_depth (int, optional): times a cell failing on memory or time limits is split
+        into quadrants. Defaults to 2.
+        max_cost (float, optional): cells over this pixels x bands cost are split before they are
+        exported. Defaults to None, no pre-splitting.
+
+    Returns:
+        Dict[Any, ExportJob]: the export job of each grid id, and of each split cell's quadrants
     """    
-    MODES = 3
-    DATES = ('2017', '2022')
+    scheduler, tiler = _build_fourier_exports(grid, bucket, file_prefix, filename=filename, 
+                                              max_concurrent=max_concurrent, max_retries=max_retries, 
+                                              backend=backend, ledger=ledger, 
+                                              max_split_depth=max_split_depth, max_cost=max_cost)
     
-    gdf = grid
-    gdf2 = gdf.copy()
-    grid_ids = gdf2['id'].unique().tolist()
-    grid = ee.FeatureCollection(gdf.__geo_interface__)
-
-    s2_SR = ee.ImageCollection("COPERNICUS/S2_SR").filterBounds(grid)\
-        .filterDate(*DATES).filter('CLOUDY_PIXEL_PERCENTAGE < 20').map(cloud_mask)
-    print("Exports: Starting")
-    for id in grid_ids:
-        print(f"Grid ID: {id}")
-        # create the intial collection 
-        region = grid.filter(f'id == {id}').geometry()
-        
-        ft = fourier(
-            ee_object=s2_SR.filterBounds(region),
-            modes=MODES,
-            omega=1
-        ).clip(region)
-
-        task = ee.batch.Export.image.toCloudStorage(
-            image=ft,
-            description="",
-            bucket=bucket,
-            fileNamePrefix=file_prefix + f'/{filename if filename is not None else "fourier-export"}/{id}/{filename}-{id}-',
-            scale=10,
-            crs='EPSG:4326',
-            region=region,
-            maxPixels=1e13,
-            shardSize=256,
-            fileDimensions=[4096, 4096],
-            skipEmptyTiles=True,
-            formatOptions={
-                'cloudOptimized': True
-            }
-        )
-        task.start()
     print("Exports: Running on Cloud")
-    if not os.path.exists("../logging"):
-        os.makedirs("../logging")
-    # step into the task monitoring routine
-    tasks = ee.batch.Task.list()[:len(grid_ids)]
-    ids = [task.id for task in tasks]
-    ids.reverse()
-    gdf2['FOURIER_TASK_IDS'] = ids
-    gdf2.to_file('../logging/fourier-grid.geojson', driver='GeoJSON')
-    while any([task.state in ['READY', 'RUNNING'] for task in tasks]):
-        time.sleep(10)
-        tasks = [task for task in ee.batch.Task.list() if task.id in gdf2['FOURIER_TASK_IDS'].tolist()]
-
+    jobs = scheduler.run()
+    _log_jobs(tiler, jobs, 'FOURIER_TASK_IDS', 'fourier-grid.geojson')
     print("Export: Complete")
-
-
-def terrain_analysis_2_cloud(grid: gpd.GeoDataFrame, bucket: str, file_prefix: str, filename: str = None):
-   
-    gdf = grid
-    gdf2 = gdf.copy()
-    grid_ids = gdf2['id'].unique().tolist()
-    grid = ee.FeatureCollection(gdf.__geo_interface__)
-    
-   
-    for grid_id in grid_ids:
-        geom = grid.filter(f'id == {grid_id}').geometry()
-        dem = NASA_DEM()
-
-        ta = build_elevation_inpts(
-            dem=dem,
-            aoi=geom
-        )
-
-        ta_clp = ta.clip(geom)
-        task = ee.batch.Export.image.toCloudStorage(
-            image=ta_clp,
-            description="",
-            bucket=bucket,
-            fileNamePrefix=file_prefix + f'/{filename if filename is not None else "terrain-export"}/{grid_id}/{filename}-{grid_id}-',
-            scale=30,
-            fileDimensions=[4096, 4096],
-            region=geom,
-            crs='EPSG:4326',
-            maxPixels=1e13,
-            skipEmptyTiles=True,
-            formatOptions={
-                'cloudOptimized': True
-            }
-        )
-        task.start()
+    return jobs
+
+
+def _terrain_task(geom: ee.Geometry, bucket: str, prefix: str) -> ee.batch.Task:
+    dem = NASA_DEM()
+
+    ta = build_elevation_inpts(
+        dem=dem,
+        aoi=geom
+    )
+
+    ta_clp = ta.clip(geom)
+    return ee.batch.Export.image.toCloudStorage(
+        image=ta_clp,
+        description="",
+        bucket=bucket,
+        fileNamePrefix=prefix,
+        scale=30,
+        fileDimensions=[4096, 4096],
+        region=geom,
+        crs='EPSG:4326',
+        maxPixels=1e13,
+        skipEmptyTiles=True,
+        formatOptions={
+            'cloudOptimized': True
+        }
+    )
+
+
+def _build_terrain_exports(grid: gpd.GeoDataFrame, bucket: str, file_prefix: str, filename: str = None,
+                           max_concurrent: int = 10, max_retries: int = 2, 
+                           backend: TaskBackend = None, 
+                           ledger: str = None, max_split_depth: int = 2,
+                           max_cost: float = None) -> Tuple[ExportScheduler, AdaptiveTiler]:
+    def build(grid_id, geometry, prefix):
+        return _terrain_task(ee.Geometry(mapping(geometry)), bucket, prefix)
+
+    tiler = AdaptiveTiler(build, partial(_terrain_prefix, file_prefix, filename=filename), 
+                          max_depth=max_split_depth, cost=TERRAIN_COST, max_cost=max_cost, run=bucket)
+    ledger = ledger_path('terrain', bucket, file_prefix, filename) if ledger is None else ledger
+    scheduler = ExportScheduler(backend=backend, max_concurrent=max_concurrent, 
+                                max_retries=max_retries, ledger=RunLedger(ledger))
+    tiler.submit(scheduler, grid.drop_duplicates('id'))
+    return scheduler, tiler
+
+
+def build_terrain_exports(grid: gpd.GeoDataFrame, bucket: str, file_prefix: str, filename: str = None,
+                          max_concurrent: int = 10, max_retries: int = 2, 
+                          backend: TaskBackend = None, 
+                          ledger: str = None, max_split_depth: int = 2,
+                          max_cost: float = None) -> ExportScheduler:
+    """ builds the export scheduler of terrain_analysis_2_cloud without starting it """
+    return _build_terrain_exports(grid, bucket, file_prefix, filename=filename, 
+                                  max_concurrent=max_concurrent, max_retries=max_retries, 
+                                  backend=backend, ledger=ledger, max_split_depth=max_split_depth, 
+                                  max_cost=max_cost)[0]
+
+
+def terrain_analysis_2_cloud(grid: gpd.GeoDataFrame, bucket: str, file_prefix: str, filename: str = None,
+                             max_concurrent: int = 10, max_retries: int = 2, 
+                             backend: TaskBackend = None, 
+                             ledger: str = None, 
+                             max_split_depth: int = 2, max_cost: float = None) -> Dict[Any, ExportJob]:
+    scheduler, tiler = _build_terrain_exports(grid, bucket, file_prefix, filename=filename, 
+                                              max_concurrent=max_concurrent, max_retries=max_retries, 
+                                              backend=backend, ledger=ledger, 
+                                              max_split_depth=max_split_depth, max_cost=max_cost)
     
-    # gets the inital state of the tasks
     print("Exports: Running on Cloud")
-    # step into the task monitoring routine
-    if not os.path.exists("../logging"):
-        os.makedirs("../logging")
-    tasks = ee.batch.Task.list()[:len(grid_ids)]
-    ids = [task.id for task in tasks]
-    ids.reverse()
-    gdf2['TERRAIN_TASK_IDS'] = ids
-    gdf2.to_file('../logging/terrain-grid.geojson', driver='GeoJSON')
-    while any([task.state in ['READY', 'RUNNING'] for task in tasks]):
-        time.sleep(10)
-        tasks = [task for task in ee.batch.Task.list() if task.id in gdf2['TERRAIN_TASK_IDS']\
-            .tolist()]
-    print("Export: Complete")
\ No newline at end of file
+    jobs = scheduler.run()
+    _log_jobs(tiler, jobs, 'TERRAIN_TASK_IDS', 'terrain-grid.geojson')
+    print("Export: Complete")
+    return jobs
@@ -1,8 +1,19 @@
 import csv
 import json
-from typing import Tuple, List
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Tuple, List
+
 import ee
 
+from .graph import serialize
+from .partition import partition_training as stratified_partition
+
+# Earth Engine rejects requests over 10 MB, the encoded graph of a batch is two to three times the
+# size of its GeoJSON
+MAX_PAYLOAD = 10 * 2 ** 20
+ENCODING_OVERHEAD = 2
+
 
 def _insert_xy(element: ee.Feature):
     coords = element.geometry().coordinates()
@@ -26,19 +37,19 @@ def prep_training_data(col: ee.FeatureCollection, class_property: str = None) ->
     Returns:
         ee.FeatureCollection: a feature collection that has been preped for downstream use
     """    
-    # add corrdinates
-    if class_property is not None:
-        classes = col.aggregate_array(class_property).distinct().sort()
-        values = ee.List.sequence(1, classes.size())
-        lookup = ee.Dictionary.fromLists(classes, values)
-        col = col.map(lambda x: x.set('value', lookup.get(x.get(class_property))))
-    # add randomColumn
-    return col.map(_insert_xy)
+    if class_property is None:
+        return col.map(_insert_xy)
+    classes = col.aggregate_array(class_property).distinct().sort()
+    values = ee.List.sequence(1, classes.size())
+    lookup = ee.Dictionary.fromLists(classes, values)
+    # remap and add the coordinates in one pass over the collection
+    return col.map(lambda x: _insert_xy(x).set('value', lookup.get(x.get(class_property))))
 
 
 def generate_samples(col: ee.FeatureCollection, stack: ee.Image, scale: int = 10, 
                      tile_scale: int = 16, properties: List[str] = None) -> ee.FeatureCollection:
-    """ Generates samples off the input collection and stack
+    """ Generates samples off the input collection and stack, for point sets too large for one
+    request see cnwi.tools.to_cloud.sampling
     Returns:
         ee.FeatureCollection: a geometryless feature collection
     """
@@ -53,45 +64,200 @@ def generate_samples(col: ee.FeatureCollection, stack: ee.Image, scale: int = 10
     return sample
 
 
-def partition_training(col: ee.FeatureCollection, partition: float) -> Tuple[ee.FeatureCollection]:
+def partition_training(col: ee.FeatureCollection, partition: float, class_property: str = None,
+                       seed: int = 0, id: str = 'id') -> Tuple[ee.FeatureCollection]:
     """used to split a single dataset into training and validation.
 
     Args:
         col (ee.FeatureCollection): the collection to partition
         partition (float): number to split on must be between 0 and 1
+        class_property (str, optional): stratifies the split by this class column, see
+        partition.partition_training (in memory, for large sets split the exported samples with
+        partition.partition_frame). Defaults to None, a seeded random split.
+        seed (int, optional): the random seed. Defaults to 0.
+        id (str, optional): integer id column of a stratified split. Defaults to 'id'.
 
     Returns:
         Tuple[ee.FeatureCollection]: training, validation
-    """    
-    col = col.randomColumn()
+    """
+    if class_property is not None:
+        return stratified_partition(col, partition, class_property, seed, id)
+    col = col.randomColumn('random', seed)
     training = col.filter(f'random <= {partition}')
     validation = col.filter(f'random > {partition}')
     return training, validation
 
 
-def fc_from_file(filename: str) -> ee.FeatureCollection:
-    def _read_csv(filename) -> List[ee.Feature]:
-        with open(filename) as csvfile:
-            reader = csv.DictReader(csvfile)
-            features = [ee.Feature(None, row) for row in reader]
-        return features
-    
-    def _read_geojson(filename) -> List[ee.Feature]:
-        with open(filename) as f:
-            data = json.load(f)
-        
-        return [ee.Feature(None, _['properties']) for _ in data['features']]
-    
-    codecs = {
-        'csv': _read_csv,
-        'geojson': _read_geojson
-    }
-    
-    ext = filename.split(".")[-1]
-    
-    writer = codecs.get(ext, None)
-    
-    if writer is None:
+def _parse(value: str) -> Any:
+    """ csv cells to numbers where possible, class values should not reach EE as strings. Zero
+    padded ids (e.g. 007) stay strings and NaN cells become None """
+    digits = value.lstrip('+-')
+    if len(digits) > 1 and digits[0] == '0' and digits[1] != '.':
+        return value
+    for type_ in (int, float):
+        try:
+            value = type_(value)
+        except ValueError:
+            continue
+        # NaN is not valid JSON, EE has no use for it either
+        return None if value != value else value
+    return value
+
+
+def _read_csv(filename: str, x: str, y: str) -> Iterator[Dict[str, Any]]:
+    """ GeoJSON features of the rows of a csv, the geometry is the .geo column of an EE export or
+    a point from the x, y columns """
+    with open(filename, newline='') as csvfile:
+        for row in csv.DictReader(csvfile):
+            geo = row.pop('.geo', None)
+            properties = {k: _parse(v) for k, v in row.items()}
+            if geo:
+                geometry = json.loads(geo)
+            elif x in properties and y in properties:
+                geometry = {'type': 'Point', 'coordinates': [properties[x], properties[y]]}
+            else:
+                geometry = None
+            yield {'type': 'Feature', 'geometry': geometry, 'properties': properties}
+
+
+def _read_geojson(filename: str, batch_size: int = 10_000) -> Iterator[Dict[str, Any]]:
+    """ GeoJSON features of a geojson, streamed batch_size features at a time by GDAL """
+    import shapely
+    from pyogrio.raw import open_arrow
+
+    # GDAL parses date like strings into date fields, which json can not encode
+    with open_arrow(filename, batch_size=batch_size, use_pyarrow=True,
+                    DATE_AS_STRING='YES') as (meta, reader):
+        geometry_name = meta['geometry_name'] or 'wkb_geometry'
+        for batch in reader:
+            wkb = batch.column(geometry_name).to_numpy(zero_copy_only=False)
+            geometries = shapely.to_geojson(shapely.from_wkb(wkb))
+            for geometry, row in zip(geometries, batch.to_pylist()):
+                yield {
+                    'type': 'Feature',
+                    'geometry': None if geometry is None else json.loads(geometry),
+                    'properties': {k: None if v != v else v for k, v in row.items()
+                                   if k != geometry_name},
+                }
+
+
+@dataclass
+class FeatureBatch:
+    """ a payload sized batch of GeoJSON features, nbytes is the size of its encoded request """
+    features: List[Dict[str, Any]]
+    nbytes: int = 0
+
+    def to_collection(self) -> ee.FeatureCollection:
+        return ee.FeatureCollection([
+            ee.Feature(None if _['geometry'] is None else ee.Geometry(_['geometry']), _['properties'])
+            for _ in self.features
+        ])
+
+
+def feature_batches(filename: str, max_bytes: int = MAX_PAYLOAD, x: str = 'POINT_X',
+                    y: str = 'POINT_Y') -> Iterator[FeatureBatch]:
+    """Reads a csv or geojson feature by feature into batches whose encoded request stays under
+    max_bytes.
+
+    Args:
+        filename (str): csv or geojson, csv geometries come from a .geo column or the x, y columns
+        max_bytes (int, optional): request payload limit. Defaults to 10 MiB.
+        x (str, optional): longitude column of a csv. Defaults to 'POINT_X'.
+        y (str, optional): latitude column of a csv. Defaults to 'POINT_Y'.
+
+    Yields:
+        Iterator[FeatureBatch]: the batches, with their encoded size
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == '.csv':
+        features = _read_csv(filename, x, y)
+    elif ext in ('.geojson', '.json'):
+        features = _read_geojson(filename)
+    else:
         raise ValueError("File Not supported")
-    
-    return ee.FeatureCollection(writer)
+
+    # the overhead is calibrated on every encoded batch, batches that still exceed the limit are
+    # halved, so every batch is guaranteed to fit
+    overhead = ENCODING_OVERHEAD
+    batch, size = [], 0
+    for feature in features:
+        feature_size = len(json.dumps(feature, separators=(',', ':'))) + 1
+        if batch and (size + feature_size) * overhead > max_bytes:
+            encoded = list(_encoded(batch, max_bytes))
+            overhead = max(overhead, 1.05 * sum(_.nbytes for _ in encoded) / size)
+            yield from encoded
+            batch, size = [], 0
+        batch.append(feature)
+        size += feature_size
+    if batch:
+        yield from _encoded(batch, max_bytes)
+
+
+def _encoded(features: List[Dict[str, Any]], max_bytes: int) -> Iterator[FeatureBatch]:
+    batch = FeatureBatch(features)
+    batch.nbytes = len(json.dumps(serialize(batch.to_collection()), separators=(',', ':')))
+    if batch.nbytes <= max_bytes or len(features) == 1:
+        yield batch
+        return
+    half = len(features) // 2
+    yield from _encoded(features[:half], max_bytes)
+    yield from _encoded(features[half:], max_bytes)
+
+
+def fc_from_file(filename: str, max_bytes: int = MAX_PAYLOAD, x: str = 'POINT_X', y: str = 'POINT_Y',
+                 verbose: bool = False) -> ee.FeatureCollection:
+    """Loads a csv or geojson, keeping geometries, as a FeatureCollection merged from payload sized
+    batches. The merged collection is sent in one request, so it has to fit max_bytes too, upload
+    larger inputs with upload_batches.
+
+    Args:
+        filename (str): csv or geojson
+        max_bytes (int, optional): payload limit of the request. Defaults to 10 MiB.
+        x (str, optional): longitude column of a csv. Defaults to 'POINT_X'.
+        y (str, optional): latitude column of a csv. Defaults to 'POINT_Y'.
+        verbose (bool, optional): prints the features and encoded size of each batch.
+
+    Raises:
+        ValueError: the encoded collection is larger than max_bytes
+
+    Returns:
+        ee.FeatureCollection: the features of the file
+    """
+    collections = []
+    for idx, batch in enumerate(feature_batches(filename, max_bytes, x, y)):
+        if verbose:
+            print(f"batch {idx}: {len(batch.features)} features, {batch.nbytes / 2 ** 20:.2f} MiB")
+        collections.append(batch.to_collection())
+    if len(collections) == 1:
+        return collections[0]
+
+    merged = ee.FeatureCollection(collections).flatten()
+    nbytes = len(json.dumps(serialize(merged), separators=(',', ':')))
+    if nbytes > max_bytes:
+        raise ValueError(f"{filename} encodes to {nbytes / 2 ** 20:.2f} MiB, over the "
+                         f"{max_bytes / 2 ** 20:.2f} MiB request limit, upload its "
+                         f"{len(collections)} batches with upload_batches instead")
+    return merged
+
+
+def upload_batches(filename: str, asset_id: str, max_bytes: int = MAX_PAYLOAD, x: str = 'POINT_X',
+                   y: str = 'POINT_Y') -> Tuple[ee.FeatureCollection, List[ee.batch.Task]]:
+    """Exports each batch of a file to its own table asset, asset_id_0, asset_id_1 .., so no single
+    request carries more than one batch.
+
+    Returns:
+        Tuple[ee.FeatureCollection, List[ee.batch.Task]]: the merged assets, readable once the
+        started tasks complete, and the tasks
+    """
+    asset_ids, tasks = [], []
+    for idx, batch in enumerate(feature_batches(filename, max_bytes, x, y)):
+        batch_id = f'{asset_id}_{idx}'
+        task = ee.batch.Export.table.toAsset(
+            collection=batch.to_collection(),
+            description=os.path.basename(batch_id),
+            assetId=batch_id
+        )
+        task.start()
+        asset_ids.append(batch_id)
+        tasks.append(task)
+    return ee.FeatureCollection([ee.FeatureCollection(_) for _ in asset_ids]).flatten(), tasks
@@ -0,0 +1,15 @@
+import ee
+import pytest
+
+
+@pytest.fixture
+def ee_offline(monkeypatch):
+    """ initializes the Earth Engine client from the algorithm signatures shipped with
+    earthengine-api, graphs can be built and serialized without credentials or a network """
+    apitestcase = pytest.importorskip('ee.apitestcase')
+    monkeypatch.setattr(ee.data, '_install_cloud_api_resource', lambda: None)
+    monkeypatch.setattr(ee.data, 'getAlgorithms', apitestcase.GetAlgorithms)
+    ee.Reset()
+    ee.Initialize(None, '', project='offline')
+    yield
+    ee.Reset()
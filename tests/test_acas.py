@@ -0,0 +1,44 @@
+import json
+import os
+
+import ee
+import pandas as pd
+
+from cnwi import acas, graph
+
+
+def test_get_labels_scans_samples_once(ee_offline) -> None:
+    samples = ee.FeatureCollection([ee.Feature(None, {'value': idx % 3 + 1, 'class_name': f'c{idx % 3}'})
+                                    for idx in range(9)])
+    labels = acas._get_labels(ee.List([1, 2, 3]), samples, 'value', 'class_name')
+
+    functions = graph.profile(labels).functions
+    assert functions['Collection.reduceColumns'] == 1
+    assert 'Collection.filter' not in functions
+
+
+def _metrics_geojson(labels) -> dict:
+    properties = [{'confusion_matrix': [[8, 2], [1, 9]]}, {'order': [1, 2]}, {'overall': 0.85},
+                  {'producers': [0.8, 0.9]}, {'consumers': [0.89, 0.82]}, {'labels': labels}]
+    return {'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'geometry': None, 'properties': _} for _ in properties]}
+
+
+def test_metrics_bundle_writes_every_table(tmp_path) -> None:
+    infiles = []
+    for tile in range(3):
+        infile = tmp_path / f'tile_{tile}.geojson'
+        infile.write_text(json.dumps(_metrics_geojson(['bog', 'fen'])))
+        infiles.append(str(infile))
+
+    acas.metric_tables_to_csv(infiles[0], str(tmp_path / 'csv'))
+    assert sorted(os.listdir(tmp_path / 'csv')) == ['confusion_matrix.csv', 'consumers.csv',
+                                                    'overall.csv', 'producers.csv']
+
+    summary = acas.metric_files_to_tables(infiles, str(tmp_path / 'parquet'), fmt='parquet', workers=2)
+    assert summary['overall'].tolist() == [0.85] * 3
+    frame = pd.read_parquet(summary['path'][0])
+    assert frame.groupby('table').size().to_dict() == {'confusion': 4, 'consumers': 2,
+                                                       'overall': 1, 'producers': 2}
+    confusion = frame[frame['table'] == 'confusion'].pivot(index='row', columns='column', values='value')
+    assert confusion.loc['bog', 'fen'] == 2
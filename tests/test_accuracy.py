@@ -0,0 +1,56 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from cnwi.accuracy import AccuracyAssessment, accuracy_metrics
+
+
+def _samples(n: int = 2000, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    actual = rng.integers(1, 5, n)
+    predicted = np.where(rng.random(n) < 0.8, actual, rng.integers(1, 5, n))
+    return pd.DataFrame({'value': actual, 'classification': predicted,
+                         'class_name': [f'class_{_}' for _ in actual]})
+
+
+def test_metrics_match_definitions() -> None:
+    samples = _samples()
+    matrix = pd.crosstab(samples['value'], samples['classification']).to_numpy()
+    metrics = accuracy_metrics(matrix)
+
+    diagonal = np.diag(matrix)
+    total = matrix.sum()
+    overall = diagonal.sum() / total
+    expected = sum(matrix[i].sum() * matrix[:, i].sum() for i in range(4)) / total ** 2
+    producers = diagonal / matrix.sum(axis=1)
+    consumers = diagonal / matrix.sum(axis=0)
+
+    assert np.isclose(metrics['overall'], overall)
+    assert np.isclose(metrics['kappa'], (overall - expected) / (1 - expected))
+    assert np.allclose(metrics['producers'], producers)
+    assert np.allclose(metrics['consumers'], consumers)
+    assert np.allclose(metrics['f1'], 2 * producers * consumers / (producers + consumers))
+
+
+def test_streamed_files_match_in_memory(tmp_path) -> None:
+    samples = _samples()
+    samples.to_csv(tmp_path / 'validated.csv', index=False)
+    samples.to_parquet(tmp_path / 'validated.parquet')
+    features = [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-60, 45]},
+                 'properties': row} for row in samples.to_dict('records')]
+    (tmp_path / 'validated.geojson').write_text(
+        json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    expected = pd.crosstab(samples['class_name'], samples['classification']).to_numpy()
+    for filename in ['validated.csv', 'validated.parquet', 'validated.geojson']:
+        assessment = AccuracyAssessment.from_file(str(tmp_path / filename), actual='value',
+                                                  label='class_name', chunksize=300)
+        cfm = assessment.confusion_matrix()
+        assert cfm.index.tolist() == ['class_1', 'class_2', 'class_3', 'class_4']
+        assert np.array_equal(cfm.to_numpy(), expected)
+
+    intervals = assessment.bootstrap(n=200, seed=1).set_index(['metric', 'class'])
+    assert len(intervals) == 2 + 3 * 4
+    assert (intervals['lower'] <= intervals['estimate']).all()
+    assert (intervals['estimate'] <= intervals['upper']).all()
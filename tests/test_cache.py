@@ -0,0 +1,43 @@
+import ee
+
+from cnwi.cache import GraphCache, graph_key
+
+CONSTANT = ee.ApiFunction('Image.constant', {
+    'args': [{'name': 'value', 'type': 'Object'}], 'returns': 'Image'
+})
+
+
+def constant(value) -> ee.ComputedObject:
+    return ee.ComputedObject(CONSTANT, {'value': value})
+
+
+def test_identical_graphs_are_served_from_disk(tmp_path) -> None:
+    calls = []
+
+    def compute(obj):
+        calls.append(obj)
+        return {'bands': ['constant'], 'n': len(calls)}
+
+    cache = GraphCache(str(tmp_path), compute=compute)
+    assert graph_key(constant(1)) == graph_key(constant(1)) != graph_key(constant(2))
+    assert cache.get(constant(1)) == cache.get(constant(1)) == {'bands': ['constant'], 'n': 1}
+    assert cache.get(constant(2))['n'] == 2
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+
+    # a new process reads the same entries
+    cache = GraphCache(str(tmp_path), compute=compute)
+    assert cache.get(constant(2))['n'] == 2 and len(calls) == 2 and cache.stats.hit_rate == 1.0
+    assert cache.get(constant(2), namespace='other')['n'] == 3
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path) -> None:
+    cache = GraphCache(str(tmp_path), max_bytes=3 * 1100, compute=lambda obj: 'x' * 1000)
+    for value in range(3):
+        cache.get(constant(value))
+    cache.get(constant(0))
+    cache.get(constant(3))
+
+    assert cache.stats.evictions == 1
+    assert constant(1) not in cache
+    assert constant(0) in cache and constant(3) in cache
+    assert cache.size <= cache.max_bytes
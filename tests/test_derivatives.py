@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from cnwi import derivatives as d
+
+
+def make_bands(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    names = ['B2', 'B3', 'B4', 'B8', 'B11', 'B12']
+    bands = {name: rng.integers(0, 10_000, size=(32, 32)).astype(np.uint16) for name in names}
+    bands['B4'][0, 0] = bands['B8'][0, 0] = 0
+    return names, bands
+
+
+def test_ndvi_savi_compute() -> None:
+    _, bands = make_bands()
+    nir, red = bands['B8'].astype(np.float64), bands['B4'].astype(np.float64)
+    with np.errstate(invalid='ignore'):
+        nd = (nir - red) / (nir + red)
+    nd[0, 0] = 0
+
+    np.testing.assert_allclose(d.NDVI().compute(bands)['NDVI'], nd, rtol=1e-6)
+    np.testing.assert_allclose(d.SAVI(coef=0.5).compute(bands)['SAVI'], nd * 1.5, rtol=1e-6)
+
+
+def test_tassel_cap_compute_matches_matrix_multiply() -> None:
+    names, bands = make_bands()
+    tc = d.TasselCap()
+    stack = np.stack([bands[_] for _ in names])
+
+    result = tc.compute(stack, band_names=names)
+    inputs = np.stack([bands[_] for _ in tc.bands]).reshape(6, -1).astype(np.float32)
+    expected = (np.asarray(d.TASSEL_CAP_COEFFICIENTS, dtype=np.float32) @ inputs).reshape(3, 32, 32)
+
+    assert list(result) == tc.NAME
+    for name, band in zip(tc.NAME, expected):
+        np.testing.assert_allclose(result[name], band, rtol=1e-5, atol=1e-2)
+
+
+def test_ratio_compute_zero_denominator() -> None:
+    result = d.Ratio('VV', 'VH').compute({'VV': np.array([2.0, 3.0]), 'VH': np.array([4.0, 0.0])})
+    np.testing.assert_array_equal(result['Ratio_VV_VH'], [0.5, 0.0])
+
+
+def test_pipeline_compute_suffixes_duplicate_names() -> None:
+    names, bands = make_bands()
+    pipeline = d.DerivativePipeline([d.NDVI(), d.NDVI(nir='B11', red='B4'), d.TasselCap()])
+
+    result = pipeline.compute(bands)
+
+    assert pipeline.bands == ['B8', 'B4', 'B11', 'B2', 'B3', 'B12']
+    assert list(result) == ['NDVI', 'NDVI_1', 'Brightness', 'Greenness', 'Wetness']
+    np.testing.assert_array_equal(result['NDVI'], d.NDVI().compute(bands)['NDVI'])
+
+
+def test_calculators_need_a_local_backend() -> None:
+    class NoLocal(d._RasterCalculator):
+        def _calculation(self, image):
+            return image
+
+    with pytest.raises(TypeError):
+        NoLocal()
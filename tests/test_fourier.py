@@ -0,0 +1,219 @@
+import itertools
+import re
+from types import SimpleNamespace
+from typing import Any, Dict
+
+import ee
+import numpy as np
+
+from cnwi import fourier, graph
+
+
+def synthetic_cube(modes: int = 3, size: int = 12):
+    rng = np.random.default_rng(0)
+    days = np.sort(rng.choice(365 * 5, 80, replace=False))
+    dates = np.datetime64('2017-01-01') + days.astype('timedelta64[D]')
+    X = fourier.harmonic_design(dates, modes=modes, omega=1)
+    beta = rng.normal(scale=0.1, size=(X.shape[1], size, size))
+    return dates, beta, np.einsum('tp,prc->trc', X, beta)
+
+
+def test_harmonic_regression_recovers_coefficients() -> None:
+    dates, beta, cube = synthetic_cube()
+    # clouds on half of the pixels, too few clear dates on one
+    cube[:, :6][np.random.default_rng(1).random(cube[:, :6].shape) < 0.3] = np.nan
+    cube[5:, 0, 0] = np.nan
+
+    coeff = fourier.harmonic_regression(cube, dates, modes=3, omega=1, chunk_size=50)
+
+    assert np.isnan(coeff[:, 0, 0]).all()
+    mask = np.ones(cube.shape[1:], dtype=bool)
+    mask[0, 0] = False
+    np.testing.assert_allclose(coeff[:, mask], beta[:, mask], atol=1e-6)
+
+
+def test_harmonic_regression_rank_deficient() -> None:
+    dates, _, cube = synthetic_cube()
+    # 6 dates for 8 coefficients, complete and gappy pixels agree on no solution
+    cube = cube[:6].copy()
+    cube[0, 0, 0] = np.nan
+    coeff = fourier.harmonic_regression(cube, dates[:6], modes=3, omega=1)
+    assert np.isnan(coeff).all()
+
+
+def test_fourier_array_bands() -> None:
+    dates, beta, cube = synthetic_cube(modes=2)
+    bands = fourier.fourier_array(cube, dates, modes=2, omega=1)
+    assert list(bands) == ['constant_coeff', 't_coeff', 'sin_1_coeff', 'sin_2_coeff', 'cos_1_coeff',
+                           'cos_2_coeff', 'amp_1', 'amp_2', 'phase_1', 'phase_2']
+    np.testing.assert_allclose(bands['phase_2'], (np.arctan2(beta[3], beta[5]) + 1) / 2, atol=1e-6)
+
+
+def harmonic_collection() -> ee.ImageCollection:
+    images = [ee.Image.constant([0.1 * _, 1]).rename(['NDVI', 'constant'])
+              .set('system:time_start', ee.Date(f'20{17 + _}-06-01').millis()) for _ in range(5)]
+    return ee.ImageCollection(images).map(fourier.add_time(omega=1))
+
+
+def evaluate(obj: Any) -> Dict[str, Any]:
+    """ band name to value of the image a serialized graph builds, for the functions FourierImage
+    uses. Values are known for constant images only, None otherwise """
+    encoded = graph.serialize(obj)
+    values = encoded['values']
+
+    def arg(node, scope):
+        if 'valueReference' in node:
+            return arg(values[node['valueReference']], scope)
+        if 'constantValue' in node:
+            return node['constantValue']
+        if 'arrayValue' in node:
+            return [arg(_, scope) for _ in node['arrayValue']['values']]
+        if 'argumentReference' in node:
+            return scope[node['argumentReference']]
+        if 'functionDefinitionValue' in node:
+            return node['functionDefinitionValue']
+        return call(node['functionInvocationValue'], scope)
+
+    def call(invocation, scope):
+        name = invocation['functionName']
+        args = {k: arg(v, scope) for k, v in invocation['arguments'].items()}
+        if name in ('Image.float', 'Image.cos', 'Image.sin'):
+            return {k: None for k in args['value']}
+        if name == 'Image.multiply':
+            return {k: None for k in args['image1']}
+        if name == 'Image.atan2':
+            return {k: None if v is None else np.arctan2(v, u)
+                    for (k, v), u in zip(args['image1'].items(), args['image2'].values())}
+        if name == 'Image.unitScale':
+            return {k: None if v is None else (v - args['low']) / (args['high'] - args['low'])
+                    for k, v in args['input'].items()}
+        if name == 'Image.constant':
+            value = args['value']
+            if isinstance(value, list):
+                return {f'constant_{idx}': v for idx, v in enumerate(value)}
+            return {'constant': value if isinstance(value, (int, float)) else None}
+        if name == 'Image.rename':
+            return dict(zip(args['names'], args['input'].values()))
+        if name == 'Image.select':
+            selectors = args['bandSelectors']
+            selectors = selectors if isinstance(selectors, list) else [selectors]
+            bands = args['input']
+            return {k: bands[k] for selector in selectors for k in bands
+                    if re.fullmatch(selector, k)}
+        if name == 'Image.addBands':
+            return {**args['dstImg'], **args['srcImg']}
+        if name == 'Image.arrayFlatten':
+            labels = itertools.product(*args['coordinateLabels'])
+            return {args.get('separator', '_').join(_): None for _ in labels}
+        if name in ('Element.set', 'reduce.median'):
+            return args.get('object', args.get('collection'))
+        if name == 'ImageCollection.fromImages':
+            return args['images'][0]
+        if name == 'ImageCollection.reduce':
+            return {'coefficients': None, 'residuals': None}
+        if name == 'Collection.map':
+            function = args['baseAlgorithm']
+            inner = {**scope, function['argumentNames'][0]: args['collection']}
+            return arg({'valueReference': function['body']}, inner)
+        if name in ('Date', 'Date.difference', 'Date.millis', 'Image.date', 'Number.multiply',
+                    'Reducer.linearRegression'):
+            return None
+        raise NotImplementedError(name)
+
+    return arg({'valueReference': encoded['result']}, {})
+
+
+def test_single_pass_fourier_image(ee_offline) -> None:
+    time_series = harmonic_collection()
+    fitted = fourier.model(time_series, modes=2, dependent_var='NDVI')
+    single = fourier.FourierImage(fitted, time_series, single_pass=True)
+    mapped = fourier.FourierImage(fitted, time_series)
+
+    # the band order of the images that are built, not of band_names
+    local = fourier.fourier_bands(np.zeros((6, 1, 1)), modes=2)
+    assert list(evaluate(single)) == list(evaluate(mapped)) == list(local) == single.band_names
+
+    single_graph, mapped_graph = graph.profile(single), graph.profile(mapped)
+    # only the maps of the model itself remain, amplitude and phase are no longer mapped per mode
+    assert mapped_graph.functions['Collection.map'] - single_graph.functions['Collection.map'] == 5
+    assert 'reduce.median' not in single_graph.functions
+    assert single_graph.node_count < mapped_graph.node_count
+
+
+def test_single_pass_matches_fourier_bands(ee_offline) -> None:
+    independent = fourier.harmonic_names(2)
+    coefficients = np.random.default_rng(3).normal(scale=0.5, size=len(independent))
+    fitted = SimpleNamespace(independent=independent, modes=[1, 2], coefficients=ee.Image.constant(
+        coefficients.tolist()).rename([f'{_}_coeff' for _ in independent]))
+
+    bands = evaluate(fourier.FourierImage._single_pass(None, fitted))
+    local = fourier.fourier_bands(coefficients[:, None, None], modes=2)
+    assert list(bands) == list(local)
+    np.testing.assert_allclose([bands[_] for _ in local], [local[_][0, 0] for _ in local])
+
+
+def test_accumulator_array_matches_batch_fit(tmp_path) -> None:
+    dates, beta, cube = synthetic_cube()
+    cube[np.random.default_rng(2).random(cube.shape) < 0.2] = np.nan
+
+    acc = fourier.HarmonicAccumulatorArray.empty(cube.shape[1:], modes=3, omega=1)
+    acc.update(cube[:50], dates[:50])
+    filename = acc.save(str(tmp_path / 'acc.npz'))
+    # the overlapping dates were already added and are skipped
+    acc = fourier.HarmonicAccumulatorArray.load(filename).update(cube[40:], dates[40:])
+
+    np.testing.assert_array_equal(acc.n, (~np.isnan(cube)).sum(axis=0))
+    np.testing.assert_allclose(acc.solve(chunk_size=50),
+                               fourier.harmonic_regression(cube, dates, modes=3, omega=1), atol=1e-8)
+
+
+def test_accumulator_bands(ee_offline) -> None:
+    acc = fourier.HarmonicAccumulator(modes=2)
+    assert len(acc.xtx_names) == 6 * 7 // 2
+    accumulators = acc.update(acc.accumulate(harmonic_collection()), harmonic_collection())
+    ft = fourier.FourierImage(fourier.IncrementalModel(acc, accumulators), None, single_pass=True)
+    assert ft.band_names == fourier.fourier_band_names(2)
+    assert graph.profile(ft).functions['Image.matrixSolve'] == 1
+
+
+def test_accumulator_sums_in_double(ee_offline) -> None:
+    acc = fourier.HarmonicAccumulator(modes=2)
+    encoded = graph.serialize(acc.accumulate(harmonic_collection()))
+
+    def invocations(node):
+        if isinstance(node, dict):
+            if 'valueReference' in node:
+                node = encoded['values'][node['valueReference']]
+            if 'functionInvocationValue' in node:
+                yield node['functionInvocationValue']
+            if 'functionDefinitionValue' in node:
+                node = {'body': {'valueReference': node['functionDefinitionValue']['body']}}
+            for child in node.values():
+                yield from invocations(child)
+        elif isinstance(node, list):
+            for child in node:
+                yield from invocations(child)
+
+    def function(node):
+        return next(invocations(node))['functionName']
+
+    calls = list(invocations({'valueReference': encoded['result']}))
+    # x and y are cast before the outer product and x'y, the float32 t band would lose t^2
+    outer = [call['arguments']['image'] for call in calls
+             if call['functionName'] == 'Image.toArray' and 'axis' not in call['arguments']]
+    xty = [call['arguments'] for call in calls if call['functionName'] == 'Image.multiply'
+           and function(call['arguments']['image2']) != 'Image.constant']
+    assert outer and all(function(_) == 'Image.double' for _ in outer)
+    assert xty and all(function(_['image1']) == function(_['image2']) == 'Image.double' for _ in xty)
+
+
+def test_accumulator_update_without_new_images(ee_offline) -> None:
+    acc = fourier.HarmonicAccumulator(modes=2)
+    accumulators = acc.accumulate(harmonic_collection())
+    updated = acc.update(accumulators, ee.ImageCollection([]))
+    # the update is guarded by the size of the new images and falls back to the accumulators
+    node = graph.serialize(updated)
+    guard = node['values'][node['result']]['functionInvocationValue']
+    assert guard['functionName'] == 'If'
+    assert set(guard['arguments']) == {'condition', 'trueCase', 'falseCase'}
+    assert graph.profile(updated).functions['Collection.size'] == 1
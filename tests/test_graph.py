@@ -0,0 +1,36 @@
+import ee
+
+from cnwi import graph
+
+ADD = ee.ApiFunction('Image.add', {
+    'args': [{'name': 'image1', 'type': 'Image'}, {'name': 'image2', 'type': 'Image'}],
+    'returns': 'Image'
+})
+CONSTANT = ee.ApiFunction('Image.constant', {
+    'args': [{'name': 'value', 'type': 'Object'}], 'returns': 'Image'
+})
+
+
+def doubling_graph(iterations: int) -> ee.ComputedObject:
+    """ each iteration uses the previous image twice, the expanded tree doubles in size """
+    image = ee.ComputedObject(CONSTANT, {'value': 1})
+    for _ in range(iterations):
+        image = ee.ComputedObject(ADD, {'image1': image, 'image2': image})
+    return image
+
+
+def test_profile_counts_shared_subgraphs() -> None:
+    result = graph.profile(doubling_graph(10))
+
+    # constant -> value leaf, then one add per iteration
+    assert result.unique_nodes == 12
+    assert result.node_count == 3 * 2 ** 10 - 1
+    assert result.depth == 12
+    assert result.repeated_subgraphs == 10
+    assert result.functions == {'Image.add': 10, 'Image.constant': 1}
+    assert result.serialized_bytes == len(ee.serializer.toJSON(doubling_graph(10)).encode())
+
+
+def test_profile_accepts_serialized_forms() -> None:
+    encoded = ee.serializer.encode(doubling_graph(3))
+    assert graph.profile(encoded) == graph.profile(ee.serializer.toJSON(doubling_graph(3)))
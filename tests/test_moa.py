@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from cnwi.moa import ClassStatistics, moa_calc, moa_calc_stream, _moa_calc_loop
+
+
+def make_samples(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(rng.normal(size=(500, 6)) * 10, columns=[f'b{i}' for i in range(6)])
+    df['cDesc'] = rng.choice(['bog', 'fen', 'marsh', 'swamp'], 500)
+    df['POINT_X'] = rng.uniform(size=500)
+    return df
+
+
+def test_moa_calc_matches_loop() -> None:
+    df = make_samples()
+    expected = _moa_calc_loop(df, 'cDesc')
+    result = moa_calc(df, 'cDesc')
+
+    assert list(result.columns) == ['labels', 'rank', 'band', 'scores']
+    assert result['labels'].tolist() == expected['labels'].tolist()
+    assert result['rank'].tolist() == expected['rank'].tolist()
+    assert result['band'].tolist() == expected['band'].tolist()
+    np.testing.assert_allclose(result['scores'], expected['scores'], rtol=1e-10)
+    assert 'POINT_X' not in result['band'].unique()
+
+
+def test_moa_calc_stream_matches_in_memory(tmp_path) -> None:
+    df = make_samples(seed=1)
+    expected = moa_calc(df, 'cDesc')
+
+    filename = tmp_path / 'samples.csv'
+    df.to_csv(filename, index=False)
+    from_file = moa_calc_stream(filename, 'cDesc', chunksize=37)
+    chunks = [df.iloc[:0]] + [df.iloc[i:i + 50] for i in range(0, len(df), 50)]
+    from_chunks = moa_calc_stream(iter(chunks), 'cDesc')
+
+    for result in [from_file, from_chunks]:
+        assert result['labels'].tolist() == expected['labels'].tolist()
+        assert result['band'].tolist() == expected['band'].tolist()
+        np.testing.assert_allclose(result['scores'], expected['scores'], rtol=1e-10)
+
+
+def test_class_statistics_skip_absent_classes() -> None:
+    df = make_samples()
+    df['cDesc'] = pd.Categorical(df['cDesc'], categories=['alvar', 'bog', 'fen', 'marsh', 'swamp'])
+    stats = ClassStatistics.from_frame(df[df['cDesc'] != 'fen'], 'cDesc')
+    assert sorted(stats.labels) == ['bog', 'marsh', 'swamp']
+    bog = df[df['cDesc'] == 'bog'].drop(columns=['cDesc', 'POINT_X']).to_numpy()
+    np.testing.assert_allclose(stats.mean[stats.labels.index('bog')], bog.mean(axis=0))
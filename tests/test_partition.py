@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from cnwi import graph, partition
+
+
+def _ee_arithmetic(id: int, seed: int) -> float:
+    # the server side hash step by step in doubles, like ee.Number
+    state = float(id) + float(seed * partition.SEED_STRIDE)
+    state = state % (partition.MODULUS - 1) + 1
+    for _ in range(partition.ROUNDS):
+        state = (state * partition.MULTIPLIER) % partition.MODULUS
+    return state / partition.MODULUS
+
+
+def test_hash_matches_server_arithmetic() -> None:
+    ids = np.array([0, 1, 2, 17, 123456, 2 ** 31 - 3, 10 ** 9])
+    for seed in [0, 42]:
+        expected = [_ee_arithmetic(id, seed) for id in ids.tolist()]
+        assert np.array_equal(partition.hash_random(ids, seed), expected)
+
+
+def test_stratified_splits_are_balanced_and_reproducible() -> None:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'id': rng.permutation(1000), 'value': rng.choice([1, 2, 3], 1000, p=[0.6, 0.3, 0.1])})
+
+    training, validation = partition.partition_frame(df, 0.7, 'value', seed=7)
+    sizes = df['value'].value_counts()
+    assert training['value'].value_counts().to_dict() == np.floor(sizes * 0.7 + 0.5).astype(int).to_dict()
+    assert len(training) + len(validation) == 1000
+    assert training.equals(partition.partition_frame(df, 0.7, 'value', seed=7)[0])
+    assert not training.equals(partition.partition_frame(df, 0.7, 'value', seed=8)[0])
+
+    folds = partition.kfold_frame(df, 5, 'value', seed=7)
+    counts = folds.groupby(['value', 'fold']).size().unstack()
+    assert (counts.max(axis=1) - counts.min(axis=1) <= 1).all()
+
+
+def test_server_partition_is_one_grouped_pass(ee_offline) -> None:
+    import ee
+    col = ee.FeatureCollection([ee.Feature(None, {'id': idx, 'value': idx % 3}) for idx in range(10)])
+    training, _ = partition.partition_training(col, 0.7, 'value', seed=7)
+    functions = graph.profile(training).functions
+    assert functions['Collection.reduceColumns'] == 1
+    assert 'Collection.randomColumn' not in functions
@@ -0,0 +1,41 @@
+import zipfile
+
+import geopandas as gpd
+import numpy as np
+
+from cnwi.tools import prep_training_data as prep
+
+
+def _points(labels) -> gpd.GeoDataFrame:
+    x = np.arange(len(labels), dtype=np.float64)
+    return gpd.GeoDataFrame({'land_cover': labels}, geometry=gpd.points_from_xy(x - 60, x + 45),
+                            crs=4326)
+
+
+def test_prep_and_upload(tmp_path) -> None:
+    training = _points(['fen', 'bog', 'water'])
+    validation = _points(['bog', 'fen'])
+    training.to_file(tmp_path / 'training.gpkg')
+    validation.to_file(tmp_path / 'validation.gpkg')
+
+    output = prep.main([str(tmp_path / 'training.gpkg'), str(tmp_path / 'validation.gpkg'),
+                        'land_cover', '-o', str(tmp_path / 'data.zip')])
+    assert sorted(zipfile.ZipFile(output).namelist()) == ['data.cpg', 'data.dbf', 'data.prj',
+                                                          'data.shp', 'data.shx']
+
+    gdf = gpd.read_file(output)
+    assert gdf['land_cover'].tolist() == ['bog', 'bog', 'fen', 'fen', 'water']
+    assert gdf['value'].tolist() == [1, 1, 2, 2, 3]
+    assert gdf['isTraining'].tolist() == [1, 0, 1, 0, 1]
+    assert np.allclose(gdf['POINT_X'], gdf.geometry.x) and np.allclose(gdf['POINT_Y'], gdf.geometry.y)
+
+
+def test_prep_reprojects_and_reports_lonlat() -> None:
+    training = _points(['fen', 'bog']).to_crs(32620)
+    validation = _points(['water']).to_crs(3857)
+
+    gdf = prep.prep_training_data(training, validation, 'land_cover')
+    assert gdf.crs == training.crs
+    # validation is reprojected to the training CRS, the coordinates are longitude / latitude
+    assert np.allclose(gdf.geometry.to_crs(4326).x, gdf['POINT_X'])
+    assert np.allclose(gdf['POINT_X'], [-59, -60, -60]) and np.allclose(gdf['POINT_Y'], [46, 45, 45])
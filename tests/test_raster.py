@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+rasterio = pytest.importorskip('rasterio')
+
+from rasterio.transform import from_origin
+
+from cnwi import derivatives as d
+from cnwi import raster, sfilters
+
+BANDS = ['B2', 'B3', 'B4', 'B8', 'B11', 'B12']
+
+
+def write_tile(filename: str, data: np.ndarray) -> None:
+    profile = dict(driver='GTiff', height=data.shape[1], width=data.shape[2], count=data.shape[0],
+                   dtype='float32', crs='EPSG:4326',
+                   transform=from_origin(-64.0, 45.0, 0.0001, 0.0001))
+    with rasterio.open(filename, 'w', **profile) as dst:
+        dst.write(data.astype('float32'))
+        for idx, name in enumerate(BANDS[:data.shape[0]], 1):
+            dst.set_band_description(idx, name)
+
+
+def test_process_raster_matches_whole_array(tmp_path) -> None:
+    data = np.random.default_rng(0).uniform(1, 3000, size=(6, 70, 50)).astype('float32')
+    src = str(tmp_path / 's2.tif')
+    write_tile(src, data)
+
+    tc = d.TasselCap()
+    dst = raster.process_raster(src, str(tmp_path / 'tc.tif'), 
+                                raster.for_calculator(tc, raster.band_names(src)),
+                                block_size=32, workers=2)
+    with rasterio.open(dst) as result:
+        assert list(result.descriptions) == tc.NAME
+        expected = np.stack(list(tc.compute(data.astype(np.float64), BANDS).values()))
+        np.testing.assert_allclose(result.read(), expected, rtol=1e-5)
+
+    pm = sfilters.PeronaMalik(iterations=3)
+    dst = raster.process_raster(src, str(tmp_path / 'pm.tif'), pm.compute, halo=pm.halo,
+                                block_size=16, workers=1)
+    with rasterio.open(dst) as result:
+        np.testing.assert_allclose(result.read(), pm.compute(data.astype(np.float64)), rtol=1e-5)
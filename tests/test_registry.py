@@ -0,0 +1,48 @@
+from cnwi import datasets, prebuilt, registry
+
+
+def fake_fetch(calls):
+    def fetch(asset_ids):
+        calls.append(list(asset_ids))
+        return [{'id': id, 'bands': ['VV', 'VH'], 'geometry': None, 'start': idx, 'end': idx}
+                for idx, id in enumerate(asset_ids)]
+    return fetch
+
+
+def test_load_asset_sets() -> None:
+    sets = registry.load_asset_sets()
+    assert list(sets) == ['NovaScotia', 'PeaceWilliston', 'NewBruniswick', 'WillistonA_S1',
+                          'WillistonA_S2']
+    assert len(sets['PeaceWilliston']) == 9
+    assert all(id.startswith('COPERNICUS/') for ids in sets.values() for id in ids)
+    # a set holds a single collection
+    assert all(len({id.rsplit('/', 1)[0] for id in ids}) == 1 for ids in sets.values())
+
+
+def test_datasets_load_their_assets_from_the_registry() -> None:
+    sets = registry.load_asset_sets()
+    assert datasets.NovaScotia().sentienl1 == sets['NovaScotia']
+    assert datasets.PeaceWilliston().sentienl1 == sets['PeaceWilliston']
+    assert prebuilt.WillistonDataCube().s1 == sets['PeaceWilliston']
+    williston = prebuilt.WillistonA()
+    assert williston.s1 == sets['WillistonA_S1'] and williston.s2 == sets['WillistonA_S2']
+    # every instance gets its own list
+    williston.s1.append('COPERNICUS/S1_GRD/other')
+    assert prebuilt.WillistonA().s1 == sets['WillistonA_S1']
+
+
+def test_registry_prefetches_once_and_expires(tmp_path) -> None:
+    cache = str(tmp_path / 'assets.json')
+    calls = []
+    sets = {'a': ['S1/1', 'S1/2'], 'b': ['S1/2', 'S1/3']}
+    reg = registry.AssetRegistry(sets, cache=cache, fetch=fake_fetch(calls), batch_size=2)
+
+    assert reg.prefetch() == 3
+    assert calls == [['S1/1', 'S1/2'], ['S1/3']]
+    assert reg.band_names('b') == ['VV', 'VH']
+
+    # a new run is served from the disk cache until the entries expire
+    reg = registry.AssetRegistry(sets, cache=cache, fetch=fake_fetch(calls))
+    assert reg.prefetch() == 0 and reg.date_range('a') == [0, 1] and len(calls) == 2
+    reg = registry.AssetRegistry(sets, cache=cache, fetch=fake_fetch(calls), ttl=0)
+    assert reg.prefetch(['a']) == 2 and calls[-1] == ['S1/1', 'S1/2']
@@ -0,0 +1,310 @@
+from typing import Any, Dict, List
+
+import geopandas as gpd
+from shapely.geometry import Polygon, box
+
+from cnwi.tools.to_cloud.ledger import RunLedger
+from cnwi.tools.to_cloud.sampling import ChunkedSampler, chunk_points, merge_samples
+from cnwi.tools.to_cloud.scheduler import ExportScheduler, TaskBackend
+from cnwi.tools.to_cloud.tiler import AdaptiveTiler, quadtree_split
+
+
+class FakeBackend(TaskBackend):
+    """ tasks finish after duration polls, tasks built from a key in fail_once fail their first run """
+
+    def __init__(self, fail_once=(), duration: int = 2) -> None:
+        self.fail_once = set(fail_once)
+        self.duration = duration
+        self.polls: Dict[str, int] = {}
+        self.tasks: Dict[str, Any] = {}
+        self.running_peak = 0
+        self.status_calls = 0
+
+    def start(self, task: Any) -> str:
+        task_id = f'TASK{len(self.tasks)}'
+        self.tasks[task_id] = task
+        self.polls[task_id] = 0
+        running = sum(1 for id, polls in self.polls.items() if polls < self.duration)
+        self.running_peak = max(self.running_peak, running)
+        return task_id
+
+    def status(self, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        self.status_calls += 1
+        statuses = {}
+        for id in task_ids:
+            self.polls[id] += 1
+            if self.polls[id] < self.duration:
+                statuses[id] = {'id': id, 'state': 'RUNNING'}
+            elif self.tasks[id] in self.fail_once:
+                self.fail_once.remove(self.tasks[id])
+                statuses[id] = {'id': id, 'state': 'FAILED', 'error_message': 'User memory limit exceeded.'}
+            else:
+                statuses[id] = {'id': id, 'state': 'COMPLETED'}
+        return statuses
+
+
+def test_scheduler_caps_concurrency_and_retries() -> None:
+    backend = FakeBackend(fail_once=[3])
+    sleeps = []
+    scheduler = ExportScheduler(backend=backend, max_concurrent=2, max_retries=1, sleep=sleeps.append)
+    for key in range(5):
+        scheduler.submit(key, lambda key=key: key)
+
+    jobs = scheduler.run()
+
+    assert all(job.state == 'COMPLETED' for job in jobs.values())
+    assert backend.running_peak == 2
+    assert jobs[3].attempts == 2 and jobs[0].attempts == 1
+    # the recorded id is the one returned when the job was (re)started
+    assert backend.tasks[jobs[3].task_id] == 3
+    assert backend.status_calls == len(sleeps)
+
+
+def test_scheduler_gives_up_and_backs_off() -> None:
+    backend = FakeBackend(fail_once=[0], duration=4)
+    sleeps = []
+    scheduler = ExportScheduler(backend=backend, max_retries=0, poll_interval=1, backoff=2,
+                                sleep=sleeps.append)
+    scheduler.submit(0, lambda: 0)
+
+    jobs = scheduler.run()
+
+    assert jobs[0].state == 'FAILED'
+    assert jobs[0].error == 'User memory limit exceeded.'
+    # READY -> RUNNING, two polls without a change, then RUNNING -> FAILED
+    assert sleeps == [1, 1, 2, 4]
+
+
+
+def test_monitor_backs_off_like_the_scheduler(monkeypatch) -> None:
+    import asyncio
+    from cnwi.tools.to_cloud.monitor import TaskMonitor
+
+    sleeps = []
+
+    async def sleep(interval):
+        sleeps.append(interval)
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+
+    backend = FakeBackend(fail_once=[0], duration=4)
+    scheduler = ExportScheduler(backend=backend, max_retries=0)
+    scheduler.submit(0, lambda: 0)
+    monitor = TaskMonitor(backend=backend, poll_interval=1, backoff=2)
+    monitor.attach('fourier', scheduler)
+    asyncio.run(monitor.run())
+
+    assert scheduler.jobs[0].state == 'FAILED'
+    assert sleeps == [1, 1, 2, 4]
+
+def test_scheduler_resumes_from_ledger(tmp_path) -> None:
+    from cnwi.tools.to_cloud.ledger import RunLedger
+
+    filename = str(tmp_path / 'ledger.jsonl')
+    backend = FakeBackend()
+    scheduler = ExportScheduler(backend=backend, sleep=lambda _: None, ledger=RunLedger(filename))
+    for key in range(3):
+        scheduler.submit(key, lambda key=key: key, prefix=f'bucket/{key}')
+    # the driver dies after the first job finished and while the second is in flight
+    scheduler._start(scheduler.jobs[0])
+    scheduler.poll()
+    scheduler.poll()
+    scheduler._start(scheduler.jobs[1])
+    with open(filename, 'a') as f:
+        f.write('{"key": 2, "sta')
+
+    rerun = ExportScheduler(backend=backend, sleep=lambda _: None, ledger=RunLedger(filename))
+    for key in range(3):
+        rerun.submit(key, lambda key=key: key, prefix=f'bucket/{key}')
+    assert rerun.jobs[0].state == 'COMPLETED'
+    assert rerun.jobs[1].state == 'READY' and rerun.jobs[1].task_id == 'TASK1'
+    assert rerun.jobs[2].state == 'PENDING'
+
+    jobs = rerun.run()
+
+    assert all(job.state == 'COMPLETED' for job in jobs.values())
+    # only the job that never started was exported
+    assert len(backend.tasks) == 3
+    assert RunLedger(filename).get(2)['prefix'] == 'bucket/2'
+
+
+def test_monitor_supervises_batches_in_one_poll() -> None:
+    import asyncio
+    from cnwi.tools.to_cloud.monitor import TaskMonitor
+
+    backend = FakeBackend(fail_once=['terrain-1'])
+    monitor = TaskMonitor(backend=backend, poll_interval=0, max_poll_interval=0)
+    for batch in ['fourier', 'terrain']:
+        scheduler = ExportScheduler(backend=backend, max_concurrent=2)
+        for key in range(3):
+            scheduler.submit(key, lambda name=f'{batch}-{key}': name)
+        monitor.attach(batch, scheduler)
+    monitor.watch('classification', 'EXTERNAL', key='ns')
+    backend.polls['EXTERNAL'] = 0
+    backend.tasks['EXTERNAL'] = 'classification'
+    seen = []
+    monitor.add_callback(seen.append)
+
+    async def consume():
+        return [event async for event in monitor.events()]
+
+    events = asyncio.run(consume())
+
+    assert events == seen
+    assert all(job.state == 'COMPLETED' for job in monitor.schedulers['fourier'].jobs.values())
+    assert monitor.schedulers['terrain'].jobs[1].attempts == 2
+    assert monitor.tasks['EXTERNAL'].state == 'COMPLETED'
+    assert ('terrain', 1, 'RUNNING', 'FAILED') in [(e.batch, e.key, e.previous, e.state) for e in events]
+
+
+def test_tiler_splits_failed_cells(tmp_path) -> None:
+    grid = gpd.GeoDataFrame({'id': [1, 2]}, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs=4326)
+    # cell 2 fails on memory, its first quadrant fails again
+    backend = FakeBackend(fail_once=[2, '2_0'])
+    ledger = tmp_path / 'ledger.jsonl'
+    scheduler = ExportScheduler(backend=backend, max_retries=0, sleep=lambda _: None,
+                                ledger=RunLedger(str(ledger)))
+    tiler = AdaptiveTiler(lambda key, geometry, prefix: key, prefix=lambda key: f'out/{key}/')
+    jobs = tiler.submit(scheduler, grid).run()
+
+    assert jobs[2].state == 'SPLIT' and jobs[2].children == ['2_0', '2_1', '2_2', '2_3']
+    assert jobs['2_0'].state == 'SPLIT' and jobs['2_0_3'].prefix == 'out/2_0_3/'
+    assert all(job.state == 'COMPLETED' for job in jobs.values() if not job.children)
+    assert tiler.geometries['2_0'].bounds == (1.0, 0.5, 1.5, 1.0)
+    cells = tiler.to_geodataframe()
+    assert cells.set_index('id').loc['2_0_3', 'parent'] == '2_0'
+
+    # a rerun goes straight to the leaves of the split cells
+    rerun = FakeBackend()
+    scheduler = ExportScheduler(backend=rerun, sleep=lambda _: None, ledger=RunLedger(str(ledger)))
+    tiler = AdaptiveTiler(lambda key, geometry, prefix: key, prefix=lambda key: f'out/{key}/')
+    jobs = tiler.submit(scheduler, grid).run()
+    assert not rerun.tasks and 2 not in jobs and '2_0_3' in jobs and tiler.splits.keys() >= {2, '2_0'}
+
+
+
+def test_tiler_drops_quadrants_a_cell_only_touches() -> None:
+    # the L misses the upper right quadrant, which it only touches along two edges
+    cell = Polygon([(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)])
+    parts = quadtree_split(cell)
+    assert [part.geom_type for part in parts] == ['Polygon'] * 3
+    assert sum(part.area for part in parts) == cell.area
+
+    grid = gpd.GeoDataFrame({'id': [1]}, geometry=[cell], crs=4326)
+    scheduler = ExportScheduler(backend=FakeBackend(fail_once=[1]), max_retries=0, sleep=lambda _: None)
+    tiler = AdaptiveTiler(lambda key, geometry, prefix: key, prefix=str)
+    jobs = tiler.submit(scheduler, grid).run()
+    assert jobs[1].children == ['1_0', '1_1', '1_2']
+    assert all(jobs[key].state == 'COMPLETED' and tiler.geometries[key].area == 1
+               for key in jobs[1].children)
+
+def test_ledger_shared_by_other_grids_and_prefixes(tmp_path) -> None:
+    ledger = str(tmp_path / 'ledger.jsonl')
+    grid = gpd.GeoDataFrame({'id': [1, 2]}, geometry=[box(0, 0, 1, 1), box(1, 0, 2, 1)], crs=4326)
+    other = gpd.GeoDataFrame({'id': [1, 2]}, geometry=[box(5, 5, 6, 6), box(6, 5, 7, 6)], crs=4326)
+
+    def run(grid, prefix, run=None):
+        backend = FakeBackend()
+        scheduler = ExportScheduler(backend=backend, sleep=lambda _: None, ledger=RunLedger(ledger))
+        tiler = AdaptiveTiler(lambda key, geometry, prefix: key, prefix=prefix, run=run)
+        tiler.submit(scheduler, grid).run()
+        return len(backend.tasks)
+
+    assert run(grid, lambda key: f'a/{key}/') == 2
+    # the same ids in another AOI, under another prefix or in another bucket are exported again
+    assert run(other, lambda key: f'a/{key}/') == 2
+    assert run(grid, lambda key: f'b/{key}/') == 2
+    assert run(grid, lambda key: f'a/{key}/', run='other-bucket') == 2
+    # the original run is still resumed
+    assert run(grid, lambda key: f'a/{key}/') == 0
+
+
+def test_tiler_presplits_expensive_cells() -> None:
+    grid = gpd.GeoDataFrame({'id': [1]}, geometry=[box(0, 0, 1, 1)], crs=4326)
+    scheduler = ExportScheduler(backend=FakeBackend(), sleep=lambda _: None)
+    tiler = AdaptiveTiler(lambda key, geometry, prefix: key, prefix=str, max_depth=2,
+                          cost=lambda geometry: geometry.area, max_cost=0.1)
+    jobs = tiler.submit(scheduler, grid).run()
+    assert sorted(jobs) == sorted(f'1_{a}_{b}' for a in range(4) for b in range(4))
+
+
+def test_sampler_chunks_points_and_escalates_tile_scale(tmp_path) -> None:
+    points = gpd.GeoDataFrame({'value': range(7)},
+                              geometry=gpd.points_from_xy([0.1, 0.2, 0.3, 0.4, 0.6, 0.7, 1.2], [0.1] * 7),
+                              crs=4326)
+    chunks = chunk_points(points, cell_size=0.5, max_points=3)
+    assert {key: len(chunk) for key, chunk in chunks.items()} == {'0_0_0': 3, '0_0_1': 1, '1_0_0': 2,
+                                                                  '2_0_0': 1}
+
+    backend = FakeBackend(fail_once=[('1_0_0', 2)])
+    sampler = ChunkedSampler(lambda key, chunk, prefix, tile_scale: (key, tile_scale), str)
+    scheduler = ExportScheduler(backend=backend, max_concurrent=2, max_retries=2, sleep=lambda _: None)
+    jobs = sampler.submit(scheduler, chunks).run()
+
+    assert all(job.state == 'COMPLETED' for job in jobs.values())
+    assert backend.running_peak == 2
+    assert backend.tasks[jobs['1_0_0'].task_id] == ('1_0_0', 4)
+    assert sampler.tile_scales == {'0_0_0': 2, '0_0_1': 2, '1_0_0': 4, '2_0_0': 2}
+
+    for key, chunk in chunks.items():
+        chunk.drop(columns='geometry').assign(**{'system:index': range(len(chunk))}).to_csv(
+            tmp_path / f'samples_{key}.csv', index=False)
+    merged = merge_samples(str(tmp_path / 'samples_*.csv'))
+    assert sorted(merged['value']) == list(range(7)) and 'system:index' not in merged
+
+
+
+def test_sampler_resumes_tile_scale_from_ledger(tmp_path) -> None:
+    points = gpd.GeoDataFrame({'value': range(3)}, geometry=gpd.points_from_xy([0.1, 0.6, 1.2], [0.1] * 3),
+                              crs=4326)
+    chunks = chunk_points(points, cell_size=0.5)
+    build = lambda key, chunk, prefix, tile_scale: (key, tile_scale)
+    ledger = str(tmp_path / 'ledger.jsonl')
+
+    # the first run gives up on 1_0_0 after its attempt at tileScale 2
+    scheduler = ExportScheduler(backend=FakeBackend(fail_once=[('1_0_0', 2)]), max_retries=0,
+                                sleep=lambda _: None, ledger=RunLedger(ledger))
+    jobs = ChunkedSampler(build, str).submit(scheduler, chunks).run()
+    assert jobs['1_0_0'].state == 'FAILED'
+    assert RunLedger(ledger).get('1_0_0')['params'] == {'tile_scale': 2}
+
+    # the rerun only exports the failed chunk, at the escalated scale
+    backend = FakeBackend()
+    scheduler = ExportScheduler(backend=backend, sleep=lambda _: None, ledger=RunLedger(ledger))
+    jobs = ChunkedSampler(build, str).submit(scheduler, chunks).run()
+    assert all(job.state == 'COMPLETED' for job in jobs.values())
+    assert list(backend.tasks.values()) == [('1_0_0', 4)]
+
+
+def test_sampler_reruns_chunks_holding_other_points(tmp_path) -> None:
+    def points(n):
+        return gpd.GeoDataFrame({'value': range(n)}, geometry=gpd.points_from_xy([0.1] * n, [0.1] * n),
+                                crs=4326)
+    build = lambda key, chunk, prefix, tile_scale: (key, len(chunk))
+    ledger = str(tmp_path / 'ledger.jsonl')
+
+    def run(chunks, **kwargs):
+        backend = FakeBackend()
+        scheduler = ExportScheduler(backend=backend, sleep=lambda _: None, ledger=RunLedger(ledger))
+        ChunkedSampler(build, str, **kwargs).submit(scheduler, chunks).run()
+        return list(backend.tasks.values())
+
+    assert run(chunk_points(points(10))) == [('0_0_0', 10)]
+    assert run(chunk_points(points(10))) == []
+    # the same chunk key with more points, another sampling scale or initial tileScale
+    assert run(chunk_points(points(300))) == [('0_0_0', 300)]
+    assert run(chunk_points(points(300)), run=(30, None)) == [('0_0_0', 300)]
+    assert run(chunk_points(points(300)), tile_scale=4) == [('0_0_0', 300)]
+
+def test_unlisted_tasks_stay_active(monkeypatch) -> None:
+    import ee
+    from cnwi.tools.to_cloud.scheduler import EarthEngineBackend
+
+    listed = [{'id': 'A', 'state': 'RUNNING'}]
+    monkeypatch.setattr(ee.data, 'getTaskList', lambda: listed)
+    monkeypatch.setattr(ee.data, 'getTaskStatus', lambda ids: [
+        {'id': id, 'state': 'RUNNING' if id == 'B' else 'UNKNOWN'} for id in ids])
+    backend = EarthEngineBackend(max_missing=2)
+
+    # B is off the list page but found directly, C is not found yet and left unchanged
+    assert backend.status(['A', 'B', 'C']) == {'A': listed[0], 'B': {'id': 'B', 'state': 'RUNNING'}}
+    assert backend.status(['C'])['C']['state'] == 'UNKNOWN'
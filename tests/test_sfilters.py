@@ -0,0 +1,68 @@
+import numpy as np
+
+from cnwi import sfilters
+
+
+def naive_perona_malik(img: np.ndarray, K: float, iterations: int, method: int) -> np.ndarray:
+    img = img.astype(np.float64)
+    for _ in range(iterations):
+        padded = np.pad(img, 1, mode='edge')
+        flux = np.zeros_like(img)
+        for delta in [padded[:-2, 1:-1] - img, padded[2:, 1:-1] - img,
+                      padded[1:-1, :-2] - img, padded[1:-1, 2:] - img]:
+            if method == 1:
+                coef = np.exp(delta * delta * (-1.0 / K))
+            else:
+                coef = 1.0 / (1.0 + delta * delta / (K * K))
+            flux += coef * delta
+        img = img + 0.2 * flux
+    return img
+
+
+def test_perona_malik_array_matches_naive() -> None:
+    dem = np.random.default_rng(0).normal(100, 5, size=(40, 30))
+    for method in [1, 2]:
+        result = sfilters.PeronaMalik(K=3.5, iterations=10, method=method).compute(dem)
+        np.testing.assert_allclose(result, naive_perona_malik(dem, 3.5, 10, method), rtol=1e-12)
+
+
+def test_perona_malik_array_keeps_flat_surface() -> None:
+    flat = np.full((3, 8, 8), 42.0)
+    np.testing.assert_array_equal(sfilters.perona_malik_array(flat), flat)
+
+
+def naive_correlate(img: np.ndarray, kernel: np.ndarray) -> np.ndarray:
+    radius = kernel.shape[0] // 2
+    padded = np.pad(img, radius, mode='edge')
+    out = np.zeros_like(img, dtype=np.float64)
+    for i in range(kernel.shape[0]):
+        for j in range(kernel.shape[1]):
+            out += kernel[i, j] * padded[i:i + img.shape[0], j:j + img.shape[1]]
+    return out
+
+
+def test_boxcar_and_gaussian_match_2d_kernels() -> None:
+    img = np.random.default_rng(1).normal(size=(25, 31))
+
+    box = np.full((5, 5), 1 / 25)
+    np.testing.assert_allclose(sfilters.boxcar_array(img, 2), naive_correlate(img, box), atol=1e-12)
+    np.testing.assert_allclose(sfilters.BoxCar(2, normalize=False, magnitude=2.0).compute(img),
+                               naive_correlate(img, np.full((5, 5), 2.0)), atol=1e-12)
+
+    y, x = np.mgrid[-3:4, -3:4]
+    gauss = np.exp(-(x ** 2 + y ** 2) / (2 * 1.5 ** 2))
+    gauss /= gauss.sum()
+    np.testing.assert_allclose(sfilters.gaussian_filter_array(img, 3, sigma=1.5),
+                               naive_correlate(img, gauss), atol=1e-12)
+
+
+def test_tiled_filters_match_whole_array() -> None:
+    from cnwi.tiling import apply_tiled
+
+    img = np.random.default_rng(2).normal(100, 5, size=(2, 50, 45))
+    pm = sfilters.PeronaMalik(iterations=4)
+    np.testing.assert_allclose(apply_tiled(pm.compute, img, halo=pm.halo, tile_size=16),
+                               pm.compute(img), atol=1e-12)
+
+    gauss = lambda x: sfilters.gaussian_filter_array(x, 3)
+    np.testing.assert_allclose(apply_tiled(gauss, img, halo=3, tile_size=7), gauss(img), atol=1e-12)
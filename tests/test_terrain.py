@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from cnwi import sfilters, terrain
+
+
+def grid(size: int = 40, res: float = 30.0):
+    rows, cols = np.mgrid[0:size, 0:size] * res
+    return cols, rows
+
+
+def test_plane_slope_and_curvature() -> None:
+    x, y = grid()
+    # rows run south, so a surface rising to the north has z decreasing with the row
+    dem = 0.1 * x - 0.2 * y
+    out = terrain.terrain_array(dem, res=30, tagee=False)
+    core = (slice(1, -1), slice(1, -1))
+    np.testing.assert_allclose(out['Slope'][core], np.degrees(np.arctan(np.hypot(0.1, 0.2))))
+    np.testing.assert_allclose(out['MeanCurvature'][core], 0, atol=1e-12)
+    assert np.isnan(out['Slope'][0]).all()
+
+    # TAGEE's q is 1.5 times Florinsky's
+    p, q, *_ = terrain.partial_derivatives(dem, 30, 30, 30, 30, 30)
+    np.testing.assert_allclose(q[core], 0.3)
+
+
+def test_geographic_spacing_matches_projected() -> None:
+    x, y = grid()
+    dem = ((x - 600) ** 2 + (y - 600) ** 2) / 5000
+    # ~30 m pixels at 45 N
+    lat = 45 - y / 30 / 3600
+    lon = -64 + x / 30 / 3600 / np.cos(np.radians(45))
+    projected = terrain.terrain_array(dem, res=30.87)
+    geographic = terrain.terrain_array(dem, lon=lon, lat=lat)
+    np.testing.assert_allclose(geographic['Slope'][20, 5:35], projected['Slope'][20, 5:35], rtol=2e-2,
+                               atol=1e-3)
+
+
+def test_elevation_inputs_tiled(tmp_path) -> None:
+    rasterio = pytest.importorskip('rasterio')
+    from rasterio.transform import from_origin
+
+    from cnwi import raster
+
+    dem = np.random.default_rng(0).uniform(0, 50, size=(1, 60, 45)).astype('float32')
+    src = str(tmp_path / 'dem.tif')
+    with rasterio.open(src, 'w', driver='GTiff', height=60, width=45, count=1, dtype='float32',
+                       crs='EPSG:4326', transform=from_origin(-64.0, 45.0, 1 / 3600, 1 / 3600)) as dst:
+        dst.write(dem)
+
+    ta = terrain.ElevationInputs(pm=sfilters.PeronaMalik(iterations=3))
+    dst = raster.process_raster(src, str(tmp_path / 'ta.tif'), ta.compute, halo=ta.halo,
+                                block_size=16, workers=2, lonlat=True)
+    with rasterio.open(src) as f:
+        block = raster._read(f, next(raster.iter_windows(60, 45, tile_size=60)), lonlat=True)
+    expected = ta.compute(block)
+    with rasterio.open(dst) as result:
+        assert list(result.descriptions) == list(expected)
+        np.testing.assert_allclose(result.read(), np.stack(list(expected.values())), rtol=1e-4,
+                                   atol=1e-6)
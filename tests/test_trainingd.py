@@ -0,0 +1,59 @@
+import json
+
+import ee
+import pytest
+
+from cnwi import graph, trainingd
+
+
+def test_fc_from_file_batches_under_payload_limit(ee_offline, tmp_path) -> None:
+    filename = tmp_path / 'samples.csv'
+    rows = [f'{idx},{idx % 5},bog,{-60 + idx * 1e-4},{45 + idx * 1e-4}' for idx in range(2000)]
+    filename.write_text('id,value,class_name,POINT_X,POINT_Y\n' + '\n'.join(rows))
+
+    batches = list(trainingd.feature_batches(str(filename), max_bytes=100_000))
+    assert len(batches) > 1
+    assert all(batch.nbytes <= 100_000 for batch in batches)
+    assert sum(len(batch.features) for batch in batches) == 2000
+
+    feature = batches[0].features[1]
+    assert feature['geometry'] == {'type': 'Point', 'coordinates': [-60 + 1e-4, 45 + 1e-4]}
+    assert feature['properties']['value'] == 1
+
+    # the merged collection would be one request over the limit
+    with pytest.raises(ValueError, match='upload_batches'):
+        trainingd.fc_from_file(str(filename), max_bytes=100_000)
+    functions = graph.profile(trainingd.fc_from_file(str(filename))).functions
+    assert functions['Feature'] == 2000
+
+
+def test_parse_keeps_ids_and_drops_nan() -> None:
+    assert [trainingd._parse(_) for _ in ['0', '12', '-3', '0.5', '-0.25', 'bog']] == \
+        [0, 12, -3, 0.5, -0.25, 'bog']
+    assert [trainingd._parse(_) for _ in ['007', '-01', '0012345']] == ['007', '-01', '0012345']
+    assert [trainingd._parse(_) for _ in ['nan', 'NaN']] == [None, None]
+
+
+def test_fc_from_file_reads_geojson(ee_offline, tmp_path) -> None:
+    filename = tmp_path / 'samples.geojson'
+    features = [{'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': [-60, 45 + idx]},
+                 'properties': {'value': idx, 'id': '007', 'date': '2019-05-01',
+                                'time': '2019-05-01T10:00:00Z'}} for idx in range(5)]
+    features[2]['geometry'] = None
+    filename.write_text(json.dumps({'type': 'FeatureCollection', 'features': features}))
+
+    # streamed two features at a time
+    read = list(trainingd._read_geojson(str(filename), batch_size=2))
+    assert [_['properties'] for _ in read] == [_['properties'] for _ in features]
+    assert read[2]['geometry'] is None
+    assert read[4]['geometry'] == {'type': 'Point', 'coordinates': [-60.0, 49.0]}
+
+    fc = trainingd.fc_from_file(str(filename))
+    assert isinstance(fc, ee.FeatureCollection)
+    assert graph.profile(fc).functions['GeometryConstructors.Point'] == 4
+
+
+def test_prep_training_data_maps_once(ee_offline) -> None:
+    col = ee.FeatureCollection([ee.Feature(ee.Geometry.Point([-60, 45]), {'land_cover': 'bog'})])
+    prepped = trainingd.prep_training_data(col, class_property='land_cover')
+    assert graph.profile(prepped).functions['Collection.map'] == 1